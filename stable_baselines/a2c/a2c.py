@@ -7,8 +7,8 @@ import tensorflow as tf
 from stable_baselines import logger
 from stable_baselines.common import explained_variance, tf_util, ActorCriticRLModel, SetVerbosity, TensorboardWriter
 from stable_baselines.common.policies import LstmPolicy, ActorCriticPolicy
-from stable_baselines.common.runners import AbstractEnvRunner
-from stable_baselines.a2c.utils import discount_with_dones, Scheduler, find_trainable_variables, mse, \
+from stable_baselines.common.runners import AbstractEnvRunner, RolloutBuffer
+from stable_baselines.a2c.utils import Scheduler, find_trainable_variables, mse, \
     total_episode_reward_logger
 
 
@@ -280,22 +280,29 @@ class A2CRunner(AbstractEnvRunner):
         """
         super(A2CRunner, self).__init__(env=env, model=model, n_steps=n_steps)
         self.gamma = gamma
+        self.buffer = RolloutBuffer(env.num_envs, n_steps, dtypes={
+            'obs': self.obs.dtype, 'actions': np.int32, 'rewards': np.float32, 'values': np.float32,
+            'masks': np.bool, 'dones': np.bool})
 
     def run(self):
         """
         Run a learning step of the model
 
-        :return: ([float], [float], [float], [bool], [float], [float])
-                 observations, states, rewards, masks, actions, values
+        The returned arrays are views of the rollout buffer of the runner, overwritten by the next run.
+
+        :return: ([float], [float], [float], [bool], [float], [float], [float])
+                 observations, states, rewards, masks, actions, values, true rewards
         """
-        mb_obs, mb_rewards, mb_actions, mb_values, mb_dones = [], [], [], [], []
+        if self.trajectories is not None:
+            # with lam=1, the returns are the discounted rewards bootstrapped with the last values
+            batch, _ = self._run_env_ids(self.n_steps * self.env.num_envs, self.gamma, 1.)
+            return batch['obs'], None, batch['returns'], batch['masks'], batch['actions'].astype(np.int32), \
+                batch['values'], batch['rewards']
+        buffer = self.buffer
         mb_states = self.states
-        for _ in range(self.n_steps):
+        for step in range(self.n_steps):
             actions, values, states, _ = self.model.step(self.obs, self.states, self.dones)
-            mb_obs.append(np.copy(self.obs))
-            mb_actions.append(actions)
-            mb_values.append(values)
-            mb_dones.append(self.dones)
+            buffer.add(step, obs=self.obs, actions=actions, values=values, masks=self.dones)
             clipped_actions = actions
             # Clip the actions to avoid out of bound error
             if isinstance(self.env.action_space, gym.spaces.Box):
@@ -304,32 +311,17 @@ class A2CRunner(AbstractEnvRunner):
             self.states = states
             self.dones = dones
             self.obs = obs
-            mb_rewards.append(rewards)
-        mb_dones.append(self.dones)
-        # batch of steps to batch of rollouts
-        mb_obs = np.asarray(mb_obs, dtype=self.obs.dtype).swapaxes(1, 0).reshape(self.batch_ob_shape)
-        mb_rewards = np.asarray(mb_rewards, dtype=np.float32).swapaxes(0, 1)
-        mb_actions = np.asarray(mb_actions, dtype=np.int32).swapaxes(0, 1)
-        mb_values = np.asarray(mb_values, dtype=np.float32).swapaxes(0, 1)
-        mb_dones = np.asarray(mb_dones, dtype=np.bool).swapaxes(0, 1)
-        mb_masks = mb_dones[:, :-1]
-        mb_dones = mb_dones[:, 1:]
-        true_rewards = np.copy(mb_rewards)
-        last_values = self.model.value(self.obs, self.states, self.dones).tolist()
-        # discount/bootstrap off value fn
-        for n, (rewards, dones, value) in enumerate(zip(mb_rewards, mb_dones, last_values)):
-            rewards = rewards.tolist()
-            dones = dones.tolist()
-            if dones[-1] == 0:
-                rewards = discount_with_dones(rewards + [value], dones + [0], self.gamma)[:-1]
-            else:
-                rewards = discount_with_dones(rewards, dones, self.gamma)
-            mb_rewards[n] = rewards
+            buffer.add(step, rewards=rewards, dones=dones)
+        # the arrays are [n_env, n_steps, ...]
+        true_rewards, mb_dones = buffer.array('rewards'), buffer.array('dones')
+        # discount/bootstrap off value fn, for all the environments at once
+        mb_rewards = buffer.array('returns')
+        discounted = self.model.value(self.obs, self.states, self.dones)
+        for step in reversed(range(self.n_steps)):
+            discounted = true_rewards[:, step] + self.gamma * discounted * (1. - mb_dones[:, step])
+            mb_rewards[:, step] = discounted
 
         # convert from [n_env, n_steps, ...] to [n_steps * n_env, ...]
-        mb_rewards = mb_rewards.reshape(-1, *mb_rewards.shape[2:])
-        mb_actions = mb_actions.reshape(-1, *mb_actions.shape[2:])
-        mb_values = mb_values.reshape(-1, *mb_values.shape[2:])
-        mb_masks = mb_masks.reshape(-1, *mb_masks.shape[2:])
-        true_rewards = true_rewards.reshape(-1, *true_rewards.shape[2:])
+        mb_obs, mb_rewards, mb_masks, mb_actions, mb_values, true_rewards = \
+            map(buffer.flat, ('obs', 'returns', 'masks', 'actions', 'values', 'rewards'))
         return mb_obs, mb_states, mb_rewards, mb_masks, mb_actions, mb_values, true_rewards
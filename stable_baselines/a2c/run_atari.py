@@ -29,7 +29,7 @@ def train(env_id, num_timesteps, seed, policy, lr_schedule, num_env):
     if policy_fn is None:
         raise ValueError("Error: policy {} not implemented".format(policy))
 
-    env = VecFrameStack(make_atari_env(env_id, num_env, seed), 4)
+    env = VecFrameStack(make_atari_env(env_id, num_env, seed), 4, copy=False)
 
     model = A2C(policy_fn, env, lr_schedule=lr_schedule)
     model.learn(total_timesteps=int(num_timesteps * 1.1), seed=seed)
@@ -9,7 +9,7 @@ from stable_baselines.a2c.utils import batch_to_seq, seq_to_batch, Scheduler, fi
     get_by_index, check_shape, avg_norm, gradient_add, q_explained_variance, total_episode_reward_logger
 from stable_baselines.acer.buffer import Buffer
 from stable_baselines.common import ActorCriticRLModel, tf_util, SetVerbosity, TensorboardWriter
-from stable_baselines.common.runners import AbstractEnvRunner
+from stable_baselines.common.runners import AbstractEnvRunner, RolloutBuffer
 from stable_baselines.common.policies import LstmPolicy, ActorCriticPolicy
 
 
@@ -558,6 +558,8 @@ class _Runner(AbstractEnvRunner):
         """
 
         super(_Runner, self).__init__(env=env, model=model, n_steps=n_steps)
+        assert self.env_ids is None, "Error: the ACER runner does not support the environment ids (e.g. of " \
+                                     "AsyncSubprocVecEnv), its trajectories are indexed by position."
         self.env = env
         self.model = model
         self.n_env = n_env = env.num_envs
@@ -589,23 +591,24 @@ class _Runner(AbstractEnvRunner):
         self.n_steps = n_steps
         self.states = model.initial_state
         self.dones = [False for _ in range(n_env)]
+        self.buffer = RolloutBuffer(n_env, n_steps, dtypes={
+            'obs': self.obs_dtype, 'actions': np.int32, 'rewards': np.float32, 'mus': np.float32, 'masks': np.bool},
+            n_steps_by_field={'obs': n_steps + 1, 'masks': n_steps + 1})
 
     def run(self):
         """
         Run a step leaning of the model
 
+        The returned arrays are views of the rollout buffer of the runner, overwritten by the next run.
+
         :return: ([float], [float], [float], [float], [float], [bool], [float])
                  encoded observation, observations, actions, rewards, mus, dones, masks
         """
-        enc_obs = [self.obs]
-        mb_obs, mb_actions, mb_mus, mb_dones, mb_rewards = [], [], [], [], []
-        for _ in range(self.n_steps):
+        buffer = self.buffer
+        for step in range(self.n_steps):
             actions, _, states, _ = self.model.step(self.obs, self.states, self.dones)
             mus = self.model.proba_step(self.obs, self.states, self.dones)
-            mb_obs.append(np.copy(self.obs))
-            mb_actions.append(actions)
-            mb_mus.append(mus)
-            mb_dones.append(self.dones)
+            buffer.add(step, obs=self.obs, actions=actions, mus=mus, masks=self.dones)
             clipped_actions = actions
             # Clip the actions to avoid out of bound error
             if isinstance(self.env.action_space, Box):
@@ -615,20 +618,16 @@ class _Runner(AbstractEnvRunner):
             self.states = states
             self.dones = dones
             self.obs = obs
-            mb_rewards.append(rewards)
-            enc_obs.append(obs)
-        mb_obs.append(np.copy(self.obs))
-        mb_dones.append(self.dones)
-
-        enc_obs = np.asarray(enc_obs, dtype=self.obs_dtype).swapaxes(1, 0)
-        mb_obs = np.asarray(mb_obs, dtype=self.obs_dtype).swapaxes(1, 0)
-        mb_actions = np.asarray(mb_actions, dtype=np.int32).swapaxes(1, 0)
-        mb_rewards = np.asarray(mb_rewards, dtype=np.float32).swapaxes(1, 0)
-        mb_mus = np.asarray(mb_mus, dtype=np.float32).swapaxes(1, 0)
-        mb_dones = np.asarray(mb_dones, dtype=np.bool).swapaxes(1, 0)
-
-        mb_masks = mb_dones  # Used for statefull models like LSTM's to mask state when done
-        mb_dones = mb_dones[:, 1:]  # Used for calculating returns. The dones array is now aligned with rewards
+            buffer.add(step, rewards=rewards)
+        buffer.add(self.n_steps, obs=self.obs, masks=self.dones)
+
+        # the encoded observations are the observations, followed by the last one
+        enc_obs = mb_obs = buffer.array('obs')
+        mb_actions = buffer.array('actions')
+        mb_rewards = buffer.array('rewards')
+        mb_mus = buffer.array('mus')
+        mb_masks = buffer.array('masks')  # Used for statefull models like LSTM's to mask state when done
+        mb_dones = mb_masks[:, 1:]  # Used for calculating returns. The dones array is now aligned with rewards
 
         # shapes are now [nenv, nsteps, []]
         # When pulling from buffer, arrays will now be reshaped in place, preventing a deep copy.
@@ -1,14 +1,23 @@
 import numpy as np
 
+from stable_baselines.common.math_util import gather_2d
+from stable_baselines.common.vec_env import VecFrameStack
+
 
 class Buffer(object):
-    def __init__(self, env, n_steps, size=50000):
+    def __init__(self, env, n_steps, size=50000, n_stack=None):
         """
         A buffer for observations, actions, rewards, mu's, states, masks and dones values
 
+        The pixel observations stacked by a VecFrameStack are stored as single frames: the frames of the first
+        observation of each rollout, then the newest frame of the next ones. The stacks are rebuilt when sampled,
+        zeroing the frames from before the start of an episode as VecFrameStack does.
+
         :param env: (Gym environment) The environment to learn from
         :param n_steps: (int) The number of steps to run for each environment
         :param size: (int) The buffer size in number of steps
+        :param n_stack: (int) The number of frames stacked in the pixel observations
+            (if None, the n_stack of the environment if it is a VecFrameStack, 1 otherwise)
         """
         self.n_env = env.num_envs
         self.n_steps = n_steps
@@ -28,6 +37,15 @@ class Buffer(object):
                 self.obs_dim = 1
             self.obs_dtype = np.float32
 
+        if n_stack is None:
+            n_stack = env.n_stack if isinstance(env, VecFrameStack) else 1
+        # only the pixel observations are stored as single frames
+        self.n_stack = n_stack if self.raw_pixels else 1
+        if self.n_stack > 1:
+            assert self.n_channels % self.n_stack == 0, \
+                "Error: the number of channels must be a multiple of the number of stacked frames."
+            self.frame_channels = self.n_channels // self.n_stack
+
         # Memory
         self.enc_obs = None
         self.actions = None
@@ -35,6 +53,8 @@ class Buffer(object):
         self.mus = None
         self.dones = None
         self.masks = None
+        # the arrays returned by `get`, reused by the next call
+        self._samples = None
 
         # Size indexes
         self.next_idx = 0
@@ -59,32 +79,42 @@ class Buffer(object):
         """
         return self.num_in_buffer > 0
 
-    def decode(self, enc_obs):
+    def decode(self, enc_obs, masks, out=None):
         """
         Get the stacked frames of an observation
-        
+
         :param enc_obs: ([float]) the encoded observation
+        :param masks: ([bool]) the masks of the observations (True for the first observation of an episode)
+        :param out: ([float]) the array receiving the observations (if None, a new one)
         :return: ([float]) the decoded observation
         """
-        # enc_obs has shape [n_envs, n_steps + 1, nh, nw, nc]
-        # dones has shape [n_envs, n_steps, nh, nw, nc]
+        # enc_obs has shape [n_envs, n_steps + n_stack, nh, nw, nc / n_stack] (or [n_envs, n_steps + 1, ...]
+        # without frame stacking), masks has shape [n_envs, n_steps + 1]
         # returns stacked obs of shape [n_env, (n_steps + 1), nh, nw, nc]
-        n_env, n_steps = self.n_env, self.n_steps
-        if self.raw_pixels:
-            obs_dim = [self.height, self.width, self.n_channels]
-        else:
-            obs_dim = [self.obs_dim]
-
-        obs = np.zeros([1, n_steps + 1, n_env] + obs_dim, dtype=self.obs_dtype)
-        # [n_steps + nstack, n_env, nh, nw, nc]
-        x_var = np.reshape(enc_obs, [n_env, n_steps + 1] + obs_dim).swapaxes(1, 0)
-        obs[-1, :] = x_var
-
-        if self.raw_pixels:
-            obs = obs.transpose((2, 1, 3, 4, 0, 5))
-        else:
-            obs = obs.transpose((2, 1, 3, 0))
-        return np.reshape(obs, [n_env, (n_steps + 1)] + obs_dim[:-1] + [obs_dim[-1]])
+        if self.n_stack == 1:
+            if out is None:
+                return enc_obs.copy()
+            out[...] = enc_obs
+            return out
+
+        n_stack, n_steps, n_channels = self.n_stack, self.n_steps, self.frame_channels
+        if out is None:
+            out = np.empty([self.n_env, n_steps + 1, self.height, self.width, self.n_channels], dtype=self.obs_dtype)
+        for k in range(n_stack):
+            out[..., k * n_channels:(k + 1) * n_channels] = enc_obs[:, k:k + n_steps + 1]
+
+        # the frames of the first observation are stored as they were stacked, the next ones are zeroed when
+        # they come from before the last episode start
+        steps = np.arange(n_steps + 1)
+        episode_starts = np.where(masks, steps, 0)
+        episode_starts[:, 0] = 0
+        # the last episode start of each observation (0 if none since the first observation)
+        last_start = np.maximum.accumulate(episode_starts, axis=1)
+        for k in range(n_stack - 1):
+            # the k-th frame of the observation t is the newest frame of the observation t - (n_stack - 1 - k)
+            old_frames = (steps - (n_stack - 1 - k) < last_start) & (last_start > 0)
+            out[..., k * n_channels:(k + 1) * n_channels][old_frames] = 0
+        return out
 
     def put(self, enc_obs, actions, rewards, mus, dones, masks):
         """
@@ -97,19 +127,31 @@ class Buffer(object):
         :param dones: ([bool])
         :param masks: ([bool])
         """
-        # enc_obs [n_env, (n_steps + n_stack), nh, nw, nc]
+        # enc_obs [n_env, (n_steps + 1), nh, nw, nc]
         # actions, rewards, dones [n_env, n_steps]
         # mus [n_env, n_steps, n_act]
 
         if self.enc_obs is None:
-            self.enc_obs = np.empty([self.size] + list(enc_obs.shape), dtype=self.obs_dtype)
+            if self.n_stack > 1:
+                enc_obs_shape = [self.n_env, self.n_steps + self.n_stack, self.height, self.width,
+                                 self.frame_channels]
+            else:
+                enc_obs_shape = list(enc_obs.shape)
+            self.enc_obs = np.empty([self.size] + enc_obs_shape, dtype=self.obs_dtype)
             self.actions = np.empty([self.size] + list(actions.shape), dtype=np.int32)
             self.rewards = np.empty([self.size] + list(rewards.shape), dtype=np.float32)
             self.mus = np.empty([self.size] + list(mus.shape), dtype=np.float32)
             self.dones = np.empty([self.size] + list(dones.shape), dtype=np.bool)
             self.masks = np.empty([self.size] + list(masks.shape), dtype=np.bool)
 
-        self.enc_obs[self.next_idx] = enc_obs
+        if self.n_stack > 1:
+            frames = self.enc_obs[self.next_idx]
+            n_channels = self.frame_channels
+            for k in range(self.n_stack):
+                frames[:, k] = enc_obs[:, 0, ..., k * n_channels:(k + 1) * n_channels]
+            frames[:, self.n_stack:] = enc_obs[:, 1:, ..., -n_channels:]
+        else:
+            self.enc_obs[self.next_idx] = enc_obs
         self.actions[self.next_idx] = actions
         self.rewards[self.next_idx] = rewards
         self.mus[self.next_idx] = mus
@@ -119,25 +161,24 @@ class Buffer(object):
         self.next_idx = (self.next_idx + 1) % self.size
         self.num_in_buffer = min(self.size, self.num_in_buffer + 1)
 
-    def take(self, arr, idx, envx):
+    def take(self, arr, idx, envx, out=None):
         """
         Reads a frame from a list and index for the asked environment ids
-        
+
         :param arr: (np.ndarray) the array that is read
         :param idx: ([int]) the idx that are read
         :param envx: ([int]) the idx for the environments
+        :param out: (np.ndarray) the array receiving the frames (if None, a new one)
         :return: ([float]) the askes frames from the list
         """
-        n_env = self.n_env
-        out = np.empty([n_env] + list(arr.shape[2:]), dtype=arr.dtype)
-        for i in range(n_env):
-            out[i] = arr[idx[i], envx[i]]
-        return out
+        return gather_2d(arr, idx, envx, out=out)
 
     def get(self):
         """
         randomly read a frame from the buffer
-        
+
+        The returned arrays are reused (overwritten) by the next call.
+
         :return: ([float], [float], [float], [float], [bool], [float])
                  observations, actions, rewards, mus, dones, maskes
         """
@@ -148,15 +189,29 @@ class Buffer(object):
         n_env = self.n_env
         assert self.can_sample()
 
+        if self._samples is None:
+            self._samples = {name: np.empty((n_env,) + arr.shape[2:], dtype=arr.dtype)
+                             for name, arr in [('enc_obs', self.enc_obs), ('actions', self.actions),
+                                               ('rewards', self.rewards), ('mus', self.mus), ('dones', self.dones),
+                                               ('masks', self.masks)]}
+            if self.n_stack > 1:
+                self._samples['obs'] = np.empty([n_env, self.n_steps + 1, self.height, self.width, self.n_channels],
+                                                dtype=self.obs_dtype)
+        samples = self._samples
+
         # Sample exactly one id per env. If you sample across envs, then higher correlation in samples from same env.
         idx = np.random.randint(0, self.num_in_buffer, n_env)
         envx = np.arange(n_env)
 
-        dones = self.take(self.dones, idx, envx)
-        enc_obs = self.take(self.enc_obs, idx, envx)
-        obs = self.decode(enc_obs)
-        actions = self.take(self.actions, idx, envx)
-        rewards = self.take(self.rewards, idx, envx)
-        mus = self.take(self.mus, idx, envx)
-        masks = self.take(self.masks, idx, envx)
+        dones = self.take(self.dones, idx, envx, out=samples['dones'])
+        enc_obs = self.take(self.enc_obs, idx, envx, out=samples['enc_obs'])
+        masks = self.take(self.masks, idx, envx, out=samples['masks'])
+        if self.n_stack > 1:
+            obs = self.decode(enc_obs, masks, out=samples['obs'])
+        else:
+            # the observations are stored as they are
+            obs = enc_obs
+        actions = self.take(self.actions, idx, envx, out=samples['actions'])
+        rewards = self.take(self.rewards, idx, envx, out=samples['rewards'])
+        mus = self.take(self.mus, idx, envx, out=samples['mus'])
         return obs, actions, rewards, mus, dones, masks
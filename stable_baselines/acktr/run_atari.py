@@ -14,7 +14,7 @@ def train(env_id, num_timesteps, seed, num_cpu):
     :param seed: (int) The initial seed for training
     :param num_cpu: (int) The number of cpu to train on
     """
-    env = VecFrameStack(make_atari_env(env_id, num_cpu, seed), 4)
+    env = VecFrameStack(make_atari_env(env_id, num_cpu, seed), 4, copy=False)
     model = ACKTR(CnnPolicy, env, nprocs=num_cpu)
     model.learn(total_timesteps=int(num_timesteps * 1.1), seed=seed)
     env.close()
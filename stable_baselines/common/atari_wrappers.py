@@ -110,17 +110,23 @@ class EpisodicLifeEnv(gym.Wrapper):
 
 
 class MaxAndSkipEnv(gym.Wrapper):
-    def __init__(self, env, skip=4):
+    def __init__(self, env, skip=4, max_pool=True):
         """
         Return only every `skip`-th frame (frameskipping)
 
         :param env: (Gym Environment) the environment
         :param skip: (int) number of `skip`-th frame
+        :param max_pool: (bool) whether to return the maximum of the last two frames, or the two frames stacked
+            on a new first axis (to max pool the frames of all the environments at once, see VecAtariPreprocess)
         """
         gym.Wrapper.__init__(self, env)
         # most recent raw observations (for max pooling across time steps)
         self._obs_buffer = np.zeros((2,)+env.observation_space.shape, dtype=env.observation_space.dtype)
         self._skip = skip
+        self.max_pool = max_pool
+        if not max_pool:
+            self.observation_space = spaces.Box(low=0, high=255, shape=self._obs_buffer.shape,
+                                                dtype=env.observation_space.dtype)
 
     def step(self, action):
         """
@@ -143,12 +149,17 @@ class MaxAndSkipEnv(gym.Wrapper):
                 break
         # Note that the observation on the done=True frame
         # doesn't matter
+        if not self.max_pool:
+            return np.copy(self._obs_buffer), total_reward, done, info
         max_frame = self._obs_buffer.max(axis=0)
 
         return max_frame, total_reward, done, info
 
     def reset(self, **kwargs):
-        return self.env.reset(**kwargs)
+        obs = self.env.reset(**kwargs)
+        if not self.max_pool:
+            return np.stack([obs, obs])
+        return obs
 
 
 class ClipRewardEnv(gym.RewardWrapper):
@@ -274,21 +285,22 @@ class LazyFrames(object):
         return self._force()[i]
 
 
-def make_atari(env_id):
+def make_atari(env_id, max_pool=True):
     """
     Create a wrapped atari envrionment
 
     :param env_id: (str) the environment ID
+    :param max_pool: (bool) whether to max pool the last two frames of the skipped frames (see MaxAndSkipEnv)
     :return: (Gym Environment) the wrapped atari environment
     """
     env = gym.make(env_id)
     assert 'NoFrameskip' in env.spec.id
     env = NoopResetEnv(env, noop_max=30)
-    env = MaxAndSkipEnv(env, skip=4)
+    env = MaxAndSkipEnv(env, skip=4, max_pool=max_pool)
     return env
 
 
-def wrap_deepmind(env, episode_life=True, clip_rewards=True, frame_stack=False, scale=False):
+def wrap_deepmind(env, episode_life=True, clip_rewards=True, frame_stack=False, scale=False, warp_frame=True):
     """
     Configure environment for DeepMind-style Atari.
 
@@ -297,13 +309,18 @@ def wrap_deepmind(env, episode_life=True, clip_rewards=True, frame_stack=False,
     :param clip_rewards: (bool) wrap the reward clipping wrapper
     :param frame_stack: (bool) wrap the frame stacking wrapper
     :param scale: (bool) wrap the scaling observation wrapper
+    :param warp_frame: (bool) wrap the frame warping wrapper (if False, the raw frames must be warped by the
+        vectorized environment, see VecAtariPreprocess)
     :return: (Gym Environment) the wrapped atari environment
     """
+    assert warp_frame or not (frame_stack or scale), \
+        "Error: the frames must be warped before being stacked or scaled."
     if episode_life:
         env = EpisodicLifeEnv(env)
     if 'FIRE' in env.unwrapped.get_action_meanings():
         env = FireResetEnv(env)
-    env = WarpFrame(env)
+    if warp_frame:
+        env = WarpFrame(env)
     if scale:
         env = ScaledFloatFrame(env)
     if clip_rewards:
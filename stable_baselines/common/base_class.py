@@ -9,6 +9,7 @@ import tensorflow as tf
 
 from stable_baselines.common import set_global_seeds
 from stable_baselines.common.policies import LstmPolicy, get_policy_from_name, ActorCriticPolicy
+from stable_baselines.common.replay_prefetcher import ReplayPrefetcher
 from stable_baselines.common.vec_env import VecEnvWrapper, VecEnv, DummyVecEnv
 from stable_baselines import logger
 
@@ -399,6 +400,31 @@ class OffPolicyRLModel(BaseRLModel):
     def setup_model(self):
         pass
 
+    def _close_replay_prefetcher(self):
+        """
+        Stop the replay prefetcher used by the last call to `learn` (`_replay` attribute), if any
+        """
+        replay, self._replay = getattr(self, '_replay', None), None
+        if isinstance(replay, ReplayPrefetcher):
+            replay.close()
+
+    def save_replay_buffer(self, save_path):
+        """
+        Save the replay buffer (e.g. next to the model saved with `save`), streamed in compressed chunks.
+
+        :param save_path: (str or file-like) the save location
+        """
+        self.replay_buffer.save(save_path)
+
+    def load_replay_buffer(self, load_path, n_workers=None):
+        """
+        Restore the replay buffer saved with `save_replay_buffer`, the chunks are decompressed in parallel.
+
+        :param load_path: (str) the saved replay buffer
+        :param n_workers: (int) the number of threads loading the buffer (if None, use the default)
+        """
+        self.replay_buffer.load(load_path, n_workers=n_workers)
+
     @abstractmethod
     def learn(self, total_timesteps, callback=None, seed=None, log_interval=100, tb_log_name="run"):
         pass
@@ -0,0 +1,127 @@
+import io
+import os
+import json
+import zipfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+# approximate size of the (uncompressed) chunks of the replay buffer snapshots
+DEFAULT_CHUNK_BYTES = 8 * 1024 ** 2
+
+
+def open_memmap(path, shape, dtype):
+    """
+    Open the numpy memory-mapped array stored in a `.npy` file, or create it (filled with zeros) if it does not exist.
+
+    :param path: (str) the path of the `.npy` file
+    :param shape: (tuple) the shape of the array
+    :param dtype: (numpy dtype) the type of the array
+    :return: (np.memmap) the memory-mapped array
+    """
+    if not os.path.exists(path):
+        return np.lib.format.open_memmap(path, mode='w+', dtype=dtype, shape=shape)
+    array = np.lib.format.open_memmap(path, mode='r+')
+    if array.shape != tuple(shape) or array.dtype != np.dtype(dtype):
+        raise ValueError("Error: the array stored in {} has shape {} and dtype {}, expected shape {} and dtype {}."
+                         .format(path, array.shape, array.dtype, tuple(shape), np.dtype(dtype)))
+    return array
+
+
+def _to_json(value):
+    # numpy scalars are not serializable by json
+    return value.item()
+
+
+def save_chunked(save_path, arrays, metadata, chunk_bytes=DEFAULT_CHUNK_BYTES):
+    """
+    Save arrays to a zip file, split along their first axis into compressed chunks that are written one after the
+    other, so no copy of the whole arrays is made. The chunks that are filled with zeros are not written.
+
+    :param save_path: (str or file-like) where to save the arrays
+    :param arrays: (dict) the arrays to save, by name
+    :param metadata: (dict) json serializable data saved along the arrays
+    :param chunk_bytes: (int) approximate size in bytes of the uncompressed chunks
+    """
+    header = {'metadata': metadata, 'arrays': {}}
+    for name, array in arrays.items():
+        row_bytes = max(1, array[:1].nbytes)
+        header['arrays'][name] = {
+            'shape': list(array.shape),
+            'dtype': array.dtype.str,
+            'chunk_rows': max(1, chunk_bytes // row_bytes)
+        }
+
+    with zipfile.ZipFile(save_path, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr('header.json', json.dumps(header, default=_to_json))
+        for name, array in arrays.items():
+            chunk_rows = header['arrays'][name]['chunk_rows']
+            for chunk_idx, start in enumerate(range(0, len(array), chunk_rows)):
+                chunk = array[start:start + chunk_rows]
+                if not chunk.any():
+                    continue
+                # ZipFile.open does not write before python 3.6
+                chunk_file = io.BytesIO()
+                np.lib.format.write_array(chunk_file, np.ascontiguousarray(chunk))
+                archive.writestr('{}/{}.npy'.format(name, chunk_idx), chunk_file.getvalue())
+
+
+def read_chunked_metadata(load_path):
+    """
+    Read the metadata saved by `save_chunked`, without loading the arrays.
+
+    :param load_path: (str) the zip file to read
+    :return: (dict) the metadata saved along the arrays
+    """
+    with zipfile.ZipFile(load_path) as archive:
+        return json.loads(archive.read('header.json').decode('utf-8'))['metadata']
+
+
+def load_chunked(load_path, allocate, n_workers=None):
+    """
+    Load arrays saved with `save_chunked`, decompressing the chunks in parallel directly into the arrays
+    returned by `allocate`.
+
+    :param load_path: (str) the zip file to load
+    :param allocate: (function (str, tuple, numpy dtype): np.ndarray) returns the array to fill, given the name,
+        shape and dtype of a saved array
+    :param n_workers: (int) the number of threads loading chunks (if None, the default of ThreadPoolExecutor)
+    :return: (dict) the metadata saved along the arrays
+    """
+    with zipfile.ZipFile(load_path) as archive:
+        header = json.loads(archive.read('header.json').decode('utf-8'))
+        saved_chunks = set(archive.namelist())
+
+    jobs = []
+    for name, info in header['arrays'].items():
+        target = allocate(name, tuple(info['shape']), np.dtype(info['dtype']))
+        chunk_rows = info['chunk_rows']
+        for chunk_idx, start in enumerate(range(0, info['shape'][0], chunk_rows)):
+            jobs.append((target, '{}/{}.npy'.format(name, chunk_idx), slice(start, start + chunk_rows)))
+
+    # each thread reads from its own handle on the zip file
+    local = threading.local()
+    archives = []
+    lock = threading.Lock()
+
+    def _load_chunk(job):
+        target, chunk_name, rows = job
+        if chunk_name not in saved_chunks:
+            target[rows] = 0
+            return
+        if not hasattr(local, 'archive'):
+            local.archive = zipfile.ZipFile(load_path)
+            with lock:
+                archives.append(local.archive)
+        with local.archive.open(chunk_name) as file_handler:
+            target[rows] = np.lib.format.read_array(file_handler)
+
+    try:
+        with ThreadPoolExecutor(max_workers=n_workers) as executor:
+            # consume the results to raise the errors of the workers
+            list(executor.map(_load_chunk, jobs))
+    finally:
+        for archive in archives:
+            archive.close()
+    return header['metadata']
@@ -13,9 +13,11 @@ from stable_baselines.bench import Monitor
 from stable_baselines.common import set_global_seeds
 from stable_baselines.common.atari_wrappers import make_atari, wrap_deepmind
 from stable_baselines.common.vec_env.subproc_vec_env import SubprocVecEnv
+from stable_baselines.common.vec_env.vec_atari_preprocess import VecAtariPreprocess
 
 
-def make_atari_env(env_id, num_env, seed, wrapper_kwargs=None, start_index=0, allow_early_resets=True):
+def make_atari_env(env_id, num_env, seed, wrapper_kwargs=None, start_index=0, allow_early_resets=True,
+                   vec_preprocess=False):
     """
     Create a wrapped, monitored SubprocVecEnv for Atari.
 
@@ -25,6 +27,8 @@ def make_atari_env(env_id, num_env, seed, wrapper_kwargs=None, start_index=0, al
     :param wrapper_kwargs: (dict) the parameters for wrap_deepmind function
     :param start_index: (int) start rank index
     :param allow_early_resets: (bool) allows early reset of the environment
+    :param vec_preprocess: (bool) whether to preprocess the frames of all the environments at once in the main
+        process (VecAtariPreprocess): the processes return their raw frames through shared memory
     :return: (Gym Environment) The atari environment
     """
     if wrapper_kwargs is None:
@@ -32,13 +36,18 @@ def make_atari_env(env_id, num_env, seed, wrapper_kwargs=None, start_index=0, al
 
     def make_env(rank):
         def _thunk():
-            env = make_atari(env_id)
+            env = make_atari(env_id, max_pool=not vec_preprocess)
             env.seed(seed + rank)
             env = Monitor(env, logger.get_dir() and os.path.join(logger.get_dir(), str(rank)),
                           allow_early_resets=allow_early_resets)
+            if vec_preprocess:
+                return wrap_deepmind(env, warp_frame=False, **wrapper_kwargs)
             return wrap_deepmind(env, **wrapper_kwargs)
         return _thunk
     set_global_seeds(seed)
+    if vec_preprocess:
+        return VecAtariPreprocess(SubprocVecEnv([make_env(i + start_index) for i in range(num_env)],
+                                                shared_memory=True))
     return SubprocVecEnv([make_env(i + start_index) for i in range(num_env)])
 
 
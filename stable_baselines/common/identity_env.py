@@ -3,6 +3,8 @@ import numpy as np
 from gym import Env
 from gym.spaces import Discrete, MultiDiscrete, MultiBinary, Box
 
+from stable_baselines.common.vec_env import BatchedEnv
+
 
 class IdentityEnv(Env):
     def __init__(self, dim, ep_length=100):
@@ -103,3 +105,117 @@ class IdentityEnvMultiBinary(IdentityEnv):
         self.action_space = MultiBinary(dim)
         self.observation_space = self.action_space
         self.reset()
+
+
+class BatchedIdentityEnv(BatchedEnv):
+    def __init__(self, dim, n_envs, ep_length=100):
+        """
+        Identity environments for testing purposes, stepping `n_envs` instances of IdentityEnv at once
+
+        :param dim: (int) the size of the dimensions you want to learn
+        :param n_envs: (int) the number of environments
+        :param ep_length: (int) the length of each episodes in timesteps
+        """
+        self.dim = dim
+        self.ep_length = ep_length
+        self.np_random = np.random.RandomState()
+        super(BatchedIdentityEnv, self).__init__(n_envs, *self._spaces())
+        self.current_step = np.zeros(n_envs, dtype=np.int64)
+        self.state = self._sample_states(n_envs)
+
+    def _spaces(self):
+        space = Discrete(self.dim)
+        return space, space
+
+    def _sample_states(self, n_states):
+        return self.np_random.randint(self.dim, size=n_states)
+
+    def _get_rewards(self, actions):
+        return (self.state == actions).astype(np.float32)
+
+    def seed(self, seed=None):
+        self.np_random.seed(seed)
+
+    def step_envs(self, actions):
+        rewards = self._get_rewards(np.asarray(actions))
+        self.state = self._sample_states(self.num_envs)
+        self.current_step += 1
+        dones = self.current_step >= self.ep_length
+        return np.copy(self.state), rewards, dones, [{} for _ in range(self.num_envs)]
+
+    def reset_envs(self, env_mask):
+        self.current_step[env_mask] = 0
+        self.state[env_mask] = self._sample_states(np.count_nonzero(env_mask))
+        return np.copy(self.state)
+
+
+class BatchedIdentityEnvBox(BatchedIdentityEnv):
+    def __init__(self, n_envs, low=-1, high=1, eps=0.05, ep_length=100):
+        """
+        Identity environments for testing purposes, stepping `n_envs` instances of IdentityEnvBox at once
+
+        :param n_envs: (int) the number of environments
+        :param low: (float) the lower bound of the box dim
+        :param high: (float) the upper bound of the box dim
+        :param eps: (float) the epsilon bound for correct value
+        :param ep_length: (int) the length of each episodes in timesteps
+        """
+        self.low = low
+        self.high = high
+        self.eps = eps
+        super(BatchedIdentityEnvBox, self).__init__(1, n_envs, ep_length)
+
+    def _spaces(self):
+        space = Box(low=self.low, high=self.high, shape=(1,), dtype=np.float32)
+        return space, space
+
+    def _sample_states(self, n_states):
+        return self.np_random.uniform(self.low, self.high, size=(n_states, 1)).astype(np.float32)
+
+    def _get_rewards(self, actions):
+        actions = actions.reshape(self.state.shape)
+        return np.all(np.abs(actions - self.state) <= self.eps, axis=1).astype(np.float32)
+
+
+class BatchedIdentityEnvMultiDiscrete(BatchedIdentityEnv):
+    def __init__(self, dim, n_envs, ep_length=100):
+        """
+        Identity environments for testing purposes, stepping `n_envs` instances of IdentityEnvMultiDiscrete at once
+
+        :param dim: (int) the size of the dimensions you want to learn
+        :param n_envs: (int) the number of environments
+        :param ep_length: (int) the length of each episodes in timesteps
+        """
+        super(BatchedIdentityEnvMultiDiscrete, self).__init__(dim, n_envs, ep_length)
+
+    def _spaces(self):
+        space = MultiDiscrete([self.dim, self.dim])
+        return space, space
+
+    def _sample_states(self, n_states):
+        return self.np_random.randint(self.dim, size=(n_states, 2))
+
+    def _get_rewards(self, actions):
+        return np.all(self.state == actions, axis=1).astype(np.float32)
+
+
+class BatchedIdentityEnvMultiBinary(BatchedIdentityEnv):
+    def __init__(self, dim, n_envs, ep_length=100):
+        """
+        Identity environments for testing purposes, stepping `n_envs` instances of IdentityEnvMultiBinary at once
+
+        :param dim: (int) the size of the dimensions you want to learn
+        :param n_envs: (int) the number of environments
+        :param ep_length: (int) the length of each episodes in timesteps
+        """
+        super(BatchedIdentityEnvMultiBinary, self).__init__(dim, n_envs, ep_length)
+
+    def _spaces(self):
+        space = MultiBinary(self.dim)
+        return space, space
+
+    def _sample_states(self, n_states):
+        return self.np_random.randint(2, size=(n_states, self.dim)).astype(np.int8)
+
+    def _get_rewards(self, actions):
+        return np.all(self.state == actions, axis=1).astype(np.float32)
@@ -101,3 +101,26 @@ def discount_with_boundaries(rewards, episode_starts, gamma):
     for step in range(n_samples - 2, -1, -1):
         discounted_rewards[step] = rewards[step] + gamma * discounted_rewards[step + 1] * (1 - episode_starts[step + 1])
     return discounted_rewards
+
+
+def gather_2d(array, idxs_0, idxs_1, out=None):
+    """
+    Gather `array[idxs_0, idxs_1]` (the values at the given indexes of the first two axes), into `out` if given.
+
+    The indexes are flattened and gathered with `np.take(mode='clip')`, which writes directly into `out`, whereas the
+    default mode gathers into a temporary buffer first. As 'clip' would silently clamp invalid indexes, the indexes
+    are checked beforehand.
+
+    :param array: (np.ndarray) the array, of at least 2 dimensions
+    :param idxs_0: (np.ndarray) the indexes along the first axis
+    :param idxs_1: (np.ndarray) the indexes along the second axis
+    :param out: (np.ndarray) the array receiving the values, of shape (len(idxs_0),) + array.shape[2:] (if None, a new
+        one)
+    :return: (np.ndarray) the gathered values
+    """
+    idxs_0, idxs_1 = np.asarray(idxs_0), np.asarray(idxs_1)
+    for idxs, size in [(idxs_0, array.shape[0]), (idxs_1, array.shape[1])]:
+        if idxs.size > 0 and (idxs.min() < 0 or idxs.max() >= size):
+            raise IndexError("Error: the indexes must be in [0, {}).".format(size))
+    flat_idxs = idxs_0 * array.shape[1] + idxs_1
+    return np.take(array.reshape((-1,) + array.shape[2:]), flat_idxs, axis=0, out=out, mode='clip')
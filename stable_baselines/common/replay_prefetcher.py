@@ -0,0 +1,92 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import numpy as np
+
+
+class ReplayPrefetcher(object):
+    def __init__(self, replay_buffer, n_batches=2):
+        """
+        Sample the next minibatches of a replay buffer in a background thread,
+        while the current gradient step runs.
+
+        It has the same `sample`, `add`/`append` and `update_priorities` methods as the wrapped replay buffer.
+        The buffer must be modified through these methods only: a modification first waits for all the requested
+        batches to be gathered, so each batch is sampled from the buffer as it was when the batch was requested.
+        A batch is returned `n_batches` calls to `sample` after its request (with the arguments of that call), so
+        the priorities or the arguments of `sample` used by a batch lag behind by `n_batches` steps.
+
+        The thread gathers the batches one after the other, ahead of the calls to `sample` made without modifying
+        the buffer in between (e.g. several gradient steps per environment step). When the buffer is modified
+        after each call to `sample`, only the next batch is gathered in the background, whatever `n_batches`.
+
+        The sampled indexes come from a random generator of the prefetcher, seeded from numpy's global one on the first
+        call to `sample`: the global random stream is not used by the thread and the batches are reproducible.
+
+        :param replay_buffer: (ReplayBuffer or Memory) the replay buffer, its `sample` method must accept an `rng`
+            keyword argument
+        :param n_batches: (int) the number of minibatches requested in advance
+        """
+        assert n_batches >= 1, "Error: the number of prefetched batches must be at least 1."
+        self.replay_buffer = replay_buffer
+        self.n_batches = n_batches
+        # the worker thread stops once the executor is garbage collected
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        # the futures of the requested batches, in the order of the requests
+        self._pending = deque()
+        self._rng = None
+        self._sample_args = None
+
+    def _request(self):
+        batch_size, sample_kwargs = self._sample_args
+        self._pending.append(self._executor.submit(self.replay_buffer.sample, batch_size, rng=self._rng,
+                                                   **sample_kwargs))
+
+    def _wait_gathered(self):
+        # the buffer must not change while the worker gathers a batch
+        wait(self._pending)
+
+    def sample(self, batch_size, **sample_kwargs):
+        """
+        Return the next prefetched batch, and request a new one.
+
+        :param batch_size: (int) How many transitions to sample.
+        :param sample_kwargs: (dict) the other arguments of the `sample` method of the replay buffer
+        :return: (Any) the batch returned by the `sample` method of the replay buffer
+        """
+        if self._rng is None:
+            self._rng = np.random.RandomState(np.random.randint(2 ** 31 - 1))
+        self._sample_args = (batch_size, sample_kwargs)
+        while len(self._pending) < self.n_batches:
+            self._request()
+        batch = self._pending.popleft().result()
+        self._request()
+        return batch
+
+    def add(self, *args, **kwargs):
+        """
+        Add a transition to the replay buffer, see ReplayBuffer.add
+        """
+        self._wait_gathered()
+        self.replay_buffer.add(*args, **kwargs)
+
+    def append(self, *args, **kwargs):
+        """
+        Append a transition to the replay buffer, see Memory.append
+        """
+        self._wait_gathered()
+        self.replay_buffer.append(*args, **kwargs)
+
+    def update_priorities(self, idxes, priorities):
+        """
+        Update the priorities of sampled transitions, see PrioritizedReplayBuffer.update_priorities
+        """
+        self._wait_gathered()
+        self.replay_buffer.update_priorities(idxes, priorities)
+
+    def close(self):
+        """
+        Wait for the batches being gathered and stop the background thread.
+        """
+        self._executor.shutdown(wait=True)
+        self._pending.clear()
@@ -1,4 +1,5 @@
 import numpy as np
+import gym
 from abc import ABC, abstractmethod
 
 
@@ -7,6 +8,9 @@ class AbstractEnvRunner(ABC):
         """
         A runner to learn the policy of an environment for a model
 
+        When the environment returns the ids of the environments of each step (`env_ids` attribute, see
+        AsyncSubprocVecEnv), the steps are gathered by environment id: the runners then use `_run_env_ids`.
+
         :param env: (Gym environment) The environment to learn from
         :param model: (Model) The model to learn
         :param n_steps: (int) The number of steps to run for each environment
@@ -20,6 +24,8 @@ class AbstractEnvRunner(ABC):
         self.n_steps = n_steps
         self.states = model.initial_state
         self.dones = [False for _ in range(n_env)]
+        self.env_ids = getattr(env.unwrapped, 'env_ids', None)
+        self.trajectories = EnvIdTrajectories() if self.env_ids is not None else None
 
     @abstractmethod
     def run(self):
@@ -27,3 +33,244 @@ class AbstractEnvRunner(ABC):
         Run a learning step of the model
         """
         raise NotImplementedError
+
+    def _run_env_ids(self, n_transitions, gamma, lam):
+        """
+        Run the model until `n_transitions` transitions are complete, for an environment returning a different
+        subset of its environments at each step (`env_ids` attribute)
+
+        :param n_transitions: (int) the number of transitions to return
+        :param gamma: (float) Discount factor
+        :param lam: (float) Factor for trade-off of bias vs variance for Generalized Advantage Estimator
+        :return: (dict, [dict]) the transitions (see EnvIdTrajectories.pop), and the episode infos
+        """
+        assert self.states is None, "Error: the recurrent policies do not support the environment ids."
+        ep_infos = []
+        while self.trajectories.n_complete < n_transitions:
+            actions, values, _, neglogpacs = self.model.step(self.obs, self.states, self.dones)
+            self.trajectories.add_actions(self.env_ids, self.obs, actions, values, neglogpacs)
+            clipped_actions = actions
+            # Clip the actions to avoid out of bound error
+            if isinstance(self.env.action_space, gym.spaces.Box):
+                clipped_actions = np.clip(actions, self.env.action_space.low, self.env.action_space.high)
+            self.obs[:], rewards, self.dones, infos = self.env.step(clipped_actions)
+            self.env_ids = self.env.unwrapped.env_ids
+            self.trajectories.add_results(self.env_ids, rewards, self.dones)
+            for info in infos:
+                maybe_ep_info = info.get('episode')
+                if maybe_ep_info is not None:
+                    ep_infos.append(maybe_ep_info)
+        last_values = dict(zip(self.env_ids, self.model.value(self.obs, self.states, self.dones)))
+        return self.trajectories.pop(n_transitions, last_values, gamma, lam), ep_infos
+
+
+class EnvIdTrajectories(object):
+    def __init__(self, capacity=16):
+        """
+        The trajectories of each environment, for the environments returning a different subset of environments at
+        each step: the transitions of an environment are complete once its next observation is returned.
+
+        The transitions are written in preallocated arrays indexed by environment id and position in the trajectory
+        of the environment, grown (doubled) when an environment id or a trajectory does not fit.
+
+        :param capacity: (int) the number of transitions of each environment allocated first
+        """
+        self.n_complete = 0
+        self._n_added = 0
+        # the arrays of the fields, of shape (n_envs, capacity, ...), allocated from the first transitions
+        self.arrays = {}
+        # the number of transitions of each environment, complete or not, and the number of complete ones
+        self._n_transitions = np.zeros(0, dtype=np.int64)
+        self._n_complete = np.zeros(0, dtype=np.int64)
+        # whether the next observation of each environment is the start of an episode
+        self._episode_starts = np.zeros(0, dtype=np.bool)
+        self._capacity = capacity
+
+    def _reserve(self, env_ids):
+        """
+        Grow the arrays so that each of the given environments can hold one more transition
+
+        :param env_ids: (np.ndarray) the ids of the environments
+        """
+        n_envs = max(len(self._n_transitions), int(env_ids.max()) + 1)
+        capacity = self._capacity
+        while capacity <= self._n_transitions[env_ids[env_ids < len(self._n_transitions)]].max(initial=0):
+            capacity *= 2
+        if n_envs == len(self._n_transitions) and capacity == self._capacity:
+            return
+        for name, array in self.arrays.items():
+            grown = np.zeros((n_envs, capacity) + array.shape[2:], dtype=array.dtype)
+            grown[:array.shape[0], :array.shape[1]] = array
+            self.arrays[name] = grown
+        n_new = n_envs - len(self._n_transitions)
+        self._n_transitions = np.concatenate([self._n_transitions, np.zeros(n_new, dtype=np.int64)])
+        self._n_complete = np.concatenate([self._n_complete, np.zeros(n_new, dtype=np.int64)])
+        self._episode_starts = np.concatenate([self._episode_starts, np.zeros(n_new, dtype=np.bool)])
+        self._capacity = capacity
+
+    def _write(self, name, env_ids, positions, values, dtype=None):
+        values = np.asarray(values, dtype=dtype)
+        array = self.arrays.get(name)
+        if array is None:
+            array = np.zeros((len(self._n_transitions), self._capacity) + values.shape[1:], dtype=values.dtype)
+            self.arrays[name] = array
+        array[env_ids, positions] = values
+
+    def add_actions(self, env_ids, obs, actions, values, neglogpacs):
+        """
+        Add the transitions started by the actions taken in some environments
+
+        :param env_ids: ([int]) the ids of the environments
+        :param obs: (np.ndarray) the observations of the environments
+        :param actions: (np.ndarray) the actions
+        :param values: (np.ndarray) the value function output
+        :param neglogpacs: (np.ndarray) the negative log probabilities of the actions
+        """
+        env_ids = np.asarray(env_ids, dtype=np.int64)
+        self._reserve(env_ids)
+        positions = self._n_transitions[env_ids]
+        self._write('obs', env_ids, positions, obs)
+        self._write('actions', env_ids, positions, actions)
+        self._write('values', env_ids, positions, values, np.float32)
+        self._write('neglogpacs', env_ids, positions, neglogpacs, np.float32)
+        self._write('masks', env_ids, positions, self._episode_starts[env_ids])
+        self._write('orders', env_ids, positions, self._n_added + np.arange(len(env_ids)))
+        self._n_transitions[env_ids] += 1
+        self._n_added += len(env_ids)
+
+    def add_results(self, env_ids, rewards, dones):
+        """
+        Complete the transitions of some environments with the results of their last actions
+
+        :param env_ids: ([int]) the ids of the environments
+        :param rewards: (np.ndarray) the rewards
+        :param dones: (np.ndarray) whether the episodes are over
+        """
+        env_ids = np.asarray(env_ids, dtype=np.int64)
+        self._reserve(env_ids)
+        self._episode_starts[env_ids] = dones
+        # the environments just reset have no transition to complete
+        started = self._n_transitions[env_ids] > self._n_complete[env_ids]
+        env_ids = env_ids[started]
+        positions = self._n_transitions[env_ids] - 1
+        self._write('rewards', env_ids, positions, np.asarray(rewards)[started], np.float32)
+        self._write('dones', env_ids, positions, np.asarray(dones)[started], np.bool)
+        self._n_complete[env_ids] += 1
+        self.n_complete += len(env_ids)
+
+    def pop(self, n_transitions, last_values, gamma, lam):
+        """
+        Remove and return the oldest complete transitions, with their advantages computed on the trajectory of
+        each environment (Generalized Advantage Estimator). The transitions are ordered by environment id, then by
+        time.
+
+        :param n_transitions: (int) the number of transitions
+        :param last_values: ({int: float}) the value of the last observation of the environments without a started
+            transition, by id
+        :param gamma: (float) Discount factor
+        :param lam: (float) Factor for trade-off of bias vs variance for Generalized Advantage Estimator
+        :return: ({str: np.ndarray}) the observations ('obs'), actions ('actions'), values ('values'),
+            negative log probabilities ('neglogpacs'), rewards ('rewards'), episode starts ('masks'), advantages
+            ('advs') and returns ('returns')
+        """
+        assert n_transitions <= self.n_complete, "Error: not enough complete transitions."
+        positions = np.arange(self._capacity)
+        complete = positions < self._n_complete[:, None]
+        orders = self.arrays['orders']
+        # the order of the last returned transition, the complete transitions of an environment are in order
+        max_order = np.partition(orders[complete], n_transitions - 1)[n_transitions - 1]
+        taken = complete & (orders <= max_order)
+        n_taken = taken.sum(axis=1)
+
+        values, rewards, dones = self.arrays['values'], self.arrays['rewards'], self.arrays['dones']
+        # the value following the last taken transition of each environment
+        env_ids = np.arange(len(n_taken))
+        next_values = values[env_ids, np.minimum(n_taken, self._capacity - 1)]
+        for env_id, last_value in last_values.items():
+            if n_taken[env_id] == self._n_transitions[env_id]:
+                next_values[env_id] = last_value
+        advs = np.zeros(values.shape, dtype=np.float32)
+        last_gae_lam = np.zeros(len(n_taken), dtype=np.float32)
+        for step in reversed(range(n_taken.max())):
+            active = step < n_taken
+            nextnonterminal = 1.0 - dones[:, step]
+            delta = rewards[:, step] + gamma * next_values * nextnonterminal - values[:, step]
+            last_gae_lam = np.where(active, delta + gamma * lam * nextnonterminal * last_gae_lam, 0)
+            advs[:, step] = last_gae_lam
+            next_values = np.where(active, values[:, step], next_values)
+
+        batch = {name: self.arrays[name][taken] for name in ['obs', 'actions', 'values', 'neglogpacs', 'rewards',
+                                                             'masks']}
+        batch['advs'] = advs[taken]
+        batch['returns'] = batch['advs'] + batch['values']
+
+        # move the remaining transitions of each environment to the start of its trajectory
+        rows = env_ids[:, None]
+        cols = np.minimum(positions + n_taken[:, None], self._capacity - 1)
+        for name, array in self.arrays.items():
+            array[:] = array[rows, cols]
+        self._n_transitions -= n_taken
+        self._n_complete -= n_taken
+        self.n_complete -= n_transitions
+        return batch
+
+
+class RolloutBuffer(object):
+    def __init__(self, n_envs, n_steps, dtypes=None, n_steps_by_field=None):
+        """
+        The values of the steps of the rollouts of the runners, written in place at each step.
+
+        The array of a field is allocated from the first values added to it (or its given type and shape), and reused
+        by the next rollouts. The value of the environment `env_idx` at the step `step` is at `[env_idx, step]`:
+        the flattened arrays are ordered by environment, then by step, and are views of the arrays.
+
+        :param n_envs: (int) the number of environments
+        :param n_steps: (int) the number of steps of a rollout
+        :param dtypes: ({str: np.dtype}) the type of the values of some fields (by default, the type of the first
+            values added)
+        :param n_steps_by_field: ({str: int}) the number of steps of the fields with more steps than `n_steps`
+            (e.g. the observations followed by the last observation)
+        """
+        self.n_envs = n_envs
+        self.n_steps = n_steps
+        self.dtypes = dtypes if dtypes is not None else {}
+        self.n_steps_by_field = n_steps_by_field if n_steps_by_field is not None else {}
+        self.arrays = {}
+
+    def array(self, name, shape=(), dtype=np.float32):
+        """
+        Return the array of a field, allocating it if needed
+
+        :param name: (str) the name of the field
+        :param shape: (tuple) the shape of a value of the field, if the array is allocated
+        :param dtype: (np.dtype) the type of the values of the field, if the array is allocated and its type is not
+            given to the constructor
+        :return: (np.ndarray) the values of the field, of shape (n_envs, n_steps) + shape
+        """
+        array = self.arrays.get(name)
+        if array is None:
+            n_steps = self.n_steps_by_field.get(name, self.n_steps)
+            array = np.zeros((self.n_envs, n_steps) + tuple(shape), dtype=self.dtypes.get(name, dtype))
+            self.arrays[name] = array
+        return array
+
+    def add(self, step, **values):
+        """
+        Write the values of all the environments at a step
+
+        :param step: (int) the index of the step in the rollout
+        :param values: ({str: np.ndarray}) the values of the environments, by field
+        """
+        for name, value in values.items():
+            value = np.asarray(value)
+            self.array(name, value.shape[1:], value.dtype)[:, step] = value
+
+    def flat(self, name):
+        """
+        Return the values of a field flattened over the environments and steps, ordered by environment then by step
+
+        :param name: (str) the name of the field
+        :return: (np.ndarray) a view of the values of the field, of shape (n_envs * n_steps,) + shape of a value
+        """
+        array = self.arrays[name]
+        return array.reshape((-1,) + array.shape[2:])
@@ -20,6 +20,25 @@ class RunningMeanStd(object):
         batch_count = arr.shape[0]
         self.update_from_moments(batch_mean, batch_var, batch_count)
 
+    def update_centered(self, arr, centered):
+        """
+        Update the moments with a batch, computing the moments of the batch relative to the current mean in a single
+        pass (sum and sum of squares), and updating the mean and variance arrays in place
+
+        :param arr: (np.ndarray) the batch
+        :param centered: (np.ndarray) a float64 array of the shape of the batch, overwritten with the centered batch
+        """
+        batch_count = arr.shape[0]
+        np.subtract(arr, self.mean, out=centered)
+        delta = centered.sum(axis=0) / batch_count
+        batch_var = np.einsum('i...,i...->...', centered, centered) / batch_count - np.square(delta)
+        tot_count = self.count + batch_count
+
+        m_2 = self.var * self.count + batch_var * batch_count + np.square(delta) * self.count * batch_count / tot_count
+        self.mean += delta * batch_count / tot_count
+        self.var[...] = m_2 / tot_count
+        self.count = tot_count
+
     def update_from_moments(self, batch_mean, batch_var, batch_count):
         delta = batch_mean - self.mean
         tot_count = self.count + batch_count
@@ -1,8 +1,10 @@
 import operator
 
+import numpy as np
+
 
 class SegmentTree(object):
-    def __init__(self, capacity, operation, neutral_element):
+    def __init__(self, capacity, operation, neutral_element, batch_operation=None):
         """
         Build a Segment Tree data structure.
 
@@ -17,30 +19,24 @@ class SegmentTree(object):
                `reduce` operation which reduces `operation` over
                a contiguous subsequence of items in the array.
 
+        The tree is stored in a numpy array, and items can be read or written in batches
+        by indexing with an array of indexes.
+
         :param capacity: (int) Total size of the array - must be a power of two.
         :param operation: (lambda (Any, Any): Any) operation for combining elements (eg. sum, max) must form a
             mathematical group together with the set of possible values for array elements (i.e. be associative)
         :param neutral_element: (Any) neutral element for the operation above. eg. float('-inf') for max and 0 for sum.
+        :param batch_operation: (numpy ufunc) element-wise version of `operation` on numpy arrays (eg. np.add), if None
+            `operation` is applied element by element
         """
         assert capacity > 0 and capacity & (capacity - 1) == 0, "capacity must be positive and a power of 2."
         self._capacity = capacity
-        self._value = [neutral_element for _ in range(2 * capacity)]
+        self._value = np.full(2 * capacity, neutral_element, dtype=np.float64)
         self._operation = operation
-
-    def _reduce_helper(self, start, end, node, node_start, node_end):
-        if start == node_start and end == node_end:
-            return self._value[node]
-        mid = (node_start + node_end) // 2
-        if end <= mid:
-            return self._reduce_helper(start, end, 2 * node, node_start, mid)
-        else:
-            if mid + 1 <= start:
-                return self._reduce_helper(start, end, 2 * node + 1, mid + 1, node_end)
-            else:
-                return self._operation(
-                    self._reduce_helper(start, mid, 2 * node, node_start, mid),
-                    self._reduce_helper(mid + 1, end, 2 * node + 1, mid + 1, node_end)
-                )
+        self._neutral_element = neutral_element
+        if batch_operation is None:
+            batch_operation = np.frompyfunc(operation, 2, 1)
+        self._batch_operation = batch_operation
 
     def reduce(self, start=0, end=None):
         """
@@ -57,10 +53,27 @@ class SegmentTree(object):
             end = self._capacity
         if end < 0:
             end += self._capacity
-        end -= 1
-        return self._reduce_helper(start, end, 1, 0, self._capacity - 1)
+        if start == 0 and end == self._capacity:
+            return self._value[1]
+        # bottom-up reduction over the leaves [start, end)
+        result = self._neutral_element
+        start += self._capacity
+        end += self._capacity
+        while start < end:
+            if start & 1:
+                result = self._operation(result, self._value[start])
+                start += 1
+            if end & 1:
+                end -= 1
+                result = self._operation(result, self._value[end])
+            start //= 2
+            end //= 2
+        return result
 
     def __setitem__(self, idx, val):
+        if np.ndim(idx) > 0:
+            self._set_batch(idx, val)
+            return
         # index of the leaf
         idx += self._capacity
         self._value[idx] = val
@@ -72,9 +85,34 @@ class SegmentTree(object):
             )
             idx //= 2
 
+    def _set_batch(self, idxes, vals):
+        """
+        Set the items at the given indexes, then update their parents one level at a time.
+
+        :param idxes: (np.ndarray) the indexes of the items
+        :param vals: (np.ndarray or float) the new values of the items
+        """
+        idxes = np.asarray(idxes, dtype=np.int64)
+        if len(idxes) == 0:
+            return
+        # numpy does not guarantee which write wins with duplicate indexes, keep the last value of each index
+        _, last = np.unique(idxes[::-1], return_index=True)
+        last = len(idxes) - 1 - last
+        vals = np.broadcast_to(vals, idxes.shape)[last]
+        # indexes of the leaves
+        idxes = idxes[last] + self._capacity
+        self._value[idxes] = vals
+        idxes //= 2
+        while idxes[0] >= 1:
+            self._value[idxes] = self._batch_operation(
+                self._value[2 * idxes],
+                self._value[2 * idxes + 1]
+            )
+            idxes //= 2
+
     def __getitem__(self, idx):
-        assert 0 <= idx < self._capacity
-        return self._value[self._capacity + idx]
+        assert np.all(0 <= np.asarray(idx)) and np.all(np.asarray(idx) < self._capacity)
+        return self._value[self._capacity + np.asarray(idx)]
 
 
 class SumSegmentTree(SegmentTree):
@@ -82,7 +120,8 @@ class SumSegmentTree(SegmentTree):
         super(SumSegmentTree, self).__init__(
             capacity=capacity,
             operation=operator.add,
-            neutral_element=0.0
+            neutral_element=0.0,
+            batch_operation=np.add
         )
 
     def sum(self, start=0, end=None):
@@ -104,9 +143,13 @@ class SumSegmentTree(SegmentTree):
         allows to sample indexes according to the discrete
         probability efficiently.
 
-        :param prefixsum: (float) upperbound on the sum of array prefix
-        :return: (int) highest index satisfying the prefixsum constraint
+        When given an array of prefix sums, all the searches descend the tree together, one level at a time.
+
+        :param prefixsum: (float or np.ndarray) upperbound on the sum of array prefix
+        :return: (int or np.ndarray) highest index satisfying the prefixsum constraint
         """
+        if np.ndim(prefixsum) > 0:
+            return self._find_prefixsum_idx_batch(prefixsum)
         assert 0 <= prefixsum <= self.sum() + 1e-5
         idx = 1
         while idx < self._capacity:  # while non-leaf
@@ -117,13 +160,25 @@ class SumSegmentTree(SegmentTree):
                 idx = 2 * idx + 1
         return idx - self._capacity
 
+    def _find_prefixsum_idx_batch(self, prefixsums):
+        prefixsums = np.array(prefixsums, dtype=np.float64)
+        assert np.all(0 <= prefixsums) and np.all(prefixsums <= self.sum() + 1e-5)
+        idxes = np.ones(len(prefixsums), dtype=np.int64)
+        while idxes[0] < self._capacity:  # while non-leaf, all the searches are at the same depth
+            left_values = self._value[2 * idxes]
+            go_right = left_values <= prefixsums
+            prefixsums -= np.where(go_right, left_values, 0.0)
+            idxes = 2 * idxes + go_right
+        return idxes - self._capacity
+
 
 class MinSegmentTree(SegmentTree):
     def __init__(self, capacity):
         super(MinSegmentTree, self).__init__(
             capacity=capacity,
             operation=min,
-            neutral_element=float('inf')
+            neutral_element=float('inf'),
+            batch_operation=np.minimum
         )
 
     def min(self, start=0, end=None):
@@ -1,8 +1,13 @@
 # flake8: noqa F401
 from stable_baselines.common.vec_env.base_vec_env import AlreadySteppingError, NotSteppingError, VecEnv, VecEnvWrapper, \
     CloudpickleWrapper
+from stable_baselines.common.vec_env.batched_env import BatchedEnv
+from stable_baselines.common.vec_env.codec import VecEnvCodec
 from stable_baselines.common.vec_env.dummy_vec_env import DummyVecEnv
-from stable_baselines.common.vec_env.subproc_vec_env import SubprocVecEnv
+from stable_baselines.common.vec_env.subproc_vec_env import SubprocVecEnv, AsyncSubprocVecEnv
+from stable_baselines.common.vec_env.remote_vec_env import RemoteVecEnv, EnvServer
+from stable_baselines.common.vec_env.thread_vec_env import ThreadVecEnv
 from stable_baselines.common.vec_env.vec_frame_stack import VecFrameStack
+from stable_baselines.common.vec_env.vec_monitor import VecMonitor
 from stable_baselines.common.vec_env.vec_normalize import VecNormalize
 from stable_baselines.common.vec_env.vec_video_recorder import VecVideoRecorder
@@ -0,0 +1,66 @@
+from abc import abstractmethod
+
+import numpy as np
+
+from stable_baselines.common.vec_env.base_vec_env import VecEnv
+
+
+class BatchedEnv(VecEnv):
+    """
+    A vectorized environment computing the steps of all its environments at once (e.g. with numpy array operations),
+    instead of wrapping one Gym environment per environment.
+
+    The subclasses implement `step_envs`, stepping all the environments, and `reset_envs`, resetting some of them:
+    the environments whose episode is over are reset after each step, as with the other vectorized environments.
+
+    :param num_envs: (int) the number of environments
+    :param observation_space: (Gym Space) the observation space of an environment
+    :param action_space: (Gym Space) the action space of an environment
+    """
+
+    def __init__(self, num_envs, observation_space, action_space):
+        VecEnv.__init__(self, num_envs, observation_space, action_space)
+        self.actions = None
+
+    @abstractmethod
+    def step_envs(self, actions):
+        """
+        Step all the environments with the given actions, without resetting the environments whose episode is over
+
+        :param actions: (np.ndarray) the actions of the environments
+        :return: (np.ndarray, np.ndarray, np.ndarray, [dict]) observations, rewards, dones, information
+        """
+        pass
+
+    @abstractmethod
+    def reset_envs(self, env_mask):
+        """
+        Reset some of the environments
+
+        :param env_mask: (np.ndarray) whether to reset each environment (booleans)
+        :return: (np.ndarray) the observations of all the environments
+        """
+        pass
+
+    def seed(self, seed=None):
+        """
+        Seed the random generator of the environments
+
+        :param seed: (int) the seed
+        """
+        pass
+
+    def step_async(self, actions):
+        self.actions = actions
+
+    def step_wait(self):
+        obs, rewards, dones, infos = self.step_envs(self.actions)
+        if np.any(dones):
+            obs = self.reset_envs(dones)
+        return obs, rewards, dones, infos
+
+    def reset(self):
+        return self.reset_envs(np.ones(self.num_envs, dtype=np.bool))
+
+    def close(self):
+        return
@@ -0,0 +1,109 @@
+import numbers
+import zlib
+
+import numpy as np
+from gym import spaces
+
+
+class VecEnvCodec(object):
+    def __init__(self, downcast_float64=True, compress_uint8=False, compress_level=1, compact_infos=False):
+        """
+        The encoding of the observations and infos sent by the processes of a SubprocVecEnv: the processes encode
+        the results of their environments, and the main process decodes them into its buffers.
+
+        The observation space must not be a Dict or Tuple space.
+
+        Subclass it and override `encode_obs`/`decode_obs`, `encode_infos`/`decode_infos` and `observation_space`
+        for other encodings. The codec is sent to the processes, so it must be picklable.
+
+        :param downcast_float64: (bool) whether to send the float64 observations as float32 (the observation space
+            of the vectorized environment is then float32)
+        :param compress_uint8: (bool) whether to compress the uint8 observations (e.g. images) with zlib
+        :param compress_level: (int) the zlib compression level, from 1 (fastest) to 9 (smallest)
+        :param compact_infos: (bool) whether to send the infos with the same keys and only numeric scalar values as
+            one array per key (the values are then decoded as Python numbers). The arrays only make the messages
+            smaller with many environments per process (about 64 or more), the infos are pickled as they are otherwise.
+        """
+        self.downcast_float64 = downcast_float64
+        self.compress_uint8 = compress_uint8
+        self.compress_level = compress_level
+        self.compact_infos = compact_infos
+
+    def observation_space(self, observation_space):
+        """
+        Get the observation space of the decoded observations
+
+        :param observation_space: (Gym Space) the observation space of the environments
+        :return: (Gym Space) the observation space of the vectorized environment
+        """
+        if self.downcast_float64 and isinstance(observation_space, spaces.Box) and \
+                observation_space.dtype == np.float64:
+            return spaces.Box(low=observation_space.low.astype(np.float32),
+                              high=observation_space.high.astype(np.float32), dtype=np.float32)
+        return observation_space
+
+    def encode_obs(self, obs):
+        """
+        Encode the observations of the environments of a process
+
+        :param obs: (np.ndarray) the stacked observations
+        :return: (Any) the encoded observations
+        """
+        if self.downcast_float64 and obs.dtype == np.float64:
+            return obs.astype(np.float32)
+        if self.compress_uint8 and obs.dtype == np.uint8:
+            return zlib.compress(np.ascontiguousarray(obs).tobytes(), self.compress_level)
+        return obs
+
+    def decode_obs(self, data, out):
+        """
+        Decode the observations of the environments of a process
+
+        :param data: (Any) the encoded observations
+        :param out: (np.ndarray) the array receiving the observations
+        :return: (np.ndarray) out
+        """
+        if isinstance(data, bytes):
+            out[...] = np.frombuffer(zlib.decompress(data), dtype=out.dtype).reshape(out.shape)
+        else:
+            out[...] = data
+        return out
+
+    def encode_infos(self, infos):
+        """
+        Encode the infos of the environments of a process
+
+        :param infos: ([dict]) the infos
+        :return: (Any) the encoded infos
+        """
+        if not self.compact_infos or len(infos) == 0:
+            return infos
+        keys = list(infos[0].keys())
+        if any(info.keys() != infos[0].keys() for info in infos):
+            return infos
+        columns = []
+        for key in keys:
+            values = [info[key] for info in infos]
+            value_type = type(values[0])
+            # the values of a key must have the same type, to get them back from the array
+            if not issubclass(value_type, (numbers.Real, np.bool_)) or \
+                    any(type(value) is not value_type for value in values):
+                return infos
+            columns.append(np.array(values))
+        return len(infos), tuple(keys), columns
+
+    def decode_infos(self, data):
+        """
+        Decode the infos of the environments of a process
+
+        :param data: (Any) the encoded infos
+        :return: ([dict]) the infos
+        """
+        if not isinstance(data, tuple):
+            return data
+        n_infos, keys, columns = data
+        infos = [{} for _ in range(n_infos)]
+        for key, column in zip(keys, columns):
+            for info, value in zip(infos, column.tolist()):
+                info[key] = value
+        return infos
@@ -1,36 +1,26 @@
-from collections import OrderedDict
-
 import numpy as np
-from gym import spaces
 
 from . import VecEnv
+from .util import obs_space_info, copy_obs
 
 
 class DummyVecEnv(VecEnv):
     """
     Creates a simple vectorized wrapper for multiple environments
 
+    With `copy=False`, `step` and `reset` return the buffers of the vectorized environment instead of copies:
+    the returned observations, rewards, dones and infos are overwritten by the next call to `step` or `reset`.
+
     :param env_fns: ([Gym Environment]) the list of environments to vectorize
+    :param copy: (bool) whether to return copies of the buffers
     """
     
-    def __init__(self, env_fns):
+    def __init__(self, env_fns, copy=True):
         self.envs = [fn() for fn in env_fns]
+        self.copy = copy
         env = self.envs[0]
         VecEnv.__init__(self, len(env_fns), env.observation_space, env.action_space)
-        shapes, dtypes = {}, {}
-        self.keys = []
-        obs_space = env.observation_space
-
-        if isinstance(obs_space, spaces.Dict):
-            assert isinstance(obs_space.spaces, OrderedDict)
-            subspaces = obs_space.spaces
-        else:
-            subspaces = {None: obs_space}
-
-        for key, box in subspaces.items():
-            shapes[key] = box.shape
-            dtypes[key] = box.dtype
-            self.keys.append(key)
+        self.keys, shapes, dtypes = obs_space_info(env.observation_space)
 
         self.buf_obs = {k: np.zeros((self.num_envs,) + tuple(shapes[k]), dtype=dtypes[k]) for k in self.keys}
         self.buf_dones = np.zeros((self.num_envs,), dtype=np.bool)
@@ -43,19 +33,34 @@ class DummyVecEnv(VecEnv):
 
     def step_wait(self):
         for env_idx in range(self.num_envs):
-            obs, self.buf_rews[env_idx], self.buf_dones[env_idx], self.buf_infos[env_idx] =\
-                self.envs[env_idx].step(self.actions[env_idx])
-            if self.buf_dones[env_idx]:
-                obs = self.envs[env_idx].reset()
-            self._save_obs(env_idx, obs)
-        return (np.copy(self._obs_from_buf()), np.copy(self.buf_rews), np.copy(self.buf_dones),
-                self.buf_infos.copy())
+            self._step_env(env_idx)
+        return self._results()
 
     def reset(self):
         for env_idx in range(self.num_envs):
+            self._reset_env(env_idx)
+        return self._reset_results()
+
+    def _step_env(self, env_idx):
+        obs, self.buf_rews[env_idx], self.buf_dones[env_idx], self.buf_infos[env_idx] =\
+            self.envs[env_idx].step(self.actions[env_idx])
+        if self.buf_dones[env_idx]:
             obs = self.envs[env_idx].reset()
-            self._save_obs(env_idx, obs)
-        return np.copy(self._obs_from_buf())
+        self._save_obs(env_idx, obs)
+
+    def _reset_env(self, env_idx):
+        self._save_obs(env_idx, self.envs[env_idx].reset())
+
+    def _results(self):
+        if not self.copy:
+            return self._obs_from_buf(), self.buf_rews, self.buf_dones, self.buf_infos
+        return (copy_obs(self._obs_from_buf()), np.copy(self.buf_rews), np.copy(self.buf_dones),
+                self.buf_infos.copy())
+
+    def _reset_results(self):
+        if not self.copy:
+            return self._obs_from_buf()
+        return copy_obs(self._obs_from_buf())
 
     def close(self):
         return
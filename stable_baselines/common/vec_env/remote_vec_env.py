@@ -0,0 +1,117 @@
+import argparse
+import ipaddress
+import os
+import socket
+from multiprocessing.connection import Listener, Client
+
+import gym
+
+from stable_baselines.common.vec_env.base_vec_env import CloudpickleWrapper
+from stable_baselines.common.vec_env.subproc_vec_env import SubprocVecEnv, _worker
+
+# the environment variable holding the authkey of the env servers run by `main`
+AUTHKEY_ENV_VAR = 'ENV_SERVER_AUTHKEY'
+
+
+def _is_loopback(host):
+    """
+    :param host: (str) a host name or address
+    :return: (bool) whether the host is only reachable from this machine
+    """
+    try:
+        return ipaddress.ip_address(socket.gethostbyname(host)).is_loopback
+    except (socket.gaierror, ValueError):
+        return False
+
+
+class EnvServer(object):
+    def __init__(self, env_fns, address=('localhost', 0), authkey=None):
+        """
+        A server running environments for a RemoteVecEnv, over TCP
+
+        The server listens from its creation, and `serve` runs the environments for the first client, until the
+        client closes the vectorized environment. The messages are pickled, so a client can run arbitrary code on the
+        server: only use it on a trusted network, with an `authkey` shared by the server and the client. The
+        `authkey` is required to listen on another host than the loopback interface.
+
+        :param env_fns: ([Gym Environment]) the environments to run, created by `serve`
+        :param address: ((str, int)) the host and port to listen on (port 0 for any free port)
+        :param authkey: (bytes) the key authenticating the clients (if None, no authentication, only on the loopback
+            interface)
+        """
+        if authkey is None and not _is_loopback(address[0]):
+            raise ValueError("Error: an authkey is required to listen on {}.".format(address[0]))
+        self.env_fns = env_fns
+        self.listener = Listener(address, authkey=authkey)
+        self.address = self.listener.address
+
+    def serve(self):
+        """
+        Wait for a client and run the environments for it
+        """
+        remote = self.listener.accept()
+        self.listener.close()
+        # the client sends the codec of its observations first
+        codec = remote.recv()
+        _worker(remote, None, CloudpickleWrapper(self.env_fns), codec=codec)
+
+
+class RemoteVecEnv(SubprocVecEnv):
+    """
+    Creates a vectorized wrapper for the environments of env servers (see EnvServer), e.g. on other machines
+
+    Each step sends the actions of all the environments of a server in one message, to all the servers before
+    waiting for their results. The environments are ordered by server, in the order of `addresses`.
+
+    :param addresses: ([(str, int)]) the addresses of the servers
+    :param authkey: (bytes) the key of the servers (if None, no authentication)
+    :param codec: (VecEnvCodec) the encoding of the observations and infos sent by the servers (if None, they are
+        sent as they are)
+    """
+
+    def __init__(self, addresses, authkey=None, codec=None):
+        remotes = [Client(tuple(address), authkey=authkey) for address in addresses]
+        for remote in remotes:
+            remote.send(codec)
+            remote.send(('get_num_envs', None))
+        worker_bounds = []
+        n_envs = 0
+        for remote in remotes:
+            n_server_envs = remote.recv()
+            worker_bounds.append((n_envs, n_envs + n_server_envs))
+            n_envs += n_server_envs
+        self._init_workers(remotes, [], worker_bounds, codec=codec)
+
+
+def main():
+    """
+    Run an env server for the environments of a Gym environment ID
+
+    The authkey is read from a file (`--authkey-file`) or from the `ENV_SERVER_AUTHKEY` environment variable, so it
+    does not show in the command line of the process.
+    """
+    parser = argparse.ArgumentParser(description='Run environments for a RemoteVecEnv',
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--env', help='environment ID', default='CartPole-v1')
+    parser.add_argument('--n-envs', help='the number of environments', type=int, default=1)
+    parser.add_argument('--host', help='the host to listen on', default='localhost')
+    parser.add_argument('--port', help='the port to listen on', type=int, default=5000)
+    parser.add_argument('--authkey-file', help='a file holding the key authenticating the client (if not given, the '
+                        '{} environment variable), required unless the host is local'.format(AUTHKEY_ENV_VAR),
+                        default=None)
+    args = parser.parse_args()
+    if args.authkey_file is not None:
+        with open(args.authkey_file, 'rb') as file_handler:
+            authkey = file_handler.read().strip()
+    else:
+        authkey = os.environ.get(AUTHKEY_ENV_VAR)
+        authkey = authkey.encode() if authkey else None
+    if not authkey and not _is_loopback(args.host):
+        parser.error('an authkey (--authkey-file or {}) is required to listen on {}'.format(AUTHKEY_ENV_VAR, args.host))
+    server = EnvServer([lambda: gym.make(args.env) for _ in range(args.n_envs)], (args.host, args.port),
+                       authkey or None)
+    server.serve()
+
+
+if __name__ == '__main__':
+    main()
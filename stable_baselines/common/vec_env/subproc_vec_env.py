@@ -1,84 +1,285 @@
-from multiprocessing import Process, Pipe
+import ctypes
+from collections import OrderedDict
+from multiprocessing import Process, Pipe, RawArray
+from multiprocessing.connection import wait
 
+import gym
 import numpy as np
 
 from stable_baselines.common.vec_env import VecEnv, CloudpickleWrapper
+from stable_baselines.common.vec_env.util import obs_space_info, copy_obs
 from stable_baselines.common.tile_images import tile_images
 
 
-def _worker(remote, parent_remote, env_fn_wrapper):
-    parent_remote.close()
-    env = env_fn_wrapper.var()
+class _SharedObservations(object):
+    def __init__(self, observation_space, n_envs):
+        """
+        The observations of the environments, in shared memory (one array per subspace of the observation space)
+
+        :param observation_space: (Gym Space) the observation space
+        :param n_envs: (int) the number of environments
+        """
+        self.keys, self.shapes, self.dtypes = obs_space_info(observation_space)
+        self.n_envs = n_envs
+        self.buffers = {key: RawArray(ctypes.c_char, n_envs * int(np.prod(self.shapes[key])) *
+                                      self.dtypes[key].itemsize)
+                        for key in self.keys}
+
+    def arrays(self):
+        """
+        Get numpy arrays over the shared memory, each process must create its own
+
+        :return: ({str: np.ndarray}) the observations arrays of shape (n_envs,) + subspace shape, by key
+        """
+        return OrderedDict([(key, np.frombuffer(self.buffers[key], dtype=self.dtypes[key])
+                             .reshape((self.n_envs,) + self.shapes[key])) for key in self.keys])
+
+
+def _step_env(env, actions):
+    """
+    Step an environment with a sequence of actions, until the end of the sequence or of the episode
+
+    :param env: (Gym Environment) the environment
+    :param actions: ([Any]) the actions
+    :return: (Any, float, bool, dict) the last observation (the first one of the next episode if the episode is over),
+        the sum of the rewards, whether the episode is over and the last information
+    """
+    total_reward = None
+    for action in actions:
+        observation, reward, done, info = env.step(action)
+        total_reward = reward if total_reward is None else total_reward + reward
+        if done:
+            observation = env.reset()
+            break
+    return observation, total_reward, done, info
+
+
+def _check_multi_step(actions, n_repeat):
+    """
+    Check the arguments of a multi-step command: each environment must take at least one step
+
+    :param actions: ([[int] or [float]]) the sequences of actions of the environments (if n_repeat is None),
+        or the actions of the environments
+    :param n_repeat: (int) the number of times each action is repeated
+    """
+    if n_repeat is None:
+        assert all(len(action_sequence) > 0 for action_sequence in actions), \
+            "Error: the sequences of actions must not be empty."
+    else:
+        assert n_repeat >= 1, "Error: the actions must be repeated at least once."
+
+
+def _worker(remote, parent_remote, env_fn_wrapper, shared_obs=None, start_idx=0, codec=None):
+    if parent_remote is not None:
+        parent_remote.close()
+    envs = [env_fn() for env_fn in env_fn_wrapper.var]
+    obs_arrays = shared_obs.arrays() if shared_obs is not None else None
+
+    def _send_observations(observations, *results):
+        # with shared memory, the observations are written in place and only the other results are sent
+        if obs_arrays is not None:
+            for env_idx, observation in enumerate(observations, start_idx):
+                for key, array in obs_arrays.items():
+                    array[env_idx] = observation if key is None else observation[key]
+            observations = None
+        else:
+            observations = np.stack(observations)
+            if codec is not None:
+                observations = codec.encode_obs(observations)
+        remote.send((observations, *results) if results else observations)
+
     while True:
         try:
             cmd, data = remote.recv()
-            if cmd == 'step':
-                observation, reward, done, info = env.step(data)
-                if done:
-                    observation = env.reset()
-                remote.send((observation, reward, done, info))
+            if cmd == 'step' or cmd == 'multi_step':
+                if cmd == 'step':
+                    action_sequences = [(action,) for action in data]
+                else:
+                    actions, n_repeat = data
+                    action_sequences = actions if n_repeat is None else [[action] * n_repeat for action in actions]
+                observations, rewards, dones, infos = [], [], [], []
+                for env, action_sequence in zip(envs, action_sequences):
+                    observation, reward, done, info = _step_env(env, action_sequence)
+                    observations.append(observation)
+                    rewards.append(reward)
+                    dones.append(done)
+                    infos.append(info)
+                _send_observations(observations, np.stack(rewards), np.stack(dones),
+                                   infos if codec is None else codec.encode_infos(infos))
             elif cmd == 'reset':
-                observation = env.reset()
-                remote.send(observation)
+                _send_observations([env.reset() for env in envs])
             elif cmd == 'render':
-                remote.send(env.render(*data[0], **data[1]))
+                remote.send([env.render(*data[0], **data[1]) for env in envs])
             elif cmd == 'close':
                 remote.close()
                 break
             elif cmd == 'get_spaces':
-                remote.send((env.observation_space, env.action_space))
+                remote.send((envs[0].observation_space, envs[0].action_space))
+            elif cmd == 'get_num_envs':
+                remote.send(len(envs))
             elif cmd == 'env_method':
-                method = getattr(env, data[0])
-                remote.send(method(*data[1], **data[2]))
+                remote.send([getattr(env, data[0])(*data[1], **data[2]) for env in envs])
             elif cmd == 'get_attr':
-                remote.send(getattr(env, data))
+                remote.send([getattr(env, data) for env in envs])
             elif cmd == 'set_attr':
-                remote.send(setattr(env, data[0], data[1]))
+                remote.send([setattr(envs[env_idx], data[0], data[1]) for env_idx in data[2]])
             else:
                 raise NotImplementedError
         except EOFError:
             break
 
 
+def _flatten(lists, container=list):
+    """
+    Flatten the lists of results of the processes
+
+    :param lists: ([list]) the results of each process
+    :param container: (type) the type of the returned sequence
+    :return: (list or tuple) the results of all the environments
+    """
+    return container(item for items in lists for item in items)
+
+
 class SubprocVecEnv(VecEnv):
     """
     Creates a multiprocess vectorized wrapper for multiple environments
 
+    With `shared_memory=True`, the observations are written by the processes in shared memory, and only the rewards,
+    dones and infos are sent through the pipes. The observation and action spaces are then read from an environment
+    created (and closed) in the main process.
+
+    With `n_envs_per_worker` > 1, each process steps a group of environments one after the other, and sends back the
+    results of the whole group at once: for cheap environments, this saves most of the communication cost.
+
     :param env_fns: ([Gym Environment]) Environments to run in subprocesses
+    :param shared_memory: (bool) whether to return the observations through shared memory instead of the pipes
+    :param n_envs_per_worker: (int) the number of environments run by each process
+    :param codec: (VecEnvCodec) the encoding of the observations and infos sent by the processes (if None, they are
+        sent as they are), the observations in shared memory are not encoded. The Dict and Tuple observation spaces
+        require shared memory to use a codec.
     """
 
-    def __init__(self, env_fns):
-        self.waiting = False
-        self.closed = False
+    def __init__(self, env_fns, shared_memory=False, n_envs_per_worker=1, codec=None):
         n_envs = len(env_fns)
-        self.remotes, self.work_remotes = zip(*[Pipe() for _ in range(n_envs)])
-        self.processes = [Process(target=_worker, args=(work_remote, remote, CloudpickleWrapper(env_fn)))
-                          for (work_remote, remote, env_fn) in zip(self.work_remotes, self.remotes, env_fns)]
-        for process in self.processes:
+        # the environments [start, end) of each process
+        worker_bounds = [(start, min(start + n_envs_per_worker, n_envs))
+                         for start in range(0, n_envs, n_envs_per_worker)]
+        self.n_envs_per_worker = n_envs_per_worker
+        shared_obs = None
+        observation_space, action_space = None, None
+        if shared_memory:
+            # the shared memory must be allocated before starting the processes
+            dummy_env = env_fns[0]()
+            observation_space, action_space = dummy_env.observation_space, dummy_env.action_space
+            dummy_env.close()
+            del dummy_env
+            shared_obs = _SharedObservations(observation_space, n_envs)
+
+        remotes, self.work_remotes = zip(*[Pipe() for _ in range(len(worker_bounds))])
+        processes = [Process(target=_worker, args=(work_remote, remote, CloudpickleWrapper(env_fns[start:end]),
+                                                   shared_obs, start, codec))
+                     for (work_remote, remote, (start, end)) in zip(self.work_remotes, remotes, worker_bounds)]
+        for process in processes:
             process.daemon = True  # if the main process crashes, we should not cause things to hang
             process.start()
         for remote in self.work_remotes:
             remote.close()
 
-        self.remotes[0].send(('get_spaces', None))
-        observation_space, action_space = self.remotes[0].recv()
-        VecEnv.__init__(self, len(env_fns), observation_space, action_space)
+        self._init_workers(remotes, processes, worker_bounds, codec=codec, shared_obs=shared_obs,
+                           observation_space=observation_space, action_space=action_space)
+
+    def _init_workers(self, remotes, processes, worker_bounds, codec=None, shared_obs=None, observation_space=None,
+                      action_space=None):
+        """
+        Set up the vectorized environment once the workers running the environments are connected
+
+        :param remotes: ([Connection]) the connections to the workers
+        :param processes: ([Process]) the processes of the workers (empty if they are not run by this process)
+        :param worker_bounds: ([(int, int)]) the environments [start, end) of each worker
+        :param codec: (VecEnvCodec) the encoding of the observations and infos sent by the workers
+        :param shared_obs: (_SharedObservations) the shared memory the workers write the observations to
+        :param observation_space: (Gym Space) the observation space (if None, it is queried from the first worker)
+        :param action_space: (Gym Space) the action space (if None, it is queried from the first worker)
+        """
+        self.waiting = False
+        self.closed = False
+        self.remotes = remotes
+        self.processes = processes
+        self.worker_bounds = worker_bounds
+        self.codec = codec
+        self.shared_obs = shared_obs
+        self.obs_arrays = shared_obs.arrays() if shared_obs is not None else None
+        if observation_space is None:
+            self.remotes[0].send(('get_spaces', None))
+            observation_space, action_space = self.remotes[0].recv()
+        self._init_spaces(worker_bounds[-1][1], observation_space, action_space)
+
+    def _init_spaces(self, n_envs, observation_space, action_space):
+        if self.codec is not None and self.shared_obs is None:
+            if isinstance(observation_space, (gym.spaces.Dict, gym.spaces.Tuple)):
+                self.close()
+                raise ValueError("Error: the codecs do not support the Dict and Tuple observation spaces.")
+            observation_space = self.codec.observation_space(observation_space)
+        VecEnv.__init__(self, n_envs, observation_space, action_space)
 
     def step_async(self, actions):
-        for remote, action in zip(self.remotes, actions):
-            remote.send(('step', action))
+        for remote, (start, end) in zip(self.remotes, self.worker_bounds):
+            remote.send(('step', actions[start:end]))
         self.waiting = True
 
+    def step_multi_async(self, actions, n_repeat=None):
+        """
+        Tell all the environments to start taking several steps in their process, with a sequence of actions each,
+        or repeating an action. The results returned by `step_wait` are the last observations, the sums of the
+        rewards, the dones and the last infos: the sequence of an environment stops at the end of an episode.
+
+        :param actions: ([[int] or [float]]) the sequences of actions of the environments (if n_repeat is None),
+            or the actions of the environments
+        :param n_repeat: (int) the number of times each action is repeated
+        """
+        _check_multi_step(actions, n_repeat)
+        for remote, (start, end) in zip(self.remotes, self.worker_bounds):
+            remote.send(('multi_step', (actions[start:end], n_repeat)))
+        self.waiting = True
+
+    def step_multi(self, actions, n_repeat=None):
+        """
+        Step the environments several times in their process, see `step_multi_async`
+
+        :param actions: ([[int] or [float]]) the sequences of actions of the environments (if n_repeat is None),
+            or the actions of the environments
+        :param n_repeat: (int) the number of times each action is repeated
+        :return: ([int] or [float], [float], [bool], dict) observation, sum of the rewards, done, information
+        """
+        self.step_multi_async(actions, n_repeat)
+        return self.step_wait()
+
     def step_wait(self):
         results = [remote.recv() for remote in self.remotes]
         self.waiting = False
         obs, rews, dones, infos = zip(*results)
-        return np.stack(obs), np.stack(rews), np.stack(dones), infos
+        if self.codec is not None:
+            infos = [self.codec.decode_infos(worker_infos) for worker_infos in infos]
+        return self._stack_obs(obs), np.concatenate(rews), np.concatenate(dones), _flatten(infos, tuple)
 
     def reset(self):
         for remote in self.remotes:
             remote.send(('reset', None))
-        return np.stack([remote.recv() for remote in self.remotes])
+        return self._stack_obs([remote.recv() for remote in self.remotes])
+
+    def _stack_obs(self, obs):
+        if self.obs_arrays is None and self.codec is not None:
+            # decoded directly into the returned array
+            decoded_obs = np.empty((self.num_envs,) + self.observation_space.shape, dtype=self.observation_space.dtype)
+            for data, (start, end) in zip(obs, self.worker_bounds):
+                self.codec.decode_obs(data, decoded_obs[start:end])
+            return decoded_obs
+        if self.obs_arrays is None:
+            return np.concatenate(obs)
+        # the processes overwrite the shared memory at the next step
+        if self.shared_obs.keys == [None]:
+            return np.copy(self.obs_arrays[None])
+        return copy_obs(self.obs_arrays)
 
     def close(self):
         if self.closed:
@@ -97,7 +298,7 @@ class SubprocVecEnv(VecEnv):
             # gather images from subprocesses
             # `mode` will be taken into account later
             pipe.send(('render', (args, {'mode': 'rgb_array', **kwargs})))
-        imgs = [pipe.recv() for pipe in self.remotes]
+        imgs = _flatten([pipe.recv() for pipe in self.remotes])
         # Create a big image by tiling images from subprocesses
         bigimg = tile_images(imgs)
         if mode == 'human':
@@ -111,8 +312,8 @@ class SubprocVecEnv(VecEnv):
 
     def get_images(self):
         for pipe in self.remotes:
-            pipe.send(('render', {"mode": 'rgb_array'}))
-        imgs = [pipe.recv() for pipe in self.remotes]
+            pipe.send(('render', ((), {"mode": 'rgb_array'})))
+        imgs = _flatten([pipe.recv() for pipe in self.remotes])
         return imgs
 
     def env_method(self, method_name, *method_args, **method_kwargs):
@@ -127,7 +328,7 @@ class SubprocVecEnv(VecEnv):
 
         for remote in self.remotes:
             remote.send(('env_method', (method_name, method_args, method_kwargs)))
-        return [remote.recv() for remote in self.remotes]
+        return _flatten([remote.recv() for remote in self.remotes])
 
     def get_attr(self, attr_name):
         """
@@ -140,7 +341,7 @@ class SubprocVecEnv(VecEnv):
 
         for remote in self.remotes:
             remote.send(('get_attr', attr_name))
-        return [remote.recv() for remote in self.remotes]
+        return _flatten([remote.recv() for remote in self.remotes])
 
     def set_attr(self, attr_name, value, indices=None):
         """
@@ -154,10 +355,168 @@ class SubprocVecEnv(VecEnv):
         :return: (list) in case env access methods might return something, they will be returned in a list
         """
 
+        n_envs = self.worker_bounds[-1][1]
         if indices is None:
-            indices = range(len(self.remotes))
+            indices = range(n_envs)
         elif isinstance(indices, int):
             indices = [indices]
-        for remote in [self.remotes[i] for i in indices]:
-            remote.send(('set_attr', (attr_name, value)))
-        return [remote.recv() for remote in [self.remotes[i] for i in indices]]
+        # the indices of the environments in their process, by process
+        worker_indices = [[] for _ in self.remotes]
+        for env_idx in indices:
+            env_idx = range(n_envs)[env_idx]
+            for worker_idx, (start, end) in enumerate(self.worker_bounds):
+                if start <= env_idx < end:
+                    worker_indices[worker_idx].append(env_idx - start)
+        remotes = [remote for remote, local_indices in zip(self.remotes, worker_indices) if local_indices]
+        for remote, local_indices in zip(self.remotes, worker_indices):
+            if local_indices:
+                remote.send(('set_attr', (attr_name, value, local_indices)))
+        return _flatten([remote.recv() for remote in remotes])
+
+
+class AsyncSubprocVecEnv(SubprocVecEnv):
+    """
+    Creates a multiprocess vectorized wrapper that keeps all its environments stepping, and returns the first
+    `n_ready` of them that are done with their step, so that the slow steps of some environments do not slow down
+    the others.
+
+    The vectorized environment has `n_ready` environments (`num_envs`): the observations, rewards, dones and infos
+    returned by `reset` and `step_wait` are the ones of the environments whose ids are in `env_ids`, and the actions
+    given to `step_async` are for these environments (or for the ids given to `step_async`). The rewards and dones
+    returned for an environment are the ones of its previous action, which was sent with another batch (they are 0
+    and False for the first batch after a reset). The on-policy runners rebuild the trajectories of each environment
+    from the ids (see AbstractEnvRunner): their batches are ordered by environment id, so the episode rewards logged
+    in tensorboard are approximate. The recurrent policies and the wrappers that keep a state for each environment
+    (e.g. VecFrameStack) are not supported.
+
+    :param env_fns: ([Gym Environment]) Environments to run in subprocesses, more than `n_ready`
+    :param n_ready: (int) the number of environments returned by each step
+    :param shared_memory: (bool) whether to return the observations through shared memory instead of the pipes
+    """
+
+    def __init__(self, env_fns, n_ready, shared_memory=False):
+        assert 0 < n_ready <= len(env_fns), "Error: the number of ready environments must be in [1, len(env_fns)]."
+        super(AsyncSubprocVecEnv, self).__init__(env_fns, shared_memory=shared_memory)
+        self.n_envs_total = len(env_fns)
+        self.num_envs = n_ready
+        self.env_ids = None
+        # whether the command sent to each environment that did not answer yet was a reset, by id
+        self._in_flight = {}
+        # the results of the environments that answered, by id, in the order of the answers
+        self._ready = OrderedDict()
+        self._remote_ids = {remote: env_id for env_id, remote in enumerate(self.remotes)}
+
+    def _send(self, env_id, cmd, data):
+        self.remotes[env_id].send((cmd, data))
+        self._in_flight[env_id] = cmd == 'reset'
+
+    def _wait_ready(self, n_ready):
+        while len(self._ready) < n_ready and len(self._in_flight) > 0:
+            for remote in wait([self.remotes[env_id] for env_id in self._in_flight]):
+                env_id = self._remote_ids[remote]
+                if self._in_flight.pop(env_id):
+                    obs, rews, dones, infos = remote.recv(), [0.], [False], [{}]
+                else:
+                    obs, rews, dones, infos = remote.recv()
+                self._ready[env_id] = (None if obs is None else obs[0], rews[0], dones[0], infos[0])
+
+    def _pop_ready(self):
+        self._wait_ready(self.num_envs)
+        env_ids = list(self._ready.keys())[:self.num_envs]
+        obs, rews, dones, infos = zip(*[self._ready.pop(env_id) for env_id in env_ids])
+        self.env_ids = np.array(env_ids)
+        if self.obs_arrays is None:
+            obs = np.stack(obs)
+        elif self.shared_obs.keys == [None]:
+            obs = self.obs_arrays[None][self.env_ids]
+        else:
+            obs = OrderedDict([(key, array[self.env_ids]) for key, array in self.obs_arrays.items()])
+        return obs, np.stack(rews), np.stack(dones), infos
+
+    def _wait_all(self):
+        # the processes must be done with their step before receiving other commands
+        self._wait_ready(self.n_envs_total)
+
+    def step_async(self, actions, env_ids=None):
+        """
+        Tell the environments to start taking a step with the given actions
+
+        :param actions: ([int] or [float]) the actions
+        :param env_ids: ([int]) the ids of the environments taking the actions (if None, the ones of the last
+            returned observations)
+        """
+        self._send_steps('step', [[action] for action in actions], env_ids)
+
+    def step_multi_async(self, actions, n_repeat=None, env_ids=None):
+        """
+        Tell the environments to start taking several steps, see SubprocVecEnv.step_multi_async
+
+        :param actions: ([[int] or [float]]) the sequences of actions of the environments (if n_repeat is None),
+            or the actions of the environments
+        :param n_repeat: (int) the number of times each action is repeated
+        :param env_ids: ([int]) the ids of the environments taking the actions (if None, the ones of the last
+            returned observations)
+        """
+        _check_multi_step(actions, n_repeat)
+        self._send_steps('multi_step', [([action], n_repeat) for action in actions], env_ids)
+
+    def step_multi(self, actions, n_repeat=None, env_ids=None):
+        """
+        Step the environments several times in their process, see SubprocVecEnv.step_multi_async
+
+        :param actions: ([[int] or [float]]) the sequences of actions of the environments (if n_repeat is None),
+            or the actions of the environments
+        :param n_repeat: (int) the number of times each action is repeated
+        :param env_ids: ([int]) the ids of the environments taking the actions (if None, the ones of the last
+            returned observations)
+        :return: ([int] or [float], [float], [bool], dict) observation, sum of the rewards, done, information
+        """
+        self.step_multi_async(actions, n_repeat, env_ids)
+        return self.step_wait()
+
+    def _send_steps(self, cmd, data, env_ids):
+        if env_ids is None:
+            env_ids = self.env_ids
+        for env_id, env_data in zip(env_ids, data):
+            assert env_id not in self._in_flight and env_id not in self._ready, \
+                "Error: the environment {} did not return the observation of its last step.".format(env_id)
+            self._send(env_id, cmd, env_data)
+        self.waiting = True
+
+    def step_wait(self):
+        results = self._pop_ready()
+        self.waiting = False
+        return results
+
+    def reset(self):
+        self._wait_all()
+        self._ready.clear()
+        for env_id in range(self.n_envs_total):
+            self._send(env_id, 'reset', None)
+        return self._pop_ready()[0]
+
+    def close(self):
+        if not self.closed:
+            self._wait_all()
+            self.waiting = False
+        super(AsyncSubprocVecEnv, self).close()
+
+    def render(self, *args, **kwargs):
+        self._wait_all()
+        return super(AsyncSubprocVecEnv, self).render(*args, **kwargs)
+
+    def get_images(self):
+        self._wait_all()
+        return super(AsyncSubprocVecEnv, self).get_images()
+
+    def env_method(self, method_name, *method_args, **method_kwargs):
+        self._wait_all()
+        return super(AsyncSubprocVecEnv, self).env_method(method_name, *method_args, **method_kwargs)
+
+    def get_attr(self, attr_name):
+        self._wait_all()
+        return super(AsyncSubprocVecEnv, self).get_attr(attr_name)
+
+    def set_attr(self, attr_name, value, indices=None):
+        self._wait_all()
+        return super(AsyncSubprocVecEnv, self).set_attr(attr_name, value, indices)
@@ -0,0 +1,45 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from .dummy_vec_env import DummyVecEnv
+
+
+class ThreadVecEnv(DummyVecEnv):
+    """
+    Creates a vectorized wrapper stepping its environments in a pool of threads, with the buffers of DummyVecEnv.
+
+    The steps only run in parallel when the environments release the GIL (e.g. simulators written as C extensions),
+    but there is no process to start and nothing to pickle. The steps start in `step_async`, and the environments
+    must not be used by another thread until `step_wait` returns.
+
+    :param env_fns: ([Gym Environment]) the list of environments to vectorize
+    :param n_threads: (int) the number of threads (if None, one thread per environment)
+    :param copy: (bool) whether to return copies of the buffers (see DummyVecEnv)
+    """
+
+    def __init__(self, env_fns, n_threads=None, copy=True):
+        super(ThreadVecEnv, self).__init__(env_fns, copy=copy)
+        self.n_threads = n_threads if n_threads is not None else self.num_envs
+        self._executor = ThreadPoolExecutor(max_workers=self.n_threads)
+        self._futures = None
+
+    def step_async(self, actions):
+        self.actions = actions
+        self._futures = [self._executor.submit(self._step_env, env_idx) for env_idx in range(self.num_envs)]
+
+    def step_wait(self):
+        futures, self._futures = self._futures, None
+        for future in futures:
+            future.result()
+        return self._results()
+
+    def reset(self):
+        # list() waits for the environments, and raises their exceptions
+        list(self._executor.map(self._reset_env, range(self.num_envs)))
+        return self._reset_results()
+
+    def close(self):
+        if self._futures is not None:
+            for future in self._futures:
+                future.exception()
+            self._futures = None
+        self._executor.shutdown(wait=True)
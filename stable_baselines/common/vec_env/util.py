@@ -0,0 +1,38 @@
+from collections import OrderedDict
+
+import numpy as np
+from gym import spaces
+
+
+def obs_space_info(obs_space):
+    """
+    Get the keys, shapes and types of the subspaces of an observation space
+
+    :param obs_space: (Gym Space) the observation space, the subspaces of a Dict space are returned by key,
+        any other space is returned with the key None
+    :return: ([str], {str: tuple}, {str: numpy dtype}) the keys, shapes and types of the subspaces
+    """
+    if isinstance(obs_space, spaces.Dict):
+        assert isinstance(obs_space.spaces, OrderedDict)
+        subspaces = obs_space.spaces
+    else:
+        subspaces = {None: obs_space}
+
+    keys, shapes, dtypes = [], {}, {}
+    for key, box in subspaces.items():
+        keys.append(key)
+        shapes[key] = box.shape
+        dtypes[key] = box.dtype
+    return keys, shapes, dtypes
+
+
+def copy_obs(obs):
+    """
+    Copy the observations of vectorized environments
+
+    :param obs: (np.ndarray or dict) the observations, or the dict of observations of a Dict space
+    :return: (np.ndarray or dict) the copy of the observations
+    """
+    if isinstance(obs, dict):
+        return OrderedDict([(key, np.copy(value)) for key, value in obs.items()])
+    return np.copy(obs)
@@ -0,0 +1,55 @@
+import numpy as np
+from gym import spaces
+import cv2
+
+from stable_baselines.common.vec_env.base_vec_env import VecEnvWrapper
+
+cv2.ocl.setUseOpenCL(False)
+
+
+class VecAtariPreprocess(VecEnvWrapper):
+    """
+    Preprocess the raw RGB frames of all the environments at once: max pool of the last two skipped frames (if the
+    frames are stacked on their first axis, see MaxAndSkipEnv with `max_pool=False`), grayscale conversion and
+    resize, as done by MaxAndSkipEnv and WarpFrame in each environment.
+
+    The frames of all the environments are converted and resized by a single OpenCV call each, as one image of the
+    frames one above the other: the resized frames are the ones of WarpFrame.
+
+    :param venv: (VecEnv) the vectorized environment to wrap, returning RGB frames
+    :param width: (int) the width of the resized frames
+    :param height: (int) the height of the resized frames
+    """
+
+    def __init__(self, venv, width=84, height=84):
+        shape = venv.observation_space.shape
+        assert len(shape) in (3, 4) and shape[-1] == 3, "Error: the observations must be RGB frames."
+        self.max_pool = len(shape) == 4
+        self.frame_height, self.frame_width = shape[-3:-1]
+        self.width = width
+        self.height = height
+        observation_space = spaces.Box(low=0, high=255, shape=(height, width, 1), dtype=np.uint8)
+        VecEnvWrapper.__init__(self, venv, observation_space=observation_space)
+        self._max_frames = np.empty((self.num_envs, self.frame_height, self.frame_width, 3), dtype=np.uint8)
+
+    def _preprocess(self, frames):
+        """
+        :param frames: (np.ndarray) the RGB frames of the environments, the last two skipped frames of each
+            environment on the second axis if they are max pooled
+        :return: (np.ndarray) the resized grayscale frames
+        """
+        if self.max_pool:
+            frames = np.maximum(frames[:, 0], frames[:, 1], out=self._max_frames)
+        n_envs = frames.shape[0]
+        gray = cv2.cvtColor(np.ascontiguousarray(frames).reshape(n_envs * self.frame_height, self.frame_width, 3),
+                            cv2.COLOR_RGB2GRAY)
+        # the area of each resized row is within one frame, as the frames are resized by the same factor
+        resized = cv2.resize(gray, (self.width, n_envs * self.height), interpolation=cv2.INTER_AREA)
+        return resized.reshape((n_envs, self.height, self.width, 1))
+
+    def step_wait(self):
+        obs, rewards, dones, infos = self.venv.step_wait()
+        return self._preprocess(obs), rewards, dones, infos
+
+    def reset(self):
+        return self._preprocess(self.venv.reset())
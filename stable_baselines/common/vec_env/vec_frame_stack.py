@@ -8,37 +8,62 @@ class VecFrameStack(VecEnvWrapper):
     """
     Frame stacking wrapper for vectorized environment
 
+    The last frames of each environment are kept in a ring buffer, so a step only writes the new frames, and the
+    stacked observations are assembled (the oldest frame first) from the ring. With `copy=False`, they are assembled
+    in the same array at every step: the returned observations are overwritten by the next call to `step` or `reset`.
+    The runners of PPO2, A2C, ACKTR and ACER copy the observations into their rollout buffer, `copy=False` saves the
+    allocation of a stack at each step with these algorithms.
+
+    The frames are kept by position in the batch: the environments returning a different subset of their
+    environments at each step (`env_ids` attribute, e.g. AsyncSubprocVecEnv) are not supported.
+
     :param venv: (VecEnv) the vectorized environment to wrap
     :param n_stack: (int) Number of frames to stack
+    :param copy: (bool) whether to return new arrays of stacked observations
     """
     
-    def __init__(self, venv, n_stack):
+    def __init__(self, venv, n_stack, copy=True):
         self.venv = venv
         self.n_stack = n_stack
+        self.copy = copy
         wrapped_obs_space = venv.observation_space
         low = np.repeat(wrapped_obs_space.low, self.n_stack, axis=-1)
         high = np.repeat(wrapped_obs_space.high, self.n_stack, axis=-1)
+        self.n_channels = wrapped_obs_space.shape[-1]
+        # the last n_stack frames of each environment, the newest at index `self.newest`
+        self.frames = np.zeros((venv.num_envs, n_stack) + wrapped_obs_space.shape, low.dtype)
+        self.newest = n_stack - 1
         self.stackedobs = np.zeros((venv.num_envs,) + low.shape, low.dtype)
         observation_space = spaces.Box(low=low, high=high, dtype=venv.observation_space.dtype)
         VecEnvWrapper.__init__(self, venv, observation_space=observation_space)
 
+    def _push_frames(self, observations):
+        self.newest = (self.newest + 1) % self.n_stack
+        self.frames[:, self.newest] = observations
+
+    def _stack_frames(self):
+        stackedobs = np.empty_like(self.stackedobs) if self.copy else self.stackedobs
+        for k in range(self.n_stack):
+            frame_idx = (self.newest + 1 + k) % self.n_stack
+            stackedobs[..., k * self.n_channels:(k + 1) * self.n_channels] = self.frames[:, frame_idx]
+        return stackedobs
+
     def step_wait(self):
         observations, rewards, dones, infos = self.venv.step_wait()
-        self.stackedobs = np.roll(self.stackedobs, shift=-observations.shape[-1], axis=-1)
-        for i, done in enumerate(dones):
-            if done:
-                self.stackedobs[i] = 0
-        self.stackedobs[..., -observations.shape[-1]:] = observations
-        return self.stackedobs, rewards, dones, infos
+        self.frames[np.asarray(dones, dtype=np.bool)] = 0
+        self._push_frames(observations)
+        return self._stack_frames(), rewards, dones, infos
 
     def reset(self):
         """
         Reset all environments
         """
         obs = self.venv.reset()
-        self.stackedobs[...] = 0
-        self.stackedobs[..., -obs.shape[-1]:] = obs
-        return self.stackedobs
+        assert getattr(self.venv.unwrapped, 'env_ids', None) is None, \
+            "Error: VecFrameStack does not support the environment ids (e.g. of AsyncSubprocVecEnv)."
+        self.frames[...] = 0
+        self._push_frames(obs)
+        return self._stack_frames()
 
     def close(self):
         self.venv.close()
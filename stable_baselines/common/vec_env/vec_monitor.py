@@ -0,0 +1,127 @@
+import csv
+import json
+import os
+import time
+
+import numpy as np
+
+from stable_baselines.bench.monitor import Monitor
+from stable_baselines.common.vec_env.base_vec_env import VecEnvWrapper
+
+
+class VecMonitor(VecEnvWrapper):
+    """
+    A monitor wrapper for vectorized environments, it is used to know the episode reward, length, time and other data
+    of all the environments, without a Monitor in each environment.
+
+    The episode information is added to the information of the last step of each episode (`info['episode']`) as
+    Monitor does. The episodes of a step are written at once in a single log file, which can be read by
+    `bench.load_results`. The episodes are accumulated by position in the batch: the environments returning a
+    different subset of their environments at each step (`env_ids` attribute, e.g. AsyncSubprocVecEnv) are not
+    supported.
+
+    :param venv: (VecEnv) the vectorized environment to wrap
+    :param filename: (str) the location to save a log file, can be None for no log
+    :param info_keywords: (tuple) extra information to log, from the information return of environment.step
+    """
+
+    def __init__(self, venv, filename=None, info_keywords=()):
+        VecEnvWrapper.__init__(self, venv)
+        self.t_start = time.time()
+        if filename is None:
+            self.file_handler = None
+            self.logger = None
+        else:
+            if not filename.endswith(Monitor.EXT):
+                if os.path.isdir(filename):
+                    filename = os.path.join(filename, Monitor.EXT)
+                else:
+                    filename = filename + "." + Monitor.EXT
+            self.file_handler = open(filename, "wt")
+            self.file_handler.write('#%s\n' % json.dumps({"t_start": self.t_start, 'env_id': None}))
+            self.logger = csv.DictWriter(self.file_handler, fieldnames=('r', 'l', 't') + info_keywords)
+            self.logger.writeheader()
+            self.file_handler.flush()
+
+        self.info_keywords = info_keywords
+        self.episode_returns = np.zeros(self.num_envs, dtype=np.float64)
+        self.episode_lengths = np.zeros(self.num_envs, dtype=np.int64)
+        self.episode_rewards_history = []
+        self.episode_lengths_history = []
+        self.episode_times_history = []
+        self.total_steps = 0
+
+    def reset(self):
+        obs = self.venv.reset()
+        assert getattr(self.venv.unwrapped, 'env_ids', None) is None, \
+            "Error: VecMonitor does not support the environment ids (e.g. of AsyncSubprocVecEnv)."
+        self.episode_returns[:] = 0
+        self.episode_lengths[:] = 0
+        return obs
+
+    def step_wait(self):
+        obs, rewards, dones, infos = self.venv.step_wait()
+        self.episode_returns += rewards
+        self.episode_lengths += 1
+        self.total_steps += self.num_envs
+        done_indices = np.flatnonzero(dones)
+        if len(done_indices) > 0:
+            episode_time = round(time.time() - self.t_start, 6)
+            ep_infos = []
+            for env_idx in done_indices:
+                ep_info = {"r": round(float(self.episode_returns[env_idx]), 6),
+                           "l": int(self.episode_lengths[env_idx]), "t": episode_time}
+                for key in self.info_keywords:
+                    ep_info[key] = infos[env_idx][key]
+                infos[env_idx]['episode'] = ep_info
+                ep_infos.append(ep_info)
+            self.episode_rewards_history.extend(self.episode_returns[done_indices].tolist())
+            self.episode_lengths_history.extend(self.episode_lengths[done_indices].tolist())
+            self.episode_times_history.extend([episode_time] * len(done_indices))
+            self.episode_returns[done_indices] = 0
+            self.episode_lengths[done_indices] = 0
+            if self.logger:
+                self.logger.writerows(ep_infos)
+                self.file_handler.flush()
+        return obs, rewards, dones, infos
+
+    def close(self):
+        """
+        Closes the environment
+        """
+        if self.file_handler is not None:
+            self.file_handler.close()
+            self.file_handler = None
+        return self.venv.close()
+
+    def get_total_steps(self):
+        """
+        Returns the total number of timesteps of all the environments
+
+        :return: (int)
+        """
+        return self.total_steps
+
+    def get_episode_rewards(self):
+        """
+        Returns the rewards of all the episodes
+
+        :return: ([float])
+        """
+        return self.episode_rewards_history
+
+    def get_episode_lengths(self):
+        """
+        Returns the number of timesteps of all the episodes
+
+        :return: ([int])
+        """
+        return self.episode_lengths_history
+
+    def get_episode_times(self):
+        """
+        Returns the runtime in seconds of all the episodes
+
+        :return: ([float])
+        """
+        return self.episode_times_history
@@ -19,10 +19,17 @@ class VecNormalize(VecEnvWrapper):
     :param clip_reward: (float) Max value absolute for discounted reward
     :param gamma: (float) discount factor
     :param epsilon: (float) To avoid division by zero
+    :param copy: (bool) whether to return new float64 arrays of normalized observations. If False, the observations
+        are normalized in float32 into the same array at every step (overwritten by the next call to `step` or
+        `reset`), with the scale of the observations cached until the moving average changes
+    :param comm: (MPI Communicator) if not None, the communicator of the workers sharing their moving averages: the
+        moments of the data of each worker are merged into the moving averages of all the workers every
+        `sync_interval` steps, the data since the last synchronization is not used to normalize
+    :param sync_interval: (int) the number of steps between two synchronizations of the moving averages
     """
 
     def __init__(self, venv, training=True, norm_obs=True, norm_reward=True,
-                 clip_obs=10., clip_reward=10., gamma=0.99, epsilon=1e-8):
+                 clip_obs=10., clip_reward=10., gamma=0.99, epsilon=1e-8, copy=True, comm=None, sync_interval=1):
         VecEnvWrapper.__init__(self, venv)
         self.obs_rms = RunningMeanStd(shape=self.observation_space.shape)
         self.ret_rms = RunningMeanStd(shape=())
@@ -36,6 +43,21 @@ class VecNormalize(VecEnvWrapper):
         self.norm_obs = norm_obs
         self.norm_reward = norm_reward
         self.old_obs = np.array([])
+        self.copy = copy
+        # the buffers of the float32 normalization (copy=False)
+        self._norm_obs = None
+        self._centered_obs = None
+        # the float32 mean and inverse standard deviation of the observations, None when the moving average changed
+        self._obs_mean = None
+        self._obs_scale = None
+        self.comm = comm
+        self.sync_interval = sync_interval
+        self._n_steps_since_sync = 0
+        # the moving averages of the data of this worker since the last synchronization
+        self._local_obs_rms = None
+        self._local_ret_rms = None
+        if comm is not None:
+            self._reset_local_running_average()
 
     def step_wait(self):
         """
@@ -50,9 +72,13 @@ class VecNormalize(VecEnvWrapper):
         obs = self._normalize_observation(obs)
         if self.norm_reward:
             if self.training:
-                self.ret_rms.update(self.ret)
+                (self.ret_rms if self.comm is None else self._local_ret_rms).update(self.ret)
             rews = np.clip(rews / np.sqrt(self.ret_rms.var + self.epsilon), -self.clip_reward, self.clip_reward)
         self.ret[news] = 0
+        if self.comm is not None and self.training:
+            self._n_steps_since_sync += 1
+            if self._n_steps_since_sync >= self.sync_interval:
+                self.sync_running_average()
         return obs, rews, news, infos
 
     def _normalize_observation(self, obs):
@@ -60,14 +86,70 @@ class VecNormalize(VecEnvWrapper):
         :param obs: (numpy tensor)
         """
         if self.norm_obs:
+            if not self.copy:
+                return self._normalize_observation_inplace(obs)
             if self.training:
-                self.obs_rms.update(obs)
+                (self.obs_rms if self.comm is None else self._local_obs_rms).update(obs)
             obs = np.clip((obs - self.obs_rms.mean) / np.sqrt(self.obs_rms.var + self.epsilon), -self.clip_obs,
                           self.clip_obs)
             return obs
         else:
             return obs
 
+    def _normalize_observation_inplace(self, obs):
+        """
+        Normalize the observations in float32 into the buffer returned at every step
+
+        :param obs: (numpy tensor)
+        :return: (numpy tensor) the normalized observations
+        """
+        obs = np.asarray(obs)
+        if self._norm_obs is None or self._norm_obs.shape != obs.shape:
+            self._norm_obs = np.empty(obs.shape, dtype=np.float32)
+            self._centered_obs = np.empty(obs.shape, dtype=np.float64)
+        if self.training:
+            if self.comm is None:
+                self.obs_rms.update_centered(obs, self._centered_obs)
+                self._obs_scale = None
+            else:
+                self._local_obs_rms.update_centered(obs, self._centered_obs)
+        if self._obs_scale is None:
+            self._obs_mean = self.obs_rms.mean.astype(np.float32)
+            self._obs_scale = (1. / np.sqrt(self.obs_rms.var + self.epsilon)).astype(np.float32)
+        np.subtract(obs, self._obs_mean, out=self._norm_obs)
+        np.multiply(self._norm_obs, self._obs_scale, out=self._norm_obs)
+        np.clip(self._norm_obs, -self.clip_obs, self.clip_obs, out=self._norm_obs)
+        return self._norm_obs
+
+    def _reset_local_running_average(self):
+        # no data: merging these moments leaves the moving averages unchanged
+        self._local_obs_rms = RunningMeanStd(epsilon=0., shape=self.observation_space.shape)
+        self._local_ret_rms = RunningMeanStd(epsilon=0., shape=())
+
+    def sync_running_average(self):
+        """
+        Merge the moments of the data of all the workers since the last synchronization into the moving averages,
+        with a single Allgather of the communicator. The moments are merged in the order of the ranks, so all the
+        workers have the same moving averages.
+        """
+        local_moments = np.concatenate([np.concatenate([np.ravel(rms.mean), np.ravel(rms.var), [rms.count]])
+                                        for rms in [self._local_obs_rms, self._local_ret_rms]]).astype(np.float64)
+        all_moments = np.zeros((self.comm.Get_size(), local_moments.size), dtype=np.float64)
+        self.comm.Allgather(local_moments, all_moments)
+        for moments in all_moments:
+            start = 0
+            for rms in [self.obs_rms, self.ret_rms]:
+                size = int(np.prod(rms.mean.shape))
+                mean = moments[start:start + size].reshape(np.shape(rms.mean))
+                var = moments[start + size:start + 2 * size].reshape(np.shape(rms.var))
+                count = moments[start + 2 * size]
+                if count > 0:
+                    rms.update_from_moments(mean, var, count)
+                start += 2 * size + 1
+        self._reset_local_running_average()
+        self._n_steps_since_sync = 0
+        self._obs_scale = None
+
     def get_original_obs(self):
         """
         returns the unnormalized observation
@@ -103,3 +185,4 @@ class VecNormalize(VecEnvWrapper):
         for name in ['obs_rms', 'ret_rms']:
             with open("{}/{}.pkl".format(path, name), 'rb') as file_handler:
                 setattr(self, name, pickle.load(file_handler))
+        self._obs_scale = None
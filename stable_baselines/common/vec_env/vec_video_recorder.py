@@ -1,11 +1,156 @@
+import ctypes
+import json
 import os
+import queue
+from multiprocessing import Process, Queue, RawArray
 
+import numpy as np
 from gym.wrappers.monitoring import video_recorder
 
 from stable_baselines import logger
 from stable_baselines.common.vec_env import VecEnvWrapper, DummyVecEnv, VecNormalize, VecFrameStack, SubprocVecEnv
 
 
+def _encoder_worker(frames_buffer, frame_shape, commands, free_slots, errors):
+    frames = np.frombuffer(frames_buffer, dtype=np.uint8).reshape((-1,) + frame_shape)
+    encoder = None
+    try:
+        while True:
+            cmd, data = commands.get()
+            if cmd == 'start':
+                path, frames_per_sec = data
+                encoder = video_recorder.ImageEncoder(path, frame_shape, frames_per_sec)
+            elif cmd == 'frame':
+                frame = np.copy(frames[data])
+                free_slots.put(data)
+                if encoder is not None:
+                    encoder.capture_frame(frame)
+            elif cmd == 'close':
+                if encoder is not None:
+                    encoder.close()
+                encoder = None
+            elif cmd == 'stop':
+                if encoder is not None:
+                    encoder.close()
+                break
+            else:
+                raise NotImplementedError
+    except Exception as error:
+        # raised by the caller on its next frame (e.g. ffmpeg is not installed)
+        errors.put(error)
+
+
+class AsyncVideoEncoder(object):
+    def __init__(self, n_slots=64):
+        """
+        Encode videos in a background process: the frames are copied into a bounded queue of frames in shared
+        memory, and dropped when the queue is full, so the encoding never blocks the caller.
+
+        The process and the shared memory are created with the first frame, all the frames must have its shape. If the
+        encoding fails in the process (e.g. ffmpeg is not installed), its error is raised by the next call to
+        `start_video` or `capture_frame`.
+
+        :param n_slots: (int) the maximum number of frames waiting to be encoded
+        """
+        self.n_slots = n_slots
+        self.frame_shape = None
+        self.process = None
+        self.n_dropped_frames = 0
+        self._frames = None
+        self._commands = None
+        self._free_slots = None
+        self._errors = None
+        # the path and the frame rate of the video to start with the next frame
+        self._next_video = None
+        # whether the process encodes a video not closed yet
+        self._video_open = False
+
+    def _start_process(self, frame_shape):
+        self.frame_shape = frame_shape
+        frames_buffer = RawArray(ctypes.c_uint8, self.n_slots * int(np.prod(frame_shape)))
+        self._frames = np.frombuffer(frames_buffer, dtype=np.uint8).reshape((self.n_slots,) + frame_shape)
+        self._commands = Queue()
+        self._free_slots = Queue()
+        self._errors = Queue()
+        for slot in range(self.n_slots):
+            self._free_slots.put(slot)
+        self.process = Process(target=_encoder_worker,
+                               args=(frames_buffer, frame_shape, self._commands, self._free_slots, self._errors))
+        self.process.daemon = True  # if the main process crashes, we should not cause things to hang
+        self.process.start()
+
+    def _check_process(self):
+        """
+        Raise the error of the encoding process if it stopped, instead of dropping the next frames
+        """
+        if self.process is None or self.process.is_alive():
+            return
+        try:
+            error = self._errors.get(timeout=1.)
+        except queue.Empty:
+            error = RuntimeError("Error: the video encoding process stopped (exit code {})."
+                                 .format(self.process.exitcode))
+        self.process = None
+        self._video_open = False
+        raise error
+
+    def start_video(self, path, frames_per_sec):
+        """
+        Start a new video, closing the current one
+
+        :param path: (str) the path of the video file
+        :param frames_per_sec: (int) the frame rate of the video
+        """
+        self._check_process()
+        self.close_video()
+        self._next_video = (path, frames_per_sec)
+        self.n_dropped_frames = 0
+
+    def capture_frame(self, frame):
+        """
+        Add a frame to the current video, or drop it if the encoder lags behind
+
+        :param frame: (np.ndarray) the RGB image, of dtype uint8
+        :return: (bool) whether the frame was queued
+        """
+        self._check_process()
+        if self.process is None:
+            self._start_process(frame.shape)
+        assert frame.shape == self.frame_shape, "Error: the frames of the videos must have the same shape."
+        if self._next_video is not None:
+            self._commands.put(('start', self._next_video))
+            self._next_video = None
+            self._video_open = True
+        try:
+            slot = self._free_slots.get_nowait()
+        except queue.Empty:
+            self.n_dropped_frames += 1
+            return False
+        self._frames[slot] = frame
+        self._commands.put(('frame', slot))
+        return True
+
+    def close_video(self):
+        """
+        Close the current video, once its queued frames are encoded
+        """
+        if self._video_open:
+            self._commands.put(('close', None))
+            self._video_open = False
+        self._next_video = None
+
+    def close(self):
+        """
+        Encode the queued frames, close the current video and stop the process
+        """
+        if self.process is not None:
+            self._commands.put(('stop', None))
+            self.process.join()
+            self.process = None
+        self._video_open = False
+        self._next_video = None
+
+
 class VecVideoRecorder(VecEnvWrapper):
     """
     Wraps a VecEnv or VecEnvWrapper object to record rendered image as mp4 video.
@@ -18,10 +163,14 @@ class VecVideoRecorder(VecEnvWrapper):
                                         and returns whether we should start recording or not.
     :param video_length: (int)  Length of recorded videos
     :param name_prefix: (str) Prefix to the video name
+    :param async_encoding: (bool) Whether to encode the videos in a background process (see AsyncVideoEncoder):
+        the frames are still rendered at each step, but the frames are dropped instead of slowing down the steps
+        when the encoding lags behind
+    :param queue_size: (int) the maximum number of frames waiting to be encoded, with async_encoding
     """
 
     def __init__(self, venv, video_folder, record_video_trigger,
-                 video_length=200, name_prefix='rl-video'):
+                 video_length=200, name_prefix='rl-video', async_encoding=False, queue_size=64):
 
         VecEnvWrapper.__init__(self, venv)
 
@@ -43,6 +192,9 @@ class VecVideoRecorder(VecEnvWrapper):
 
         self.record_video_trigger = record_video_trigger
         self.video_recorder = None
+        self.video_metadata = None
+        self.encoder = AsyncVideoEncoder(queue_size) if async_encoding else None
+        self.video_path = None
 
         self.video_folder = os.path.abspath(video_folder)
         # Create output folder if needed
@@ -66,16 +218,28 @@ class VecVideoRecorder(VecEnvWrapper):
         video_name = '{}-step-{}-to-step-{}'.format(self.name_prefix, self.step_id,
                                                     self.step_id + self.video_length)
         base_path = os.path.join(self.video_folder, video_name)
-        self.video_recorder = video_recorder.VideoRecorder(
-                env=self.env,
-                base_path=base_path,
-                metadata={'step_id': self.step_id}
-                )
+        if self.encoder is not None:
+            self.video_path = base_path + '.mp4'
+            self.video_metadata = {'step_id': self.step_id, 'content_type': 'video/mp4'}
+            self.encoder.start_video(self.video_path, self.env.metadata.get('video.frames_per_second', 30))
+        else:
+            self.video_recorder = video_recorder.VideoRecorder(
+                    env=self.env,
+                    base_path=base_path,
+                    metadata={'step_id': self.step_id}
+                    )
+            self.video_path = self.video_recorder.path
 
-        self.video_recorder.capture_frame()
+        self._capture_frame()
         self.recorded_frames = 1
         self.recording = True
 
+    def _capture_frame(self):
+        if self.encoder is not None:
+            self.encoder.capture_frame(self.env.render(mode='rgb_array'))
+        else:
+            self.video_recorder.capture_frame()
+
     def _video_enabled(self):
         return self.record_video_trigger(self.step_id)
 
@@ -84,10 +248,10 @@ class VecVideoRecorder(VecEnvWrapper):
 
         self.step_id += 1
         if self.recording:
-            self.video_recorder.capture_frame()
+            self._capture_frame()
             self.recorded_frames += 1
             if self.recorded_frames > self.video_length:
-                logger.info("Saving video to ", self.video_recorder.path)
+                logger.info("Saving video to ", self.video_path)
                 self.close_video_recorder()
         elif self._video_enabled():
             self.start_video_recorder()
@@ -96,13 +260,20 @@ class VecVideoRecorder(VecEnvWrapper):
 
     def close_video_recorder(self):
         if self.recording:
-            self.video_recorder.close()
+            if self.encoder is not None:
+                self.encoder.close_video()
+                with open(os.path.splitext(self.video_path)[0] + '.meta.json', 'w') as file_handler:
+                    json.dump(dict(self.video_metadata, dropped_frames=self.encoder.n_dropped_frames), file_handler)
+            else:
+                self.video_recorder.close()
         self.recording = False
         self.recorded_frames = 1
 
     def close(self):
         VecEnvWrapper.close(self)
         self.close_video_recorder()
+        if self.encoder is not None:
+            self.encoder.close()
 
     def __del__(self):
         self.close()
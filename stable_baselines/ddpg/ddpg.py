@@ -14,6 +14,7 @@ from stable_baselines import logger
 from stable_baselines.common import tf_util, OffPolicyRLModel, SetVerbosity, TensorboardWriter
 from stable_baselines.common.vec_env import VecEnv
 from stable_baselines.common.mpi_adam import MpiAdam
+from stable_baselines.common.replay_prefetcher import ReplayPrefetcher
 from stable_baselines.ddpg.policies import DDPGPolicy
 from stable_baselines.common.mpi_running_mean_std import RunningMeanStd
 from stable_baselines.a2c.utils import find_trainable_variables, total_episode_reward_logger
@@ -139,7 +140,8 @@ class DDPG(OffPolicyRLModel):
     :param policy: (DDPGPolicy or str) The policy model to use (MlpPolicy, CnnPolicy, LnMlpPolicy, ...)
     :param env: (Gym environment or str) The environment to learn from (if registered in Gym, can be str)
     :param gamma: (float) the discount factor
-    :param memory_policy: (Memory) the replay buffer (if None, default to baselines.ddpg.memory.Memory)
+    :param memory_policy: (Memory) the replay buffer (if None, default to baselines.ddpg.memory.Memory,
+        CompactMemory stores each observation once, in its own dtype)
     :param eval_env: (Gym Environment) the evaluation environment (can be None)
     :param nb_train_steps: (int) the number of training steps
     :param nb_rollout_steps: (int) the number of rollout steps
@@ -163,6 +165,8 @@ class DDPG(OffPolicyRLModel):
     :param render: (bool) enable rendering of the environment
     :param render_eval: (bool) enable rendering of the evalution environment
     :param memory_limit: (int) the max number of transitions to store
+    :param prefetch_batches: (int) if > 0, this many minibatches are sampled in advance in a background thread,
+        while the training steps run (see ReplayPrefetcher)
     :param verbose: (int) the verbosity level: 0 none, 1 training information, 2 tensorflow debug
     :param tensorboard_log: (str) the log location for tensorboard (if None, no logging)
     :param _init_setup_model: (bool) Whether or not to build the network at the creation of the instance
@@ -173,8 +177,8 @@ class DDPG(OffPolicyRLModel):
                  normalize_observations=False, tau=0.001, batch_size=128, param_noise_adaption_interval=50,
                  normalize_returns=False, enable_popart=False, observation_range=(-5., 5.), critic_l2_reg=0.,
                  return_range=(-np.inf, np.inf), actor_lr=1e-4, critic_lr=1e-3, clip_norm=None, reward_scale=1.,
-                 render=False, render_eval=False, memory_limit=100, verbose=0, tensorboard_log=None,
-                 _init_setup_model=True):
+                 render=False, render_eval=False, memory_limit=100, prefetch_batches=0, verbose=0,
+                 tensorboard_log=None, _init_setup_model=True):
 
         # TODO: replay_buffer refactoring
         super(DDPG, self).__init__(policy=policy, env=env, replay_buffer=None, verbose=verbose, policy_base=DDPGPolicy,
@@ -205,12 +209,14 @@ class DDPG(OffPolicyRLModel):
         self.nb_train_steps = nb_train_steps
         self.nb_rollout_steps = nb_rollout_steps
         self.memory_limit = memory_limit
+        self.prefetch_batches = prefetch_batches
         self.tensorboard_log = tensorboard_log
 
         # init
         self.graph = None
         self.stats_sample = None
         self.memory = None
+        self._replay = None
         self.policy_tf = None
         self.target_init_updates = None
         self.target_soft_updates = None
@@ -577,7 +583,7 @@ class DDPG(OffPolicyRLModel):
         :param terminal1: (bool) is the episode done
         """
         reward *= self.reward_scale
-        self.memory.append(obs0, action, reward, obs1, terminal1)
+        self._replay.append(obs0, action, reward, obs1, terminal1)
         if self.normalize_observations:
             self.obs_rms.update(np.array([obs0]))
 
@@ -591,7 +597,7 @@ class DDPG(OffPolicyRLModel):
         :return: (float, float) critic loss, actor loss
         """
         # Get a batch
-        batch = self.memory.sample(batch_size=self.batch_size)
+        batch = self._replay.sample(batch_size=self.batch_size)
 
         if self.normalize_returns and self.enable_popart:
             old_mean, old_std, target_q = self.sess.run([self.ret_rms.mean, self.ret_rms.std, self.target_q],
@@ -732,7 +738,31 @@ class DDPG(OffPolicyRLModel):
                 self.param_noise_stddev: self.param_noise.current_stddev,
             })
 
+    def save_replay_buffer(self, save_path):
+        """
+        Save the replay memory (e.g. next to the model saved with `save`), streamed in compressed chunks.
+
+        :param save_path: (str or file-like) the save location
+        """
+        self.memory.save(save_path)
+
+    def load_replay_buffer(self, load_path, n_workers=None):
+        """
+        Restore the replay memory saved with `save_replay_buffer`, the chunks are decompressed in parallel.
+
+        :param load_path: (str) the saved replay memory
+        :param n_workers: (int) the number of threads loading the memory (if None, use the default)
+        """
+        self.memory.load(load_path, n_workers=n_workers)
+
     def learn(self, total_timesteps, callback=None, seed=None, log_interval=100, tb_log_name="DDPG"):
+        try:
+            return self._learn(total_timesteps, callback, seed, log_interval, tb_log_name)
+        finally:
+            # stop the replay prefetcher even if the training raises
+            self._close_replay_prefetcher()
+
+    def _learn(self, total_timesteps, callback, seed, log_interval, tb_log_name):
         with SetVerbosity(self.verbose), TensorboardWriter(self.graph, self.tensorboard_log, tb_log_name) as writer:
             self._setup_learn(seed)
 
@@ -749,6 +779,11 @@ class DDPG(OffPolicyRLModel):
             eval_episode_rewards_history = deque(maxlen=100)
             episode_rewards_history = deque(maxlen=100)
             self.episode_reward = np.zeros((1,))
+            # the minibatches can be sampled in a background thread, while the training steps run
+            if self.prefetch_batches > 0:
+                self._replay = ReplayPrefetcher(self.memory, self.prefetch_batches)
+            else:
+                self._replay = self.memory
             with self.sess.as_default(), self.graph.as_default():
                 # Prepare everything.
                 self._reset()
@@ -987,6 +1022,7 @@ class DDPG(OffPolicyRLModel):
             "clip_norm": self.clip_norm,
             "reward_scale": self.reward_scale,
             "memory_limit": self.memory_limit,
+            "prefetch_batches": self.prefetch_batches,
             "policy": self.policy,
             "memory_policy": self.memory_policy,
             "n_envs": self.n_envs,
@@ -1,19 +1,28 @@
+import os
+
 import numpy as np
 
+from stable_baselines.common.buffer_storage import open_memmap, save_chunked, load_chunked, \
+    read_chunked_metadata, DEFAULT_CHUNK_BYTES
+
 
 class RingBuffer(object):
-    def __init__(self, maxlen, shape, dtype='float32'):
+    def __init__(self, maxlen, shape, dtype='float32', filename=None):
         """
         A buffer object, when full restarts at the initial position
 
         :param maxlen: (int) the max number of numpy objects to store
         :param shape: (tuple) the shape of the numpy objects you want to store
         :param dtype: (str) the name of the type of the numpy object you want to store
+        :param filename: (str) the `.npy` file of the memory-mapped storage (if None, the data is kept in memory)
         """
         self.maxlen = maxlen
         self.start = 0
         self.length = 0
-        self.data = np.zeros((maxlen,) + shape).astype(dtype)
+        if filename is None:
+            self.data = np.zeros((maxlen,) + shape, dtype=dtype)
+        else:
+            self.data = open_memmap(filename, (maxlen,) + shape, dtype)
 
     def __len__(self):
         return self.length
@@ -57,38 +66,128 @@ def array_min2d(arr):
     :param arr: ([Any]) the array to clean
     :return: (np.ndarray) the cleaned array
     """
-    arr = np.array(arr)
+    arr = np.asarray(arr)
     if arr.ndim >= 2:
         return arr
     return arr.reshape(-1, 1)
 
 
 class Memory(object):
-    def __init__(self, limit, action_shape, observation_shape):
+    def __init__(self, limit, action_shape, observation_shape, storage_dir=None):
         """
         The replay buffer object
 
+        When `storage_dir` is given, the buffers are memory-mapped `.npy` files in that directory
+        (use `functools.partial(Memory, storage_dir=...)` as the `memory_policy` of DDPG).
+        If the directory already holds a replay buffer (e.g. from a crashed run), it is reopened with its content.
+
         :param limit: (int) the max number of transitions to store
         :param action_shape: (tuple) the action shape
         :param observation_shape: (tuple) the observation shape
+        :param storage_dir: (str) the directory of the memory-mapped storage (if None, the buffer is kept in memory)
         """
         self.limit = limit
+        self.storage_dir = storage_dir
+        self._state = None
+
+        if storage_dir is not None:
+            os.makedirs(storage_dir, exist_ok=True)
+        self.observations0 = RingBuffer(limit, shape=observation_shape, filename=self._filename('observations0'))
+        self.actions = RingBuffer(limit, shape=action_shape, filename=self._filename('actions'))
+        self.rewards = RingBuffer(limit, shape=(1,), filename=self._filename('rewards'))
+        self.terminals1 = RingBuffer(limit, shape=(1,), filename=self._filename('terminals1'))
+        self.observations1 = RingBuffer(limit, shape=observation_shape, filename=self._filename('observations1'))
+        self._open_state()
+
+    def _filename(self, name):
+        if self.storage_dir is None:
+            return None
+        return os.path.join(self.storage_dir, name + '.npy')
+
+    def _open_state(self):
+        if self.storage_dir is not None:
+            # start and length of the ring buffers, written after each transition
+            self._state = open_memmap(self._filename('state'), (2,), np.int64)
+            self._restore_state(int(self._state[0]), int(self._state[1]))
+
+    def _restore_state(self, start, length):
+        for ring_buffer in self._ring_buffers():
+            ring_buffer.start, ring_buffer.length = start, length
+
+    def _save_state(self):
+        if self._state is not None:
+            ring_buffer = self._ring_buffers()[0]
+            self._state[0] = ring_buffer.start
+            self._state[1] = ring_buffer.length
+
+    def _ring_buffers(self):
+        return [self.observations0, self.actions, self.rewards, self.terminals1, self.observations1]
 
-        self.observations0 = RingBuffer(limit, shape=observation_shape)
-        self.actions = RingBuffer(limit, shape=action_shape)
-        self.rewards = RingBuffer(limit, shape=(1,))
-        self.terminals1 = RingBuffer(limit, shape=(1,))
-        self.observations1 = RingBuffer(limit, shape=observation_shape)
+    def _named_ring_buffers(self):
+        return zip(['observations0', 'actions', 'rewards', 'terminals1', 'observations1'], self._ring_buffers())
+
+    def _loaded_ring_buffer(self, name, shape, dtype):
+        """
+        Return the ring buffer receiving the array `name` of a saved buffer
+
+        :param name: (str) the name of the saved array
+        :param shape: (tuple) the shape of the saved array
+        :param dtype: (numpy dtype) the type of the saved array
+        :return: (RingBuffer) the ring buffer
+        """
+        ring_buffer = dict(self._named_ring_buffers()).get(name)
+        if ring_buffer is None or ring_buffer.data.shape != shape or ring_buffer.data.dtype != dtype:
+            raise ValueError("Error: the saved array {} (shape {} and dtype {}) does not match this buffer."
+                             .format(name, shape, dtype))
+        return ring_buffer
+
+    def save(self, save_path, chunk_bytes=DEFAULT_CHUNK_BYTES):
+        """
+        Save the content of the buffer, streamed to a zip file in compressed chunks.
+
+        :param save_path: (str or file-like) where to save the buffer
+        :param chunk_bytes: (int) approximate size in bytes of the uncompressed chunks
+        """
+        arrays = {name: ring_buffer.data for name, ring_buffer in self._named_ring_buffers()}
+        ring_buffer = self._ring_buffers()[0]
+        metadata = {
+            'class': self.__class__.__name__,
+            'limit': self.limit,
+            'start': ring_buffer.start,
+            'length': ring_buffer.length
+        }
+        save_chunked(save_path, arrays, metadata, chunk_bytes=chunk_bytes)
 
-    def sample(self, batch_size):
+    def load(self, load_path, n_workers=None):
+        """
+        Replace the content of the buffer by the one saved in `load_path`, decompressing the chunks in parallel.
+
+        :param load_path: (str) the buffer saved with `save`
+        :param n_workers: (int) the number of threads loading chunks
+        """
+        def _allocate(name, shape, dtype):
+            return self._loaded_ring_buffer(name, shape, dtype).data
+
+        metadata = read_chunked_metadata(load_path)
+        if metadata['class'] != self.__class__.__name__ or metadata['limit'] != self.limit:
+            raise ValueError("Error: the replay buffer saved in {} does not match this buffer (type or size)."
+                             .format(load_path))
+        load_chunked(load_path, _allocate, n_workers=n_workers)
+        self._restore_state(metadata['start'], metadata['length'])
+        self._save_state()
+
+    def sample(self, batch_size, rng=None):
         """
         sample a random batch from the buffer
 
         :param batch_size: (int) the number of element to sample for the batch
+        :param rng: (np.random.RandomState) the random generator to use (if None, numpy's global one)
         :return: (dict) the sampled batch
         """
         # Draw such that we always have a proceeding element.
-        batch_idxs = np.random.randint(low=1, high=self.nb_entries - 1, size=batch_size)
+        if rng is None:
+            rng = np.random
+        batch_idxs = rng.randint(low=1, high=self.nb_entries - 1, size=batch_size)
 
         obs0_batch = self.observations0.get_batch(batch_idxs)
         obs1_batch = self.observations1.get_batch(batch_idxs)
@@ -124,7 +223,144 @@ class Memory(object):
         self.rewards.append(reward)
         self.observations1.append(obs1)
         self.terminals1.append(terminal1)
+        self._save_state()
 
     @property
     def nb_entries(self):
         return len(self.observations0)
+
+
+class CompactMemory(Memory):
+    def __init__(self, limit, action_shape, observation_shape, observation_dtype=None, storage_dir=None):
+        """
+        A replay buffer storing each observation once, in its own dtype (e.g. uint8 for images)
+
+        The observations are stored in a single ring buffer, the next observation of a transition being the one of
+        the next slot. When a transition does not continue the previous one (e.g. after a reset), the next
+        observation of the previous transition stays in its own slot, flagged in the `episode_ends` column:
+        no transition starts from it. `sample` returns the same batch as `Memory.sample`, with the observations in
+        their stored dtype.
+
+        :param limit: (int) the max number of observations to store, the number of transitions is slightly lower
+            (one observation per episode has no transition)
+        :param action_shape: (tuple) the action shape
+        :param observation_shape: (tuple) the observation shape
+        :param observation_dtype: (numpy dtype) the type of the stored observations
+            (if None, the type of the first observation added)
+        :param storage_dir: (str) the directory of the memory-mapped storage (if None, the buffer is kept in memory)
+        """
+        assert limit >= 2, "Error: the memory must hold at least 2 observations."
+        self.limit = limit
+        self.observation_shape = observation_shape
+        self.storage_dir = storage_dir
+        self._state = None
+        self._n_episode_ends = 0
+
+        if storage_dir is not None:
+            os.makedirs(storage_dir, exist_ok=True)
+        self.actions = RingBuffer(limit, shape=action_shape, filename=self._filename('actions'))
+        self.rewards = RingBuffer(limit, shape=(1,), filename=self._filename('rewards'))
+        self.terminals1 = RingBuffer(limit, shape=(1,), filename=self._filename('terminals1'))
+        self.episode_ends = RingBuffer(limit, shape=(), dtype=np.bool_, filename=self._filename('episode_ends'))
+        self.observations = None
+        if observation_dtype is None and storage_dir is not None and os.path.exists(self._filename('observations')):
+            # reopen the observations with their stored dtype
+            observation_dtype = np.load(self._filename('observations'), mmap_mode='r').dtype
+        if observation_dtype is not None:
+            self._allocate_observations(observation_dtype)
+        self._open_state()
+
+    def _allocate_observations(self, dtype):
+        self.observations = RingBuffer(self.limit, shape=self.observation_shape, dtype=dtype,
+                                       filename=self._filename('observations'))
+        self.observations.start, self.observations.length = self.actions.start, self.actions.length
+
+    def _ring_buffers(self):
+        ring_buffers = [self.actions, self.rewards, self.terminals1, self.episode_ends]
+        if self.observations is not None:
+            ring_buffers.append(self.observations)
+        return ring_buffers
+
+    def _named_ring_buffers(self):
+        return zip(['actions', 'rewards', 'terminals1', 'episode_ends', 'observations'], self._ring_buffers())
+
+    def _loaded_ring_buffer(self, name, shape, dtype):
+        if name == 'observations' and self.observations is None:
+            self._allocate_observations(dtype)
+        return super(CompactMemory, self)._loaded_ring_buffer(name, shape, dtype)
+
+    def _restore_state(self, start, length):
+        super(CompactMemory, self)._restore_state(start, length)
+        self._n_episode_ends = int(np.sum(self.episode_ends.get_batch(np.arange(length))))
+
+    def _append_slot(self, obs, action, reward, terminal1, episode_end):
+        if len(self.episode_ends) == self.limit and self.episode_ends[0]:
+            # the oldest slot is overwritten
+            self._n_episode_ends -= 1
+        self.observations.append(obs)
+        self.actions.append(action)
+        self.rewards.append(reward)
+        self.terminals1.append(terminal1)
+        self.episode_ends.append(episode_end)
+        self._n_episode_ends += int(episode_end)
+
+    def sample(self, batch_size, rng=None):
+        """
+        sample a random batch from the buffer
+
+        :param batch_size: (int) the number of element to sample for the batch
+        :param rng: (np.random.RandomState) the random generator to use (if None, numpy's global one)
+        :return: (dict) the sampled batch
+        """
+        assert self.nb_entries > 0, "Error: the memory holds no transition."
+        if rng is None:
+            rng = np.random
+        # draw the slots uniformly until none of them is the end of an episode (the newest slot always is)
+        batch_idxs = rng.randint(len(self.episode_ends) - 1, size=batch_size)
+        invalid = self.episode_ends.get_batch(batch_idxs)
+        while np.any(invalid):
+            batch_idxs[invalid] = rng.randint(len(self.episode_ends) - 1, size=int(np.sum(invalid)))
+            invalid = self.episode_ends.get_batch(batch_idxs)
+
+        result = {
+            'obs0': array_min2d(self.observations.get_batch(batch_idxs)),
+            'obs1': array_min2d(self.observations.get_batch(batch_idxs + 1)),
+            'rewards': array_min2d(self.rewards.get_batch(batch_idxs)),
+            'actions': array_min2d(self.actions.get_batch(batch_idxs)),
+            'terminals1': array_min2d(self.terminals1.get_batch(batch_idxs)),
+        }
+        return result
+
+    def append(self, obs0, action, reward, obs1, terminal1, training=True):
+        """
+        Append a transition to the buffer
+
+        :param obs0: ([float] or [int]) the last observation
+        :param action: ([float]) the action
+        :param reward: (float] the reward
+        :param obs1: ([float] or [int]) the current observation
+        :param terminal1: (bool) is the episode done
+        :param training: (bool) is the RL model training or not
+        """
+        if not training:
+            return
+
+        if self.observations is None:
+            self._allocate_observations(np.asarray(obs0).dtype)
+        length = len(self.episode_ends)
+        if length > 0 and np.array_equal(self.observations[length - 1], obs0):
+            # the transition starts from the next observation of the previous one
+            idx = (self.episode_ends.start + length - 1) % self.limit
+            self.actions.data[idx] = action
+            self.rewards.data[idx] = reward
+            self.terminals1.data[idx] = terminal1
+            self.episode_ends.data[idx] = False
+            self._n_episode_ends -= 1
+        else:
+            self._append_slot(obs0, action, reward, terminal1, False)
+        self._append_slot(obs1, 0, 0, 0, True)
+        self._save_state()
+
+    @property
+    def nb_entries(self):
+        return len(self.episode_ends) - self._n_episode_ends
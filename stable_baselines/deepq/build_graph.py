@@ -47,6 +47,8 @@ The functions in this file can are used to create the following functions:
         but must be of the valid shape. dtype must be float32 and shape must be (batch_size,)
     :param weight: (numpy float) imporance weights for every element of the batch (gradient is multiplied by the
         importance weight) dtype must be float32 and shape must be (batch_size,)
+    :param discount: (numpy float) optional discount of the value of obs_tp1 for every element of the batch
+        (e.g. gamma ** n for n-step returns), gamma by default. dtype must be float32 and shape must be (batch_size,)
     :return: (numpy float) td_error: a list of differences between Q(s,a) and the target in Bellman's equation.
         dtype is float32 and shape is (batch_size,)
 
@@ -345,7 +347,7 @@ def build_train(q_func, ob_space, ac_space, optimizer, sess, grad_norm_clipping=
 
         act: (function (TensorFlow Tensor, bool, float): TensorFlow Tensor) function to select and action given
             observation. See the top of the file for details.
-        train: (function (Any, numpy float, numpy float, Any, numpy bool, numpy float): numpy float)
+        train: (function (Any, numpy float, numpy float, Any, numpy bool, numpy float, numpy float): numpy float)
             optimize the error in Bellman's equation. See the top of the file for details.
         update_target: (function) copy the parameters from optimized Q function to the target Q function.
             See the top of the file for details.
@@ -389,6 +391,8 @@ def build_train(q_func, ob_space, ac_space, optimizer, sess, grad_norm_clipping=
         rew_t_ph = tf.placeholder(tf.float32, [None], name="reward")
         done_mask_ph = tf.placeholder(tf.float32, [None], name="done")
         importance_weights_ph = tf.placeholder(tf.float32, [None], name="weight")
+        # discount of the value of the next observation, gamma by default or gamma ** k for k-step returns
+        discount_ph = tf.placeholder(tf.float32, None, name="discount")
 
         # q scores for actions which we know were selected in the given state.
         q_t_selected = tf.reduce_sum(step_model.q_values * tf.one_hot(act_t_ph, n_actions), axis=1)
@@ -402,7 +406,7 @@ def build_train(q_func, ob_space, ac_space, optimizer, sess, grad_norm_clipping=
         q_tp1_best_masked = (1.0 - done_mask_ph) * q_tp1_best
 
         # compute RHS of bellman equation
-        q_t_selected_target = rew_t_ph + gamma * q_tp1_best_masked
+        q_t_selected_target = rew_t_ph + discount_ph * q_tp1_best_masked
 
         # compute the error (potentially clipped)
         td_error = q_t_selected - tf.stop_gradient(q_t_selected_target)
@@ -452,10 +456,12 @@ def build_train(q_func, ob_space, ac_space, optimizer, sess, grad_norm_clipping=
             target_policy.obs_ph,
             double_obs_ph,
             done_mask_ph,
-            importance_weights_ph
+            importance_weights_ph,
+            discount_ph
         ],
         outputs=[summary, td_error],
-        updates=[optimize_expr]
+        updates=[optimize_expr],
+        givens={discount_ph: gamma}
     )
     update_target = tf_util.function([], [], updates=[update_target_expr])
 
@@ -8,7 +8,8 @@ from stable_baselines import logger, deepq
 from stable_baselines.common import tf_util, OffPolicyRLModel, SetVerbosity, TensorboardWriter
 from stable_baselines.common.vec_env import VecEnv
 from stable_baselines.common.schedules import LinearSchedule
-from stable_baselines.deepq.replay_buffer import ReplayBuffer, PrioritizedReplayBuffer
+from stable_baselines.common.replay_prefetcher import ReplayPrefetcher
+from stable_baselines.deepq.replay_buffer import ReplayBuffer, PrioritizedReplayBuffer, FrameStackReplayBuffer
 from stable_baselines.deepq.policies import DQNPolicy
 from stable_baselines.a2c.utils import find_trainable_variables, total_episode_reward_logger
 
@@ -32,7 +33,8 @@ class DQN(OffPolicyRLModel):
             at the end of the training set this variable to None.
     :param checkpoint_path: (str) replacement path used if you need to log to somewhere else than a temporary
             directory.
-    :param learning_starts: (int) how many steps of the model to collect transitions for before learning starts
+    :param learning_starts: (int) how many transitions the replay buffer must hold before learning starts (the
+        transitions of a restored replay buffer count)
     :param target_network_update_freq: (int) update the target network every `target_network_update_freq` steps.
     :param prioritized_replay: (bool) if True prioritized replay buffer will be used.
     :param prioritized_replay_alpha: (float)alpha parameter for prioritized replay buffer.
@@ -41,6 +43,13 @@ class DQN(OffPolicyRLModel):
     :param prioritized_replay_beta_iters: (int) number of iterations over which beta will be annealed from initial
             value to 1.0. If set to None equals to max_timesteps.
     :param prioritized_replay_eps: (float) epsilon to add to the TD errors when updating priorities.
+    :param n_step: (int) the number of steps of the returns stored in the replay buffer (n-step Q-learning)
+    :param replay_frame_stack: (int) if not None, the observations are stacks of this many frames (e.g. with
+            `wrap_atari_dqn`) and the replay buffer stores each frame only once. Not compatible with prioritized replay.
+    :param buffer_storage_dir: (str) if not None, the replay buffer is stored in memory-mapped files in this
+            directory (and reopened if it already holds a replay buffer), instead of being kept in memory
+    :param prefetch_batches: (int) if > 0, this many minibatches are sampled in advance in a background thread,
+            while the gradient steps run (see ReplayPrefetcher)
     :param param_noise: (bool) Whether or not to apply noise to the parameters of the policy.
     :param verbose: (int) the verbosity level: 0 none, 1 training information, 2 tensorflow debug
     :param tensorboard_log: (str) the log location for tensorboard (if None, no logging)
@@ -51,8 +60,8 @@ class DQN(OffPolicyRLModel):
                  exploration_final_eps=0.02, train_freq=1, batch_size=32, checkpoint_freq=10000, checkpoint_path=None,
                  learning_starts=1000, target_network_update_freq=500, prioritized_replay=False,
                  prioritized_replay_alpha=0.6, prioritized_replay_beta0=0.4, prioritized_replay_beta_iters=None,
-                 prioritized_replay_eps=1e-6, param_noise=False, verbose=0, tensorboard_log=None,
-                 _init_setup_model=True):
+                 prioritized_replay_eps=1e-6, n_step=1, replay_frame_stack=None, buffer_storage_dir=None,
+                 prefetch_batches=0, param_noise=False, verbose=0, tensorboard_log=None, _init_setup_model=True):
 
         # TODO: replay_buffer refactoring
         super(DQN, self).__init__(policy=policy, env=env, replay_buffer=None, verbose=verbose, policy_base=DQNPolicy,
@@ -70,9 +79,13 @@ class DQN(OffPolicyRLModel):
         self.prioritized_replay_alpha = prioritized_replay_alpha
         self.prioritized_replay_beta0 = prioritized_replay_beta0
         self.prioritized_replay_beta_iters = prioritized_replay_beta_iters
+        self.n_step = n_step
+        self.replay_frame_stack = replay_frame_stack
         self.exploration_final_eps = exploration_final_eps
         self.exploration_fraction = exploration_fraction
         self.buffer_size = buffer_size
+        self.buffer_storage_dir = buffer_storage_dir
+        self.prefetch_batches = prefetch_batches
         self.learning_rate = learning_rate
         self.gamma = gamma
         self.tensorboard_log = tensorboard_log
@@ -85,6 +98,7 @@ class DQN(OffPolicyRLModel):
         self.act = None
         self.proba_step = None
         self.replay_buffer = None
+        self._replay = None
         self.beta_schedule = None
         self.exploration = None
         self.params = None
@@ -98,6 +112,10 @@ class DQN(OffPolicyRLModel):
         with SetVerbosity(self.verbose):
             assert not isinstance(self.action_space, gym.spaces.Box), \
                 "Error: DQN cannot output a gym.spaces.Box action space."
+            assert not (self.prioritized_replay and self.replay_frame_stack is not None), \
+                "Error: replay_frame_stack is not compatible with prioritized replay."
+            assert self.n_step == 1 or self.replay_frame_stack is None, \
+                "Error: replay_frame_stack is not compatible with n-step returns."
 
             # If the policy is wrap in functool.partial (e.g. to disable dueling)
             # unwrap it to check the class type
@@ -133,13 +151,51 @@ class DQN(OffPolicyRLModel):
 
                 self.summary = tf.summary.merge_all()
 
+    def _setup_replay_buffer(self):
+        """
+        Create the replay buffer
+        """
+        if self.prioritized_replay:
+            self.replay_buffer = PrioritizedReplayBuffer(self.buffer_size, alpha=self.prioritized_replay_alpha,
+                                                         storage_dir=self.buffer_storage_dir, n_step=self.n_step,
+                                                         gamma=self.gamma)
+        elif self.replay_frame_stack is not None:
+            self.replay_buffer = FrameStackReplayBuffer(self.buffer_size, n_stack=self.replay_frame_stack,
+                                                        storage_dir=self.buffer_storage_dir)
+        else:
+            self.replay_buffer = ReplayBuffer(self.buffer_size, storage_dir=self.buffer_storage_dir, n_step=self.n_step,
+                                              gamma=self.gamma)
+
+    def set_env(self, env):
+        """
+        Checks the validity of the environment, and if it is coherent, set it as the current environment.
+        The replay buffer filled with the transitions of the previous environment is discarded.
+
+        :param env: (Gym Environment) The environment for learning a policy
+        """
+        super(DQN, self).set_env(env)
+        self.replay_buffer = None
+
+    def load_replay_buffer(self, load_path, n_workers=None):
+        if self.replay_buffer is None:
+            self._setup_replay_buffer()
+        super(DQN, self).load_replay_buffer(load_path, n_workers=n_workers)
+
     def learn(self, total_timesteps, callback=None, seed=None, log_interval=100, tb_log_name="DQN"):
+        try:
+            return self._learn(total_timesteps, callback, seed, log_interval, tb_log_name)
+        finally:
+            # stop the replay prefetcher even if the training raises
+            self._close_replay_prefetcher()
+
+    def _learn(self, total_timesteps, callback, seed, log_interval, tb_log_name):
         with SetVerbosity(self.verbose), TensorboardWriter(self.graph, self.tensorboard_log, tb_log_name) as writer:
             self._setup_learn(seed)
 
-            # Create the replay buffer
+            # Create the replay buffer, unless it was restored or filled by a previous call to learn
+            if self.replay_buffer is None:
+                self._setup_replay_buffer()
             if self.prioritized_replay:
-                self.replay_buffer = PrioritizedReplayBuffer(self.buffer_size, alpha=self.prioritized_replay_alpha)
                 if self.prioritized_replay_beta_iters is None:
                     prioritized_replay_beta_iters = total_timesteps
                 else:
@@ -148,7 +204,6 @@ class DQN(OffPolicyRLModel):
                                                     initial_p=self.prioritized_replay_beta0,
                                                     final_p=1.0)
             else:
-                self.replay_buffer = ReplayBuffer(self.buffer_size)
                 self.beta_schedule = None
             # Create the schedule for exploration starting from 1.
             self.exploration = LinearSchedule(schedule_timesteps=int(self.exploration_fraction * total_timesteps),
@@ -157,8 +212,16 @@ class DQN(OffPolicyRLModel):
 
             episode_rewards = [0.0]
             obs = self.env.reset()
+            # the replay buffer may be kept from a previous call to learn, interrupted during an episode
+            self.replay_buffer.reset_episode()
             reset = True
             self.episode_reward = np.zeros((1,))
+            # the minibatches can be sampled in a background thread, while the gradient steps run
+            if self.prefetch_batches > 0:
+                replay = ReplayPrefetcher(self.replay_buffer, self.prefetch_batches)
+            else:
+                replay = self.replay_buffer
+            self._replay = replay
 
             for step in range(total_timesteps):
                 if callback is not None:
@@ -189,7 +252,7 @@ class DQN(OffPolicyRLModel):
                 reset = False
                 new_obs, rew, done, _ = self.env.step(env_action)
                 # Store transition in the replay buffer.
-                self.replay_buffer.add(obs, action, rew, new_obs, float(done))
+                replay.add(obs, action, rew, new_obs, float(done))
                 obs = new_obs
 
                 if writer is not None:
@@ -205,13 +268,15 @@ class DQN(OffPolicyRLModel):
                     episode_rewards.append(0.0)
                     reset = True
 
-                if step > self.learning_starts and step % self.train_freq == 0:
+                # the warm-up is over once the buffer holds `learning_starts` transitions, e.g. restored ones
+                if len(self.replay_buffer) > self.learning_starts and step % self.train_freq == 0:
                     # Minimize the error in Bellman's equation on a batch sampled from replay buffer.
+                    # with n-step returns, `discounts` holds the per-sample discount, otherwise it is empty
                     if self.prioritized_replay:
-                        experience = self.replay_buffer.sample(self.batch_size, beta=self.beta_schedule.value(step))
-                        (obses_t, actions, rewards, obses_tp1, dones, weights, batch_idxes) = experience
+                        experience = replay.sample(self.batch_size, beta=self.beta_schedule.value(step))
+                        (obses_t, actions, rewards, obses_tp1, dones, *discounts, weights, batch_idxes) = experience
                     else:
-                        obses_t, actions, rewards, obses_tp1, dones = self.replay_buffer.sample(self.batch_size)
+                        obses_t, actions, rewards, obses_tp1, dones, *discounts = replay.sample(self.batch_size)
                         weights, batch_idxes = np.ones_like(rewards), None
 
                     if writer is not None:
@@ -221,22 +286,22 @@ class DQN(OffPolicyRLModel):
                             run_options = tf.RunOptions(trace_level=tf.RunOptions.FULL_TRACE)
                             run_metadata = tf.RunMetadata()
                             summary, td_errors = self._train_step(obses_t, actions, rewards, obses_tp1, obses_tp1,
-                                                                  dones, weights, sess=self.sess, options=run_options,
-                                                                  run_metadata=run_metadata)
+                                                                  dones, weights, *discounts, sess=self.sess,
+                                                                  options=run_options, run_metadata=run_metadata)
                             writer.add_run_metadata(run_metadata, 'step%d' % step)
                         else:
                             summary, td_errors = self._train_step(obses_t, actions, rewards, obses_tp1, obses_tp1,
-                                                                  dones, weights, sess=self.sess)
+                                                                  dones, weights, *discounts, sess=self.sess)
                         writer.add_summary(summary, step)
                     else:
                         _, td_errors = self._train_step(obses_t, actions, rewards, obses_tp1, obses_tp1, dones, weights,
-                                                        sess=self.sess)
+                                                        *discounts, sess=self.sess)
 
                     if self.prioritized_replay:
                         new_priorities = np.abs(td_errors) + self.prioritized_replay_eps
-                        self.replay_buffer.update_priorities(batch_idxes, new_priorities)
+                        replay.update_priorities(batch_idxes, new_priorities)
 
-                if step > self.learning_starts and step % self.target_network_update_freq == 0:
+                if len(self.replay_buffer) > self.learning_starts and step % self.target_network_update_freq == 0:
                     # Update target network periodically.
                     self.update_target(sess=self.sess)
 
@@ -286,6 +351,8 @@ class DQN(OffPolicyRLModel):
         # params
         data = {
             "checkpoint_path": self.checkpoint_path,
+            "buffer_storage_dir": self.buffer_storage_dir,
+            "prefetch_batches": self.prefetch_batches,
             "param_noise": self.param_noise,
             "learning_starts": self.learning_starts,
             "train_freq": self.train_freq,
@@ -297,6 +364,8 @@ class DQN(OffPolicyRLModel):
             "prioritized_replay_alpha": self.prioritized_replay_alpha,
             "prioritized_replay_beta0": self.prioritized_replay_beta0,
             "prioritized_replay_beta_iters": self.prioritized_replay_beta_iters,
+            "n_step": self.n_step,
+            "replay_frame_stack": self.replay_frame_stack,
             "exploration_final_eps": self.exploration_final_eps,
             "exploration_fraction": self.exploration_fraction,
             "learning_rate": self.learning_rate,
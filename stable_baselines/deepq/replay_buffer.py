@@ -1,24 +1,200 @@
-import random
+import os
+from collections import deque
 
 import numpy as np
 
+from stable_baselines.common.buffer_storage import open_memmap, save_chunked, load_chunked, \
+    read_chunked_metadata, DEFAULT_CHUNK_BYTES
 from stable_baselines.common.segment_tree import SumSegmentTree, MinSegmentTree
 
 
 class ReplayBuffer(object):
-    def __init__(self, size):
+    # the storage arrays, each one is kept in the attribute `_<name>`
+    _storage_fields = ('obses_t', 'actions', 'rewards', 'obses_tp1', 'dones')
+    # the attributes describing what is stored in the storage arrays
+    _state_fields = ('_maxsize', '_next_idx', '_num_stored')
+
+    def __init__(self, size, storage_dir=None, n_step=1, gamma=0.99):
         """
         Create Replay buffer.
 
+        The transitions are stored in one preallocated numpy array per field (observation, action, reward,
+        next observation, done), allocated on the first call to `add` from the shape and dtype of that transition.
+
+        When `storage_dir` is given, the arrays are memory-mapped `.npy` files in that directory, so the buffer
+        can be larger than the RAM and the OS page cache decides what stays in memory. If the directory already
+        holds a buffer (e.g. from a crashed run), it is reopened with its content.
+
+        With `n_step > 1`, the added transitions go through a FIFO of the last `n_step` steps, and the stored
+        transitions hold the discounted n-step return, the observation `n_step` steps later (or the last one of the
+        episode) and the discount `gamma ** k` to apply to its value, where k is the number of summed rewards.
+        The discounts are then returned by `sample` after the done mask.
+
         :param size: (int)  Max number of transitions to store in the buffer. When the buffer overflows the old
             memories are dropped.
+        :param storage_dir: (str) the directory of the memory-mapped storage (if None, the buffer is kept in memory)
+        :param n_step: (int) the number of steps of the stored returns
+        :param gamma: (float) the discount factor of the n-step returns
         """
-        self._storage = []
+        assert n_step >= 1, "Error: n_step must be at least 1."
         self._maxsize = size
         self._next_idx = 0
+        self._num_stored = 0
+        self._obses_t = None
+        self._actions = None
+        self._rewards = None
+        self._obses_tp1 = None
+        self._dones = None
+        self.n_step = n_step
+        self.gamma = gamma
+        # pending [obs_t, action, discounted return, number of summed rewards] of the last n-step steps
+        self._n_step_fifo = deque()
+        # the last next observation added, bootstrapped from by the pending steps of an interrupted episode
+        self._last_obs_tp1 = None
+        self._discounts = None
+        if n_step > 1:
+            self._storage_fields = self._storage_fields + ('discounts',)
+        self.storage_dir = storage_dir
+        self._state = None
+        if storage_dir is not None:
+            os.makedirs(storage_dir, exist_ok=True)
+            if os.path.exists(self._storage_path('state')):
+                self._reopen_storage()
 
     def __len__(self):
-        return len(self._storage)
+        return self._num_stored
+
+    @property
+    def buffer_size(self):
+        """
+        :return: (int) the max number of transitions the buffer can hold
+        """
+        return self._maxsize
+
+    def _make_array(self, name, shape, dtype):
+        """
+        Allocate the storage for one field of the transitions.
+
+        :param name: (str) the name of the field
+        :param shape: (tuple) the shape of the array, including the leading buffer dimension
+        :param dtype: (numpy dtype) the type of the array
+        :return: (np.ndarray) the storage array
+        """
+        if self.storage_dir is None:
+            return np.zeros(shape, dtype=dtype)
+        return open_memmap(self._storage_path(name), shape, dtype)
+
+    def _storage_path(self, name):
+        return os.path.join(self.storage_dir, name + '.npy')
+
+    def _save_state(self):
+        """
+        Write the state of the buffer next to its memory-mapped storage, after each transition.
+        """
+        if self._state is None:
+            self._state = open_memmap(self._storage_path('state'), (len(self._state_fields),), np.float64)
+        for i, name in enumerate(self._state_fields):
+            self._state[i] = getattr(self, name)
+
+    def _reopen_storage(self):
+        """
+        Reopen the memory-mapped storage and the state of a buffer previously stored in `storage_dir`.
+        """
+        self._state = np.lib.format.open_memmap(self._storage_path('state'), mode='r+')
+        if self._state.shape != (len(self._state_fields),) or self._state[0] != self._maxsize:
+            raise ValueError("Error: the replay buffer stored in {} does not match this buffer (type or size)."
+                             .format(self.storage_dir))
+        for i, name in enumerate(self._state_fields):
+            setattr(self, name, type(getattr(self, name))(self._state[i]))
+        for name in self._storage_fields:
+            setattr(self, '_' + name, np.lib.format.open_memmap(self._storage_path(name), mode='r+'))
+        self._storage_restored()
+
+    def _storage_restored(self):
+        """
+        Called when the content of the buffer was restored from disk (reopened or loaded).
+        """
+        # the pending n-step steps belong to an episode the restored content does not continue
+        self._n_step_fifo.clear()
+        self._last_obs_tp1 = None
+
+    def reset_episode(self):
+        """
+        Start a new episode while the last one is not done (e.g. the environment is reset by a new call to `learn`).
+
+        With `n_step > 1`, the pending steps of the interrupted episode are stored, bootstrapping from the last
+        added observation.
+        """
+        self._flush_n_step(self._last_obs_tp1, 0.0)
+        self._last_obs_tp1 = None
+
+    def _flush_n_step(self, obs_tp1, done):
+        """
+        Store all the pending n-step steps, their returns are complete
+
+        :param obs_tp1: (Any) the observation to bootstrap from
+        :param done: (bool) is the episode done
+        """
+        while len(self._n_step_fifo) > 0:
+            obs, action, n_step_return, n_rewards = self._n_step_fifo.popleft()
+            self._store(obs, action, n_step_return, obs_tp1, done, self.gamma ** n_rewards)
+
+    def save(self, save_path, chunk_bytes=DEFAULT_CHUNK_BYTES):
+        """
+        Save the content of the buffer, streamed to a zip file in compressed chunks.
+
+        :param save_path: (str or file-like) where to save the buffer
+        :param chunk_bytes: (int) approximate size in bytes of the uncompressed chunks
+        """
+        arrays = {name: getattr(self, '_' + name) for name in self._storage_fields
+                  if getattr(self, '_' + name) is not None}
+        metadata = {
+            'class': self.__class__.__name__,
+            'n_step': self.n_step,
+            'state': {name: getattr(self, name) for name in self._state_fields}
+        }
+        save_chunked(save_path, arrays, metadata, chunk_bytes=chunk_bytes)
+
+    def load(self, load_path, n_workers=None):
+        """
+        Replace the content of the buffer by the one saved in `load_path`, decompressing the chunks in parallel.
+
+        :param load_path: (str) the buffer saved with `save`
+        :param n_workers: (int) the number of threads loading chunks
+        """
+        def _allocate(name, shape, dtype):
+            array = getattr(self, '_' + name)
+            if array is None or array.shape != shape or array.dtype != dtype:
+                array = self._make_array(name, shape, dtype)
+                setattr(self, '_' + name, array)
+            return array
+
+        metadata = read_chunked_metadata(load_path)
+        if metadata['class'] != self.__class__.__name__ or metadata['state']['_maxsize'] != self._maxsize or \
+                metadata['n_step'] != self.n_step:
+            raise ValueError("Error: the replay buffer saved in {} does not match this buffer (type, size or n_step)."
+                             .format(load_path))
+        load_chunked(load_path, _allocate, n_workers=n_workers)
+        for name in self._state_fields:
+            setattr(self, name, metadata['state'][name])
+        if self.storage_dir is not None:
+            self._save_state()
+        self._storage_restored()
+
+    def _allocate_storage(self, obs_t, action):
+        """
+        Allocate the storage arrays, using the given transition to infer shapes and dtypes.
+
+        :param obs_t: (np.ndarray) an observation
+        :param action: (np.ndarray) an action
+        """
+        self._obses_t = self._make_array('obses_t', (self._maxsize,) + obs_t.shape, obs_t.dtype)
+        self._actions = self._make_array('actions', (self._maxsize,) + action.shape, action.dtype)
+        self._rewards = self._make_array('rewards', (self._maxsize,), np.float32)
+        self._obses_tp1 = self._make_array('obses_tp1', (self._maxsize,) + obs_t.shape, obs_t.dtype)
+        self._dones = self._make_array('dones', (self._maxsize,), np.float32)
+        if self.n_step > 1:
+            self._discounts = self._make_array('discounts', (self._maxsize,), np.float32)
 
     def add(self, obs_t, action, reward, obs_tp1, done):
         """
@@ -30,31 +206,68 @@ class ReplayBuffer(object):
         :param obs_tp1: (Any) the current observation
         :param done: (bool) is the episode done
         """
-        data = (obs_t, action, reward, obs_tp1, done)
+        if self.n_step == 1:
+            self._store(obs_t, action, reward, obs_tp1, done)
+            return
+
+        # add the reward to the returns of the pending steps
+        for pending in self._n_step_fifo:
+            pending[2] += self.gamma ** pending[3] * reward
+            pending[3] += 1
+        self._n_step_fifo.append([obs_t, action, reward, 1])
 
-        if self._next_idx >= len(self._storage):
-            self._storage.append(data)
+        if len(self._n_step_fifo) == self.n_step:
+            obs, action, n_step_return, n_rewards = self._n_step_fifo.popleft()
+            self._store(obs, action, n_step_return, obs_tp1, done, self.gamma ** n_rewards)
+        if done:
+            # the returns of all the pending steps are complete
+            self._flush_n_step(obs_tp1, done)
+            self._last_obs_tp1 = None
         else:
-            self._storage[self._next_idx] = data
+            self._last_obs_tp1 = obs_tp1
+
+    def _store(self, obs_t, action, reward, obs_tp1, done, discount=None):
+        """
+        Write a transition in the storage
+
+        :param obs_t: (Any) the last observation
+        :param action: ([float]) the action
+        :param reward: (float) the (n-step) return of the transition
+        :param obs_tp1: (Any) the observation to bootstrap from
+        :param done: (bool) is the episode done
+        :param discount: (float) the discount of the value of obs_tp1 (only stored when n_step > 1)
+        """
+        if self._obses_t is None:
+            self._allocate_storage(np.asarray(obs_t), np.asarray(action))
+
+        idx = self._next_idx
+        self._obses_t[idx] = obs_t
+        self._actions[idx] = action
+        self._rewards[idx] = reward
+        self._obses_tp1[idx] = obs_tp1
+        self._dones[idx] = done
+        if self._discounts is not None:
+            self._discounts[idx] = discount
+
         self._next_idx = (self._next_idx + 1) % self._maxsize
+        self._num_stored = min(self._num_stored + 1, self._maxsize)
+        if self.storage_dir is not None:
+            self._save_state()
 
     def _encode_sample(self, idxes):
-        obses_t, actions, rewards, obses_tp1, dones = [], [], [], [], []
-        for i in idxes:
-            data = self._storage[i]
-            obs_t, action, reward, obs_tp1, done = data
-            obses_t.append(np.array(obs_t, copy=False))
-            actions.append(np.array(action, copy=False))
-            rewards.append(reward)
-            obses_tp1.append(np.array(obs_tp1, copy=False))
-            dones.append(done)
-        return np.array(obses_t), np.array(actions), np.array(rewards), np.array(obses_tp1), np.array(dones)
-
-    def sample(self, batch_size, **_kwargs):
+        idxes = np.asarray(idxes)
+        sample = (self._obses_t[idxes], self._actions[idxes], self._rewards[idxes], self._obses_tp1[idxes],
+                  self._dones[idxes])
+        if self.n_step > 1:
+            sample += (self._discounts[idxes],)
+        return sample
+
+    def sample(self, batch_size, rng=None, **_kwargs):
         """
         Sample a batch of experiences.
 
         :param batch_size: (int) How many transitions to sample.
+        :param rng: (np.random.RandomState) the random generator to use (if None, numpy's global one)
         :return:
             - obs_batch: (np.ndarray) batch of observations
             - act_batch: (numpy float) batch of actions executed given obs_batch
@@ -62,13 +275,153 @@ class ReplayBuffer(object):
             - next_obs_batch: (np.ndarray) next set of observations seen after executing act_batch
             - done_mask: (numpy bool) done_mask[i] = 1 if executing act_batch[i] resulted in the end of an episode
                 and 0 otherwise.
+            - discounts: (numpy float) the discount of the value of next_obs_batch, only when n_step > 1
         """
-        idxes = [random.randint(0, len(self._storage) - 1) for _ in range(batch_size)]
+        if rng is None:
+            rng = np.random
+        idxes = rng.randint(0, len(self), size=batch_size)
+        return self._encode_sample(idxes)
+
+
+class FrameStackReplayBuffer(ReplayBuffer):
+    _storage_fields = ('frames', 'frame_idx', 'actions', 'rewards', 'dones')
+    _state_fields = ReplayBuffer._state_fields + ('_num_frames', '_num_added', '_first_valid', '_episode_start')
+
+    def __init__(self, size, n_stack=4, storage_dir=None):
+        """
+        Create Replay buffer for stacked frame observations (e.g. `wrap_atari_dqn` or `FrameStack`).
+
+        The observations are expected to be `n_stack` frames concatenated along the last axis, the oldest first,
+        with consecutive observations of an episode shifted by one frame. Each frame is stored once in a ring
+        of frames, and the stacked `obs_t`/`obs_tp1` are rebuilt from frame indices at sample time. The full stack
+        of the first observation of each episode is stored, so a stack never mixes frames of two episodes.
+
+        Every episode costs `n_stack` extra frames, when the frame ring wraps around the oldest transitions
+        referencing overwritten frames are dropped, so the buffer may hold slightly less than `size` transitions.
+
+        See Also ReplayBuffer.__init__
+
+        :param size: (int) Max number of transitions to store in the buffer. When the buffer overflows the old memories
+            are dropped.
+        :param n_stack: (int) the number of frames in a stacked observation
+        :param storage_dir: (str) the directory of the memory-mapped storage (if None, the buffer is kept in memory)
+        """
+        # set before calling the parent constructor, which restores them when reopening a stored buffer
+        self.n_stack = n_stack
+        self._frame_capacity = size + n_stack
+        self._frames = None
+        # global index of the newest frame of obs_t, for each transition
+        self._frame_idx = None
+        self._num_frames = 0
+        self._num_added = 0
+        self._first_valid = 0
+        self._episode_start = True
+        super(FrameStackReplayBuffer, self).__init__(size, storage_dir=storage_dir)
+
+    def __len__(self):
+        return self._num_added - self._first_valid
+
+    def _allocate_storage(self, obs_t, action):
+        assert obs_t.shape[-1] % self.n_stack == 0, \
+            "Error: the last axis of the observation must be a multiple of n_stack."
+        frame_shape = obs_t.shape[:-1] + (obs_t.shape[-1] // self.n_stack,)
+        self._frames = self._make_array('frames', (self._frame_capacity,) + frame_shape, obs_t.dtype)
+        self._frame_idx = self._make_array('frame_idx', (self._maxsize,), np.int64)
+        self._actions = self._make_array('actions', (self._maxsize,) + action.shape, action.dtype)
+        self._rewards = self._make_array('rewards', (self._maxsize,), np.float32)
+        self._dones = self._make_array('dones', (self._maxsize,), np.float32)
+
+    def _storage_restored(self):
+        super(FrameStackReplayBuffer, self)._storage_restored()
+        # the restored buffer may be interrupted during an episode, the next observation starts a new one
+        self._episode_start = True
+
+    def reset_episode(self):
+        """
+        Start a new episode while the last one is not done (e.g. the environment is reset by a new call to `learn`):
+        the full stack of the next observation is stored.
+        """
+        super(FrameStackReplayBuffer, self).reset_episode()
+        self._episode_start = True
+
+    def _push_frame(self, frame):
+        self._frames[self._num_frames % self._frame_capacity] = frame
+        self._num_frames += 1
+
+    def add(self, obs_t, action, reward, obs_tp1, done):
+        """
+        add a new transition to the buffer
+
+        :param obs_t: (np.ndarray or LazyFrames) the last observation
+        :param action: ([float]) the action
+        :param reward: (float) the reward of the transition
+        :param obs_tp1: (np.ndarray or LazyFrames) the current observation
+        :param done: (bool) is the episode done
+        """
+        obs_t = np.asarray(obs_t)
+        if self._frames is None:
+            self._allocate_storage(obs_t, np.asarray(action))
+        frame_depth = self._frames.shape[-1]
+
+        if self._episode_start:
+            for i in range(self.n_stack):
+                self._push_frame(obs_t[..., i * frame_depth:(i + 1) * frame_depth])
+        self._push_frame(np.asarray(obs_tp1)[..., -frame_depth:])
+        self._episode_start = bool(done)
+
+        idx = self._next_idx
+        # the newest frame of obs_t is the one before the frame of obs_tp1
+        self._frame_idx[idx] = self._num_frames - 2
+        self._actions[idx] = action
+        self._rewards[idx] = reward
+        self._dones[idx] = done
+
+        self._next_idx = (self._next_idx + 1) % self._maxsize
+        self._num_added += 1
+
+        # drop the transitions that are overwritten, or whose oldest frame was overwritten
+        self._first_valid = max(self._first_valid, self._num_added - self._maxsize)
+        oldest_frame = self._num_frames - self._frame_capacity
+        while self._frame_idx[self._first_valid % self._maxsize] - self.n_stack + 1 < oldest_frame:
+            self._first_valid += 1
+        if self.storage_dir is not None:
+            self._save_state()
+
+    def _stack_frames(self, newest_frames):
+        offsets = np.arange(1 - self.n_stack, 1)
+        frames = self._frames[(newest_frames[:, None] + offsets) % self._frame_capacity]
+        # (batch, n_stack, ..., depth) -> (batch, ..., n_stack * depth), the oldest frame first
+        frames = np.moveaxis(frames, 1, -2)
+        return frames.reshape(frames.shape[:-2] + (-1,))
+
+    def _encode_sample(self, idxes):
+        idxes = np.asarray(idxes)
+        frame_idx = self._frame_idx[idxes]
+        return (self._stack_frames(frame_idx), self._actions[idxes], self._rewards[idxes],
+                self._stack_frames(frame_idx + 1), self._dones[idxes])
+
+    def sample(self, batch_size, rng=None, **_kwargs):
+        """
+        Sample a batch of experiences.
+
+        :param batch_size: (int) How many transitions to sample.
+        :param rng: (np.random.RandomState) the random generator to use (if None, numpy's global one)
+        :return:
+            - obs_batch: (np.ndarray) batch of observations
+            - act_batch: (numpy float) batch of actions executed given obs_batch
+            - rew_batch: (numpy float) rewards received as results of executing act_batch
+            - next_obs_batch: (np.ndarray) next set of observations seen after executing act_batch
+            - done_mask: (numpy bool) done_mask[i] = 1 if executing act_batch[i] resulted in the end of an episode
+                and 0 otherwise.
+        """
+        if rng is None:
+            rng = np.random
+        idxes = (self._first_valid + rng.randint(0, len(self), size=batch_size)) % self._maxsize
         return self._encode_sample(idxes)
 
 
 class PrioritizedReplayBuffer(ReplayBuffer):
-    def __init__(self, size, alpha):
+    def __init__(self, size, alpha, storage_dir=None, n_step=1, gamma=0.99):
         """
         Create Prioritized Replay buffer.
 
@@ -77,8 +430,11 @@ class PrioritizedReplayBuffer(ReplayBuffer):
         :param size: (int) Max number of transitions to store in the buffer. When the buffer overflows the old memories
             are dropped.
         :param alpha: (float) how much prioritization is used (0 - no prioritization, 1 - full prioritization)
+        :param storage_dir: (str) the directory of the memory-mapped storage (if None, the buffer is kept in memory).
+            The priorities are kept in memory, the transitions of a reopened or loaded buffer all get the max priority.
+        :param n_step: (int) the number of steps of the stored returns
+        :param gamma: (float) the discount factor of the n-step returns
         """
-        super(PrioritizedReplayBuffer, self).__init__(size)
         assert alpha >= 0
         self._alpha = alpha
 
@@ -89,32 +445,29 @@ class PrioritizedReplayBuffer(ReplayBuffer):
         self._it_sum = SumSegmentTree(it_capacity)
         self._it_min = MinSegmentTree(it_capacity)
         self._max_priority = 1.0
+        super(PrioritizedReplayBuffer, self).__init__(size, storage_dir=storage_dir, n_step=n_step, gamma=gamma)
 
-    def add(self, obs_t, action, reward, obs_tp1, done):
-        """
-        add a new transition to the buffer
+    def _storage_restored(self):
+        super(PrioritizedReplayBuffer, self)._storage_restored()
+        self._it_sum = SumSegmentTree(self._it_sum._capacity)
+        self._it_min = MinSegmentTree(self._it_min._capacity)
+        idxes = np.arange(len(self))
+        self._it_sum[idxes] = self._max_priority ** self._alpha
+        self._it_min[idxes] = self._max_priority ** self._alpha
 
-        :param obs_t: (Any) the last observation
-        :param action: ([float]) the action
-        :param reward: (float) the reward of the transition
-        :param obs_tp1: (Any) the current observation
-        :param done: (bool) is the episode done
-        """
+    def _store(self, obs_t, action, reward, obs_tp1, done, discount=None):
         idx = self._next_idx
-        super().add(obs_t, action, reward, obs_tp1, done)
+        super()._store(obs_t, action, reward, obs_tp1, done, discount)
         self._it_sum[idx] = self._max_priority ** self._alpha
         self._it_min[idx] = self._max_priority ** self._alpha
 
-    def _sample_proportional(self, batch_size):
-        res = []
-        for _ in range(batch_size):
-            # TODO(szymon): should we ensure no repeats?
-            mass = random.random() * self._it_sum.sum(0, len(self._storage) - 1)
-            idx = self._it_sum.find_prefixsum_idx(mass)
-            res.append(idx)
-        return res
+    def _sample_proportional(self, batch_size, rng):
+        # stratified sampling: one sample in each of `batch_size` equal segments of the total priority mass
+        total = self._it_sum.sum(0, len(self) - 1)
+        mass = (np.arange(batch_size) + rng.random_sample(size=batch_size)) * (total / batch_size)
+        return self._it_sum.find_prefixsum_idx(mass)
 
-    def sample(self, batch_size, beta=0):
+    def sample(self, batch_size, beta=0, rng=None):
         """
         Sample a batch of experiences.
 
@@ -124,6 +477,7 @@ class PrioritizedReplayBuffer(ReplayBuffer):
 
         :param batch_size: (int) How many transitions to sample.
         :param beta: (float) To what degree to use importance weights (0 - no corrections, 1 - full correction)
+        :param rng: (np.random.RandomState) the random generator to use (if None, numpy's global one)
         :return:
             - obs_batch: (np.ndarray) batch of observations
             - act_batch: (numpy float) batch of actions executed given obs_batch
@@ -131,23 +485,22 @@ class PrioritizedReplayBuffer(ReplayBuffer):
             - next_obs_batch: (np.ndarray) next set of observations seen after executing act_batch
             - done_mask: (numpy bool) done_mask[i] = 1 if executing act_batch[i] resulted in the end of an episode
                 and 0 otherwise.
+            - discounts: (numpy float) the discount of the value of next_obs_batch, only when n_step > 1
             - weights: (numpy float) Array of shape (batch_size,) and dtype np.float32 denoting importance weight of
                 each sampled transition
             - idxes: (numpy int) Array of shape (batch_size,) and dtype np.int32 idexes in buffer of sampled experiences
         """
         assert beta > 0
 
-        idxes = self._sample_proportional(batch_size)
-
-        weights = []
-        p_min = self._it_min.min() / self._it_sum.sum()
-        max_weight = (p_min * len(self._storage)) ** (-beta)
+        if rng is None:
+            rng = np.random
+        idxes = self._sample_proportional(batch_size, rng)
 
-        for idx in idxes:
-            p_sample = self._it_sum[idx] / self._it_sum.sum()
-            weight = (p_sample * len(self._storage)) ** (-beta)
-            weights.append(weight / max_weight)
-        weights = np.array(weights)
+        total = self._it_sum.sum()
+        p_min = self._it_min.min() / total
+        max_weight = (p_min * len(self)) ** (-beta)
+        p_sample = self._it_sum[idxes] / total
+        weights = (p_sample * len(self)) ** (-beta) / max_weight
         encoded_sample = self._encode_sample(idxes)
         return tuple(list(encoded_sample) + [weights, idxes])
 
@@ -162,11 +515,13 @@ class PrioritizedReplayBuffer(ReplayBuffer):
         :param priorities: ([float]) List of updated priorities corresponding to transitions at the sampled idxes
             denoted by variable `idxes`.
         """
+        idxes = np.asarray(idxes)
+        priorities = np.asarray(priorities)
         assert len(idxes) == len(priorities)
-        for idx, priority in zip(idxes, priorities):
-            assert priority > 0
-            assert 0 <= idx < len(self._storage)
-            self._it_sum[idx] = priority ** self._alpha
-            self._it_min[idx] = priority ** self._alpha
+        assert np.min(priorities) > 0
+        assert np.min(idxes) >= 0
+        assert np.max(idxes) < len(self)
+        self._it_sum[idxes] = priorities ** self._alpha
+        self._it_min[idxes] = priorities ** self._alpha
 
-            self._max_priority = max(self._max_priority, priority)
+        self._max_priority = max(self._max_priority, np.max(priorities))
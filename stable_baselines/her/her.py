@@ -3,6 +3,7 @@ import numpy as np
 import gym
 
 from stable_baselines.common import BaseRLModel, SetVerbosity
+from stable_baselines.common.math_util import gather_2d
 from stable_baselines.common.policies import LstmPolicy, ActorCriticPolicy
 
 
@@ -21,18 +22,27 @@ def make_sample_her_transitions(replay_strategy, replay_k, reward_fun):
     else:  # 'replay_strategy' == 'none'
         future_p = 0
 
-    def _sample_her_transitions(episode_batch, batch_size_in_transitions):
-        """episode_batch is {key: array(buffer_size x T x dim_key)}
+    def _sample_her_transitions(episode_batch, batch_size_in_transitions, out=None):
+        """episode_batch is {key: array(buffer_size x T or T+1 x dim_key)}, the next observations and achieved goals
+        ('o_2' and 'ag_2') are gathered from 'o' and 'ag'. The transitions are gathered in the arrays of `out`
+        ({key: array(batch_size x dim_key)}) if given.
         """
         time_horizon = episode_batch['u'].shape[1]
         rollout_batch_size = episode_batch['u'].shape[0]
         batch_size = batch_size_in_transitions
+        if out is None:
+            out = {}
 
         # Select which episodes and time steps to use.
         episode_idxs = np.random.randint(0, rollout_batch_size, batch_size)
         t_samples = np.random.randint(time_horizon, size=batch_size)
-        transitions = {key: episode_batch[key][episode_idxs, t_samples].copy()
-                       for key in episode_batch.keys()}
+        transitions = {}
+        for key, array in episode_batch.items():
+            if key in ('o_2', 'ag_2'):
+                continue
+            transitions[key] = gather_2d(array, episode_idxs, t_samples, out.get(key))
+            if key in ('o', 'ag'):
+                transitions[key + '_2'] = gather_2d(array, episode_idxs, t_samples + 1, out.get(key + '_2'))
 
         # Select future time indexes proportional with probability future_p. These
         # will be used for HER replay by substituting in future goals.
@@ -4,23 +4,28 @@ import numpy as np
 
 
 class ReplayBuffer:
-    def __init__(self, buffer_shapes, size_in_transitions, time_horizon, sample_transitions):
+    def __init__(self, buffer_shapes, size_in_transitions, time_horizon, sample_transitions, dtype=np.float32):
         """
         Creates a replay buffer.
 
         :param buffer_shapes: ({str: int}) the shape for all buffers that are used in the replay buffer
         :param size_in_transitions: (int) the size of the buffer, measured in transitions
         :param time_horizon: (int) the time horizon for episodes
-        :param sample_transitions: (function) a function that samples from the replay buffer
+        :param sample_transitions: (function (dict, int, dict): dict) a function that samples from the replay buffer,
+            gathering the transitions in the given output arrays (see make_sample_her_transitions)
+        :param dtype: (numpy dtype) the type of the stored values
         """
         self.buffer_shapes = buffer_shapes
         self.size = size_in_transitions // time_horizon
         self.time_horizon = time_horizon
         self.sample_transitions = sample_transitions
+        self.dtype = dtype
 
         # self.buffers is {key: array(size_in_episodes x T or T+1 x dim_key)}
-        self.buffers = {key: np.empty([self.size, *shape])
+        self.buffers = {key: np.empty([self.size, *shape], dtype=dtype)
                         for key, shape in buffer_shapes.items()}
+        # the arrays receiving the sampled transitions, reused while the batch size does not change
+        self._sample_buffers = {}
 
         # memory management
         self.current_size = 0
@@ -37,6 +42,8 @@ class ReplayBuffer:
         """
         sample random transitions
 
+        The transitions are gathered in arrays that are reused (overwritten) by the next call with the same batch size.
+
         :param batch_size: (int) How many transitions to sample.
         :return: (dict) {key: array(batch_size x shapes[key])}
         """
@@ -47,10 +54,13 @@ class ReplayBuffer:
             for key in self.buffers.keys():
                 buffers[key] = self.buffers[key][:self.current_size]
 
-        buffers['o_2'] = buffers['o'][:, 1:, :]
-        buffers['ag_2'] = buffers['ag'][:, 1:, :]
+        if len(self._sample_buffers.get('u', ())) != batch_size:
+            self._sample_buffers = {key: np.empty((batch_size, *shape[1:]), dtype=self.dtype)
+                                    for key, shape in self.buffer_shapes.items()}
+            for key in ['o', 'ag']:
+                self._sample_buffers[key + '_2'] = np.empty_like(self._sample_buffers[key])
 
-        transitions = self.sample_transitions(buffers, batch_size)
+        transitions = self.sample_transitions(buffers, batch_size, out=self._sample_buffers)
 
         for key in (['r', 'o_2', 'ag_2'] + list(self.buffers.keys())):
             assert key in transitions, "key %s missing from transitions" % key
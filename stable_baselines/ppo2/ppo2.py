@@ -9,7 +9,7 @@ import tensorflow as tf
 
 from stable_baselines import logger
 from stable_baselines.common import explained_variance, ActorCriticRLModel, tf_util, SetVerbosity, TensorboardWriter
-from stable_baselines.common.runners import AbstractEnvRunner
+from stable_baselines.common.runners import AbstractEnvRunner, RolloutBuffer
 from stable_baselines.common.policies import LstmPolicy, ActorCriticPolicy
 from stable_baselines.a2c.utils import total_episode_reward_logger
 
@@ -372,11 +372,16 @@ class Runner(AbstractEnvRunner):
         super().__init__(env=env, model=model, n_steps=n_steps)
         self.lam = lam
         self.gamma = gamma
+        self.buffer = RolloutBuffer(env.num_envs, n_steps, dtypes={
+            'obs': self.obs.dtype, 'rewards': np.float32, 'values': np.float32, 'neglogpacs': np.float32,
+            'dones': np.bool})
 
     def run(self):
         """
         Run a learning step of the model
 
+        The returned arrays are views of the rollout buffer of the runner, overwritten by the next run.
+
         :return:
             - observations: (np.ndarray) the observations
             - rewards: (np.ndarray) the rewards
@@ -387,17 +392,16 @@ class Runner(AbstractEnvRunner):
             - states: (np.ndarray) the internal states of the recurrent policies
             - infos: (dict) the extra information of the model
         """
-        # mb stands for minibatch
-        mb_obs, mb_rewards, mb_actions, mb_values, mb_dones, mb_neglogpacs = [], [], [], [], [], []
+        if self.trajectories is not None:
+            batch, ep_infos = self._run_env_ids(self.n_steps * self.env.num_envs, self.gamma, self.lam)
+            return batch['obs'], batch['returns'], batch['masks'], batch['actions'], batch['values'], \
+                batch['neglogpacs'], None, ep_infos, batch['rewards']
+        buffer = self.buffer
         mb_states = self.states
         ep_infos = []
-        for _ in range(self.n_steps):
+        for step in range(self.n_steps):
             actions, values, self.states, neglogpacs = self.model.step(self.obs, self.states, self.dones)
-            mb_obs.append(self.obs.copy())
-            mb_actions.append(actions)
-            mb_values.append(values)
-            mb_neglogpacs.append(neglogpacs)
-            mb_dones.append(self.dones)
+            buffer.add(step, obs=self.obs, actions=actions, values=values, neglogpacs=neglogpacs, dones=self.dones)
             clipped_actions = actions
             # Clip the actions to avoid out of bound error
             if isinstance(self.env.action_space, gym.spaces.Box):
@@ -407,32 +411,26 @@ class Runner(AbstractEnvRunner):
                 maybe_ep_info = info.get('episode')
                 if maybe_ep_info is not None:
                     ep_infos.append(maybe_ep_info)
-            mb_rewards.append(rewards)
-        # batch of steps to batch of rollouts
-        mb_obs = np.asarray(mb_obs, dtype=self.obs.dtype)
-        mb_rewards = np.asarray(mb_rewards, dtype=np.float32)
-        mb_actions = np.asarray(mb_actions)
-        mb_values = np.asarray(mb_values, dtype=np.float32)
-        mb_neglogpacs = np.asarray(mb_neglogpacs, dtype=np.float32)
-        mb_dones = np.asarray(mb_dones, dtype=np.bool)
+            buffer.add(step, rewards=rewards)
+        # the arrays are [n_env, n_steps, ...]
+        mb_rewards, mb_values, mb_dones = buffer.array('rewards'), buffer.array('values'), buffer.array('dones')
         last_values = self.model.value(self.obs, self.states, self.dones)
         # discount/bootstrap off value fn
-        mb_advs = np.zeros_like(mb_rewards)
-        true_reward = np.copy(mb_rewards)
+        mb_advs = buffer.array('advs')
         last_gae_lam = 0
         for step in reversed(range(self.n_steps)):
             if step == self.n_steps - 1:
                 nextnonterminal = 1.0 - self.dones
                 nextvalues = last_values
             else:
-                nextnonterminal = 1.0 - mb_dones[step + 1]
-                nextvalues = mb_values[step + 1]
-            delta = mb_rewards[step] + self.gamma * nextvalues * nextnonterminal - mb_values[step]
-            mb_advs[step] = last_gae_lam = delta + self.gamma * self.lam * nextnonterminal * last_gae_lam
-        mb_returns = mb_advs + mb_values
+                nextnonterminal = 1.0 - mb_dones[:, step + 1]
+                nextvalues = mb_values[:, step + 1]
+            delta = mb_rewards[:, step] + self.gamma * nextvalues * nextnonterminal - mb_values[:, step]
+            mb_advs[:, step] = last_gae_lam = delta + self.gamma * self.lam * nextnonterminal * last_gae_lam
+        np.add(mb_advs, mb_values, out=buffer.array('returns'))
 
         mb_obs, mb_returns, mb_dones, mb_actions, mb_values, mb_neglogpacs, true_reward = \
-            map(swap_and_flatten, (mb_obs, mb_returns, mb_dones, mb_actions, mb_values, mb_neglogpacs, true_reward))
+            map(buffer.flat, ('obs', 'returns', 'dones', 'actions', 'values', 'neglogpacs', 'rewards'))
 
         return mb_obs, mb_returns, mb_dones, mb_actions, mb_values, mb_neglogpacs, mb_states, ep_infos, true_reward
 
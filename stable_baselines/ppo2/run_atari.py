@@ -22,7 +22,7 @@ def train(env_id, num_timesteps, seed, policy,
         (i.e. batch size is n_steps * n_env where n_env is number of environment copies running in parallel)
     """
 
-    env = VecFrameStack(make_atari_env(env_id, n_envs, seed), 4)
+    env = VecFrameStack(make_atari_env(env_id, n_envs, seed), 4, copy=False)
     policy = {'cnn': CnnPolicy, 'lstm': CnnLstmPolicy, 'lnlstm': CnnLnLstmPolicy, 'mlp': MlpPolicy}[policy]
     model = PPO2(policy=policy, env=env, n_steps=n_steps, nminibatches=nminibatches,
                  lam=0.95, gamma=0.99, noptepochs=4, ent_coef=.01,
@@ -9,6 +9,7 @@ import tensorflow as tf
 from stable_baselines.a2c.utils import find_trainable_variables, total_episode_reward_logger
 from stable_baselines.common import tf_util, OffPolicyRLModel, SetVerbosity, TensorboardWriter
 from stable_baselines.common.vec_env import VecEnv
+from stable_baselines.common.replay_prefetcher import ReplayPrefetcher
 from stable_baselines.deepq.replay_buffer import ReplayBuffer
 from stable_baselines.ppo2.ppo2 import safe_mean, get_schedule_fn
 from stable_baselines.sac.policies import SACPolicy
@@ -46,9 +47,14 @@ class SAC(OffPolicyRLModel):
     :param ent_coef: (float) Entropy regularization coefficient. (Equivalent to
         inverse of reward scale in the original SAC paper.)  Controlling exploration/exploitation trade-off.
     :param train_freq: (int) Update the model every `train_freq` steps.
-    :param learning_starts: (int) how many steps of the model to collect transitions for before learning starts
+    :param learning_starts: (int) how many transitions the replay buffer must hold before learning starts (the
+        transitions of a restored replay buffer count)
     :param target_update_interval: (int) update the target network every `target_network_update_freq` steps.
     :param gradient_steps: (int) How many gradient update after each step
+    :param buffer_storage_dir: (str) if not None, the replay buffer is stored in memory-mapped files in this
+        directory (and reopened if it already holds a replay buffer), instead of being kept in memory
+    :param prefetch_batches: (int) if > 0, this many minibatches are sampled in advance in a background thread,
+        while the gradient steps run (see ReplayPrefetcher)
     :param verbose: (int) the verbosity level: 0 none, 1 training information, 2 tensorflow debug
     :param tensorboard_log: (str) the log location for tensorboard (if None, no logging)
     :param _init_setup_model: (bool) Whether or not to build the network at the creation of the instance
@@ -56,12 +62,14 @@ class SAC(OffPolicyRLModel):
 
     def __init__(self, policy, env, gamma=0.99, learning_rate=3e-3, buffer_size=50000,
                  learning_starts=100, train_freq=1, batch_size=64,
-                 tau=0.005, ent_coef=0.1, target_update_interval=1, gradient_steps=1,
-                 verbose=0, tensorboard_log=None, _init_setup_model=True):
+                 tau=0.005, ent_coef=0.1, target_update_interval=1, gradient_steps=1, buffer_storage_dir=None,
+                 prefetch_batches=0, verbose=0, tensorboard_log=None, _init_setup_model=True):
         super(SAC, self).__init__(policy=policy, env=env, replay_buffer=None, verbose=verbose,
                                   policy_base=SACPolicy, requires_vec_env=False)
 
         self.buffer_size = buffer_size
+        self.buffer_storage_dir = buffer_storage_dir
+        self.prefetch_batches = prefetch_batches
         self.learning_rate = learning_rate
         self.learning_starts = learning_starts
         self.train_freq = train_freq
@@ -81,6 +89,7 @@ class SAC(OffPolicyRLModel):
         self.value_fn = None
         self.graph = None
         self.replay_buffer = None
+        self._replay = None
         self.episode_reward = None
         self.sess = None
         self.tensorboard_log = tensorboard_log
@@ -118,7 +127,7 @@ class SAC(OffPolicyRLModel):
                 self.sess = tf_util.make_session(num_cpu=n_cpu, graph=self.graph)
 
 
-                self.replay_buffer = ReplayBuffer(self.buffer_size)
+                self.replay_buffer = ReplayBuffer(self.buffer_size, storage_dir=self.buffer_storage_dir)
 
                 with tf.variable_scope("input", reuse=False):
                     # Create policy and target TF objects
@@ -249,7 +258,7 @@ class SAC(OffPolicyRLModel):
 
     def _train_step(self, step, writer, learning_rate):
         # Sample a batch from the replay buffer
-        batch = self.replay_buffer.sample(self.batch_size)
+        batch = self._replay.sample(self.batch_size)
         batch_obs, batch_actions, batch_rewards, batch_next_obs, batch_dones = batch
 
         feed_dict = {
@@ -282,6 +291,13 @@ class SAC(OffPolicyRLModel):
         return policy_loss, qf1_loss, qf2_loss, value_loss, entropy
 
     def learn(self, total_timesteps, callback=None, seed=None, log_interval=4, tb_log_name="SAC"):
+        try:
+            return self._learn(total_timesteps, callback, seed, log_interval, tb_log_name)
+        finally:
+            # stop the replay prefetcher even if the training raises
+            self._close_replay_prefetcher()
+
+    def _learn(self, total_timesteps, callback, seed, log_interval, tb_log_name):
         with SetVerbosity(self.verbose), TensorboardWriter(self.graph, self.tensorboard_log, tb_log_name) as writer:
             self._setup_learn(seed)
 
@@ -297,6 +313,11 @@ class SAC(OffPolicyRLModel):
             ep_info_buf = deque(maxlen=100)
             n_updates = 0
             infos_values = []
+            # the minibatches can be sampled in a background thread, while the gradient steps run
+            if self.prefetch_batches > 0:
+                self._replay = ReplayPrefetcher(self.replay_buffer, self.prefetch_batches)
+            else:
+                self._replay = self.replay_buffer
 
             for step in range(total_timesteps):
                 if callback is not None:
@@ -308,7 +329,8 @@ class SAC(OffPolicyRLModel):
                 # Before training starts, randomly sample actions
                 # from a uniform distribution for better exploration.
                 # Afterwards, use the learned policy.
-                if step < self.learning_starts:
+                # the warm-up is over once the buffer holds `learning_starts` transitions, e.g. restored ones
+                if len(self.replay_buffer) < self.learning_starts:
                     action = self.env.action_space.sample()
                     # No need to rescale when sampling random action
                     rescaled_action = action
@@ -322,7 +344,7 @@ class SAC(OffPolicyRLModel):
                 new_obs, reward, done, info = self.env.step(rescaled_action)
 
                 # Store transition in the replay buffer.
-                self.replay_buffer.add(obs, action, reward, new_obs, float(done))
+                self._replay.add(obs, action, reward, new_obs, float(done))
                 obs = new_obs
 
                 # Retrieve reward and episode length if using Monitor wrapper
@@ -341,7 +363,7 @@ class SAC(OffPolicyRLModel):
                     mb_infos_vals = []
                     # Update policy, critics and target networks
                     for grad_step in range(self.gradient_steps):
-                        if step < self.batch_size or step < self.learning_starts:
+                        if len(self.replay_buffer) < max(self.batch_size, self.learning_starts):
                             break
                         n_updates += 1
                         # Compute current learning_rate
@@ -412,15 +434,14 @@ class SAC(OffPolicyRLModel):
         data = {
             "learning_rate": self.learning_rate,
             "buffer_size": self.buffer_size,
+            "buffer_storage_dir": self.buffer_storage_dir,
+            "prefetch_batches": self.prefetch_batches,
             "learning_starts": self.learning_starts,
             "train_freq": self.train_freq,
             "batch_size": self.batch_size,
             "tau": self.tau,
             "ent_coef": self.ent_coef,
-            # Should we also store the replay buffer?
-            # this may lead to high memory usage
-            # with all transition inside
-            # "replay_buffer": self.replay_buffer
+            # the replay buffer can be large, it is saved separately with save_replay_buffer
             "gamma": self.gamma,
             "verbose": self.verbose,
             "observation_space": self.observation_space,
@@ -121,3 +121,31 @@ def test_ddpg():
     args = list(map(str, args))
     return_code = subprocess.call(['python', '-m', 'stable_baselines.ddpg.main'] + args)
     _assert_eq(return_code, 0)
+
+
+def test_sac_restored_buffer_skips_warm_up(tmpdir):
+    """
+    test SAC learning with a restored replay buffer neither samples random actions nor waits to train
+    """
+    save_path = str(tmpdir.join('buffer.zip'))
+    model = SAC(policy="MlpPolicy", env=IdentityEnvBox(eps=0.5), learning_starts=100)
+    model.learn(total_timesteps=100)
+    model.save_replay_buffer(save_path)
+
+    model = SAC(policy="MlpPolicy", env=IdentityEnvBox(eps=0.5), learning_starts=100)
+    model.load_replay_buffer(save_path)
+    calls = {'train': 0, 'random': 0}
+    train_step, random_action = model._train_step, model.env.action_space.sample
+
+    def _counting_train_step(*args, **kwargs):
+        calls['train'] += 1
+        return train_step(*args, **kwargs)
+
+    def _counting_random_action():
+        calls['random'] += 1
+        return random_action()
+
+    model._train_step = _counting_train_step
+    model.env.action_space.sample = _counting_random_action
+    model.learn(total_timesteps=10)
+    assert calls == {'train': 10, 'random': 0}
@@ -1,3 +1,7 @@
+import gym
+import numpy as np
+
+from stable_baselines import DQN
 from stable_baselines.deepq.experiments.custom_cartpole import main as main_custom
 from stable_baselines.deepq.experiments.train_cartpole import main as train_cartpole
 from stable_baselines.deepq.experiments.enjoy_cartpole import main as enjoy_cartpole
@@ -29,3 +33,65 @@ def test_cartpole():
 def test_mountaincar():
     train_mountaincar(args)
     enjoy_mountaincar(args)
+
+
+class FrameCounterEnv(gym.Env):
+    """
+    Observations of 2 stacked frames, each frame is 100 * the number of episodes + the number of steps
+    """
+    def __init__(self):
+        self.observation_space = gym.spaces.Box(low=0, high=np.inf, shape=(2,), dtype=np.float32)
+        self.action_space = gym.spaces.Discrete(2)
+        self.n_episodes = 0
+        self.frame = 0
+
+    def reset(self):
+        self.n_episodes += 1
+        self.frame = 100 * self.n_episodes
+        return np.array([self.frame, self.frame], dtype=np.float32)
+
+    def step(self, action):
+        self.frame += 1
+        return np.array([self.frame - 1, self.frame], dtype=np.float32), 0., False, {}
+
+    def render(self, mode='human'):
+        pass
+
+
+def test_learn_twice_frame_stack():
+    """
+    test the frame stacks of the replay buffer kept across calls to learn do not mix two episodes
+    """
+    model = DQN(policy="MlpPolicy", env=FrameCounterEnv(), learning_starts=1000, replay_frame_stack=2)
+    model.learn(total_timesteps=10)
+    model.learn(total_timesteps=10)
+    buffer = model.replay_buffer
+    assert len(buffer) == 20
+    obses_t, _, _, obses_tp1, _ = buffer._encode_sample(np.arange(len(buffer)))
+    for obses in [obses_t, obses_tp1]:
+        assert np.all(obses[:, 0] // 100 == obses[:, 1] // 100)
+        assert np.all(obses[:, 1] - obses[:, 0] <= 1)
+    assert np.array_equal(obses_t[10], [200, 200])
+
+
+def test_restored_buffer_skips_warm_up(tmpdir):
+    """
+    test a model learning with a restored replay buffer does not wait for `learning_starts` new transitions
+    """
+    save_path = str(tmpdir.join('buffer.zip'))
+    model = DQN(policy="MlpPolicy", env=FrameCounterEnv(), learning_starts=50)
+    model.learn(total_timesteps=60)
+    model.save_replay_buffer(save_path)
+
+    model = DQN(policy="MlpPolicy", env=FrameCounterEnv(), learning_starts=50)
+    model.load_replay_buffer(save_path)
+    n_train_steps = [0]
+    train_step = model._train_step
+
+    def _counting_train_step(*args, **kwargs):
+        n_train_steps[0] += 1
+        return train_step(*args, **kwargs)
+
+    model._train_step = _counting_train_step
+    model.learn(total_timesteps=10)
+    assert n_train_steps[0] == 10
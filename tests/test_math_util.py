@@ -1,6 +1,7 @@
 import numpy as np
+import pytest
 
-from stable_baselines.common.math_util import discount_with_boundaries
+from stable_baselines.common.math_util import discount_with_boundaries, gather_2d
 
 
 def test_discount_with_boundaries():
@@ -13,3 +14,18 @@ def test_discount_with_boundaries():
     discounted_rewards = discount_with_boundaries(rewards, episode_starts, gamma)
     assert np.allclose(discounted_rewards, [1 + gamma * 2 + gamma ** 2 * 3, 2 + gamma * 3, 3, 4])
     return
+
+
+def test_gather_2d():
+    """
+    test gather_2d gathers the values at the indexes of the first two axes, and refuses invalid indexes
+    """
+    array = np.arange(4 * 3 * 2).reshape((4, 3, 2))
+    idxs_0, idxs_1 = np.array([3, 0, 1, 3]), np.array([2, 0, 2, 1])
+    out = np.empty((4, 2), dtype=array.dtype)
+    assert gather_2d(array, idxs_0, idxs_1, out=out) is out
+    assert np.array_equal(out, array[idxs_0, idxs_1])
+    with pytest.raises(IndexError):
+        gather_2d(array, idxs_0, np.array([0, 0, 3, 0]))
+    with pytest.raises(IndexError):
+        gather_2d(array, np.array([-1, 0, 0, 0]), idxs_1)
@@ -0,0 +1,406 @@
+import gym
+import numpy as np
+import pytest
+
+from stable_baselines.acer.buffer import Buffer
+from stable_baselines.common.vec_env import DummyVecEnv, VecFrameStack
+from stable_baselines.common.replay_prefetcher import ReplayPrefetcher
+from stable_baselines.ddpg.memory import Memory, CompactMemory
+from stable_baselines.deepq.replay_buffer import ReplayBuffer, PrioritizedReplayBuffer, FrameStackReplayBuffer
+from stable_baselines.her.her import make_sample_her_transitions
+from stable_baselines.her.replay_buffer import ReplayBuffer as HERReplayBuffer
+
+
+def test_replay_buffer_storage():
+    """
+    test the array backed storage of the replay buffer
+    """
+    buffer = ReplayBuffer(4)
+    for i in range(6):
+        obs = np.full((3,), i, dtype=np.uint8)
+        buffer.add(obs, i % 2, float(i), obs + 1, float(i == 5))
+
+    assert len(buffer) == 4
+    assert buffer.buffer_size == 4
+
+    obses_t, actions, rewards, obses_tp1, dones = buffer.sample(32)
+    assert obses_t.shape == (32, 3) and obses_t.dtype == np.uint8
+    assert actions.shape == (32,)
+    assert rewards.shape == (32,) and dones.shape == (32,)
+    # the two oldest transitions have been overwritten
+    assert np.all(rewards >= 2)
+    assert np.all(obses_t[:, 0] == rewards)
+    assert np.all(obses_tp1 == obses_t + 1)
+    assert np.all(actions == rewards % 2)
+    assert np.all(dones == (rewards == 5))
+
+
+def test_prioritized_replay_buffer():
+    """
+    test the prioritized replay buffer only samples transitions with a non-zero priority
+    """
+    buffer = PrioritizedReplayBuffer(8, alpha=1.0)
+    for i in range(8):
+        buffer.add(np.array([i], dtype=np.float32), 0, float(i), np.array([i + 1], dtype=np.float32), 0.0)
+    buffer.update_priorities([3, 5], [1.0, 1.0])
+    buffer.update_priorities([0, 1, 2, 4, 6, 7], [1e-8] * 6)
+
+    _, _, rewards, _, _, weights, idxes = buffer.sample(64, beta=0.5)
+    assert set(np.unique(idxes)) <= {3, 5}
+    assert np.all(rewards == np.asarray(idxes))
+    assert weights.shape == (64,)
+
+
+def test_frame_stack_replay_buffer():
+    """
+    test the frame stack replay buffer rebuilds the same stacked observations that were added
+    """
+    n_stack, size = 4, 50
+    buffer = FrameStackReplayBuffer(size, n_stack=n_stack)
+    transitions = {}
+    frame_id = 0
+    step = 0
+    for episode_length in [3, 20, 1, 40, 7]:
+        # zero padded stack for the first observation, like VecFrameStack
+        frames = [np.zeros((2, 2, 1), dtype=np.uint8)] * (n_stack - 1) + [np.full((2, 2, 1), frame_id, np.uint8)]
+        frame_id += 1
+        for i in range(episode_length):
+            obs_t = np.concatenate(frames[-n_stack:], axis=2)
+            frames.append(np.full((2, 2, 1), frame_id, dtype=np.uint8))
+            frame_id += 1
+            obs_tp1 = np.concatenate(frames[-n_stack:], axis=2)
+            done = i == episode_length - 1
+            buffer.add(obs_t, step % 3, float(step), obs_tp1, float(done))
+            transitions[step] = (obs_t, obs_tp1, done)
+            step += 1
+
+    assert 0 < len(buffer) <= size
+    obses_t, actions, rewards, obses_tp1, dones = buffer.sample(256)
+    assert obses_t.shape == (256, 2, 2, n_stack) and obses_t.dtype == np.uint8
+    for obs_t, action, reward, obs_tp1, done in zip(obses_t, actions, rewards, obses_tp1, dones):
+        expected_obs_t, expected_obs_tp1, expected_done = transitions[int(reward)]
+        assert int(reward) >= step - len(buffer)
+        assert np.all(obs_t == expected_obs_t)
+        assert np.all(obs_tp1 == expected_obs_tp1)
+        assert action == int(reward) % 3
+        assert done == expected_done
+
+
+def test_frame_stack_replay_buffer_reset_episode():
+    """
+    test the frame stack replay buffer stores the full stack of an episode started before the last one is done
+    """
+    buffer = FrameStackReplayBuffer(10, n_stack=2)
+    buffer.add(np.array([0, 1]), 0, 0.0, np.array([1, 2]), 0.0)
+    buffer.reset_episode()
+    buffer.add(np.array([10, 10]), 0, 1.0, np.array([10, 11]), 0.0)
+    obses_t, _, _, obses_tp1, _ = buffer._encode_sample(np.arange(2))
+    assert np.array_equal(obses_t, [[0, 1], [10, 10]])
+    assert np.array_equal(obses_tp1, [[1, 2], [10, 11]])
+
+
+def test_memmap_replay_buffer(tmpdir):
+    """
+    test the memory-mapped replay buffers can be reopened with their content
+    """
+    storage_dir = str(tmpdir.join('buffer'))
+    buffer = ReplayBuffer(10, storage_dir=storage_dir)
+    for i in range(13):
+        buffer.add(np.full((2,), i, dtype=np.float32), i, float(i), np.full((2,), i + 1, dtype=np.float32), 0.0)
+    assert isinstance(buffer._obses_t, np.memmap)
+    expected = buffer._encode_sample(np.arange(10))
+    del buffer
+
+    buffer = ReplayBuffer(10, storage_dir=storage_dir)
+    assert len(buffer) == 10
+    for array, expected_array in zip(buffer._encode_sample(np.arange(10)), expected):
+        assert np.all(array == expected_array)
+    buffer.add(np.zeros((2,), dtype=np.float32), 0, 13.0, np.zeros((2,), dtype=np.float32), 0.0)
+    assert buffer._rewards[3] == 13.0
+
+
+def test_memmap_frame_stack_replay_buffer(tmpdir):
+    """
+    test a frame stack replay buffer reopened during an episode stores the full stack of the next observation
+    """
+    storage_dir = str(tmpdir.join('buffer'))
+    buffer = FrameStackReplayBuffer(10, n_stack=2, storage_dir=storage_dir)
+    buffer.add(np.array([0, 1]), 0, 0.0, np.array([1, 2]), 0.0)
+    buffer.add(np.array([1, 2]), 0, 1.0, np.array([2, 3]), 0.0)
+    del buffer
+
+    buffer = FrameStackReplayBuffer(10, n_stack=2, storage_dir=storage_dir)
+    assert len(buffer) == 2
+    buffer.add(np.array([10, 10]), 0, 2.0, np.array([10, 11]), 0.0)
+    obses_t, _, _, obses_tp1, _ = buffer._encode_sample(np.arange(3))
+    assert np.array_equal(obses_t, [[0, 1], [1, 2], [10, 10]])
+    assert np.array_equal(obses_tp1, [[1, 2], [2, 3], [10, 11]])
+
+
+def test_memmap_ddpg_memory(tmpdir):
+    """
+    test the memory-mapped DDPG memory can be reopened with its content
+    """
+    storage_dir = str(tmpdir.join('memory'))
+    memory = Memory(8, action_shape=(1,), observation_shape=(3,), storage_dir=storage_dir)
+    for i in range(11):
+        memory.append(np.full((3,), i), np.array([i]), float(i), np.full((3,), i + 1), False)
+    del memory
+
+    memory = Memory(8, action_shape=(1,), observation_shape=(3,), storage_dir=storage_dir)
+    assert memory.nb_entries == 8
+    batch = memory.sample(16)
+    assert np.all(batch['rewards'] >= 3)
+    assert np.all(batch['obs1'] == batch['obs0'] + 1)
+
+
+def test_compact_memory(tmpdir):
+    """
+    test the DDPG memory storing each observation once keeps the next observations across episodes
+    """
+    storage_dir = str(tmpdir.join('memory'))
+    memory = CompactMemory(10, action_shape=(1,), observation_shape=(2,), storage_dir=storage_dir)
+    obs = np.zeros((2,), dtype=np.uint8)
+    for i in range(1, 13):
+        # an episode of 3 transitions, the reset observation is 100 + the last one
+        new_obs = np.full((2,), i, dtype=np.uint8)
+        memory.append(obs, np.array([i]), float(i), new_obs, i % 3 == 0)
+        obs = new_obs + 100 if i % 3 == 0 else new_obs
+    assert memory.observations.data.dtype == np.uint8
+    assert memory.nb_entries == 7
+
+    memory = CompactMemory(10, action_shape=(1,), observation_shape=(2,), storage_dir=storage_dir)
+    assert memory.nb_entries == 7
+    batch = memory.sample(64)
+    assert batch['obs0'].dtype == np.uint8 and batch['obs0'].shape == (64, 2)
+    # only the last 7 transitions are kept, with their own next observation
+    assert np.all(batch['rewards'] >= 6)
+    assert np.all(batch['obs1'] == batch['rewards'])
+    assert np.all(batch['actions'] == batch['rewards'])
+    assert np.all(batch['terminals1'] == (batch['rewards'] % 3 == 0))
+
+
+def test_save_load_replay_buffer(tmpdir):
+    """
+    test saving and loading the replay buffers in chunks
+    """
+    save_path = str(tmpdir.join('buffer.zip'))
+    buffer = PrioritizedReplayBuffer(100, alpha=0.6)
+    for i in range(150):
+        buffer.add(np.full((8,), i, dtype=np.float32), i % 4, float(i % 2), np.full((8,), i + 1, dtype=np.float32),
+                   0.0)
+    # small chunks, some of them only hold zeros
+    buffer.save(save_path, chunk_bytes=64)
+
+    loaded_buffer = PrioritizedReplayBuffer(100, alpha=0.6, storage_dir=str(tmpdir.join('memmap')))
+    loaded_buffer.load(save_path, n_workers=4)
+    assert len(loaded_buffer) == len(buffer)
+    assert loaded_buffer._next_idx == buffer._next_idx
+    idxes = np.arange(100)
+    for array, expected_array in zip(loaded_buffer._encode_sample(idxes), buffer._encode_sample(idxes)):
+        assert np.all(array == expected_array)
+    assert np.isclose(loaded_buffer._it_sum.sum(), 100)
+
+    memory = Memory(16, action_shape=(2,), observation_shape=(3,))
+    for i in range(20):
+        memory.append(np.full((3,), i), np.array([i, -i]), float(i), np.full((3,), i + 1), i % 5 == 0)
+    memory.save(save_path)
+    loaded_memory = Memory(16, action_shape=(2,), observation_shape=(3,))
+    loaded_memory.load(save_path)
+    assert loaded_memory.nb_entries == 16
+    assert loaded_memory.observations0.start == memory.observations0.start
+    assert np.all(loaded_memory.actions.data == memory.actions.data)
+    assert np.all(loaded_memory.terminals1.data == memory.terminals1.data)
+
+
+def test_n_step_replay_buffer():
+    """
+    test the n-step returns computed when adding transitions
+    """
+    n_step, gamma = 3, 0.5
+    buffer = ReplayBuffer(100, n_step=n_step, gamma=gamma)
+    rewards = [1.0, 2.0, 4.0, 8.0, 16.0]
+    for i, reward in enumerate(rewards):
+        buffer.add(np.array([i]), i, reward, np.array([i + 1]), float(i == len(rewards) - 1))
+    assert len(buffer) == len(rewards)
+
+    obses_t, actions, returns, obses_tp1, dones, discounts = buffer._encode_sample(np.arange(len(rewards)))
+    assert np.all(obses_t[:, 0] == np.arange(len(rewards)))
+    # the first transitions bootstrap from n steps later, the last ones from the end of the episode
+    assert np.all(obses_tp1[:, 0] == [3, 4, 5, 5, 5])
+    assert np.allclose(returns, [1 + 1 + 1, 2 + 2 + 2, 4 + 4 + 4, 8 + 8, 16])
+    assert np.allclose(discounts, [gamma ** 3, gamma ** 3, gamma ** 3, gamma ** 2, gamma])
+    assert np.all(dones == [0, 0, 1, 1, 1])
+    assert len(buffer.sample(8)) == 6
+
+    buffer = PrioritizedReplayBuffer(100, alpha=0.6, n_step=n_step, gamma=gamma)
+    for i, reward in enumerate(rewards):
+        buffer.add(np.array([i]), i, reward, np.array([i + 1]), 0.0)
+    # the last steps are pending until the episode ends
+    assert len(buffer) == len(rewards) - n_step + 1
+    assert len(buffer.sample(8, beta=0.5)) == 8
+
+
+def test_n_step_replay_buffer_interrupted_episode(tmpdir):
+    """
+    test the pending n-step steps are not mixed with the steps of the next episode, or of a loaded buffer
+    """
+    n_step, gamma = 3, 0.5
+    buffer = ReplayBuffer(100, n_step=n_step, gamma=gamma)
+    buffer.add(np.array([0]), 0, 1.0, np.array([1]), 0.0)
+    buffer.add(np.array([1]), 1, 2.0, np.array([2]), 0.0)
+    assert len(buffer) == 0
+    # the interrupted episode is truncated, its steps bootstrap from the last observation
+    buffer.reset_episode()
+    assert len(buffer) == 2
+    buffer.add(np.array([10]), 2, 4.0, np.array([11]), 1.0)
+    obses_t, actions, returns, obses_tp1, dones, discounts = buffer._encode_sample(np.arange(3))
+    assert np.all(obses_tp1[:, 0] == [2, 2, 11])
+    assert np.allclose(returns, [1 + 0.5 * 2, 2, 4])
+    assert np.allclose(discounts, [gamma ** 2, gamma, gamma])
+    assert np.all(dones == [0, 0, 1])
+
+    save_path = str(tmpdir.join('buffer.zip'))
+    buffer.save(save_path)
+    loaded_buffer = ReplayBuffer(100, n_step=n_step, gamma=gamma)
+    loaded_buffer.add(np.array([20]), 0, 8.0, np.array([21]), 0.0)
+    loaded_buffer.load(save_path)
+    loaded_buffer.add(np.array([30]), 0, 16.0, np.array([31]), 1.0)
+    assert len(loaded_buffer) == 4
+    _, _, returns, _, _, _ = loaded_buffer._encode_sample(np.arange(4))
+    assert np.allclose(returns, [1 + 0.5 * 2, 2, 4, 16])
+
+
+def test_replay_prefetcher():
+    """
+    test the prefetched minibatches are valid and do not depend on the timing of the background thread
+    """
+    def sample_batches():
+        np.random.seed(0)
+        buffer = ReplayBuffer(64)
+        prefetcher = ReplayPrefetcher(buffer, n_batches=3)
+        batches = []
+        for i in range(40):
+            obs = np.full((2,), i, dtype=np.float32)
+            prefetcher.add(obs, i % 3, float(i), obs + 1, 0.0)
+            if i >= 8:
+                batches.append(prefetcher.sample(16))
+        prefetcher.close()
+        return batches
+
+    batches = sample_batches()
+    for obses_t, actions, rewards, obses_tp1, _ in batches:
+        assert obses_t.shape == (16, 2)
+        assert np.all(obses_t[:, 0] == rewards)
+        assert np.all(obses_tp1 == obses_t + 1)
+        assert np.all(actions == rewards % 3)
+
+    for batch, other_batch in zip(batches, sample_batches()):
+        for array, other_array in zip(batch, other_batch):
+            assert np.array_equal(array, other_array)
+
+
+def test_replay_prefetcher_closed():
+    """
+    test a failed request of the prefetcher does not block the modifications of the buffer
+    """
+    buffer = ReplayBuffer(16)
+    prefetcher = ReplayPrefetcher(buffer, n_batches=2)
+    for i in range(4):
+        prefetcher.add(np.zeros(2), 0, float(i), np.ones(2), 0.0)
+    prefetcher.sample(2)
+    prefetcher.close()
+    with pytest.raises(RuntimeError):
+        prefetcher.sample(2)
+    prefetcher.add(np.zeros(2), 0, 4.0, np.ones(2), 0.0)
+    assert len(buffer) == 5
+
+
+def test_her_replay_buffer():
+    """
+    test the HER replay buffer gathers consistent float32 transitions
+    """
+    time_horizon = 5
+
+    def reward_fun(ag_2, g, info):
+        return -np.any(ag_2 != g, axis=-1).astype(np.float32)
+
+    sample_transitions = make_sample_her_transitions('future', 4, reward_fun)
+    shapes = {'o': (time_horizon + 1, 2), 'u': (time_horizon, 1), 'g': (time_horizon, 1),
+              'ag': (time_horizon + 1, 1)}
+    buffer = HERReplayBuffer(shapes, 10 * time_horizon, time_horizon, sample_transitions)
+    for episode in range(3):
+        steps = np.arange(time_horizon + 1)
+        buffer.store_episode({
+            # the observations hold the episode and the time step
+            'o': np.stack([np.full_like(steps, episode), steps], axis=-1)[None],
+            'u': steps[None, :-1, None],
+            'g': np.full((1, time_horizon, 1), -1),
+            'ag': steps[None, :, None],
+        })
+
+    transitions = buffer.sample(64)
+    assert all(value.dtype == np.float32 for value in transitions.values())
+    assert np.all(transitions['o_2'] == transitions['o'] + [0, 1])
+    assert np.all(transitions['u'][:, 0] == transitions['o'][:, 1])
+    assert np.all(transitions['ag_2'][:, 0] == transitions['o_2'][:, 1])
+    # the goals are either the original ones or future achieved goals
+    her_goals = transitions['g'][:, 0] != -1
+    assert np.all(transitions['g'][her_goals, 0] > transitions['o'][her_goals, 1])
+    assert np.all((transitions['r'] == 0) == (transitions['g'][:, 0] == transitions['ag_2'][:, 0]))
+
+
+class PixelEnv(gym.Env):
+    """
+    An environment with random frames and random episode ends
+    """
+    def __init__(self):
+        self.observation_space = gym.spaces.Box(low=0, high=255, shape=(3, 3, 2), dtype=np.uint8)
+        self.action_space = gym.spaces.Discrete(2)
+
+    def _frame(self):
+        return np.random.randint(1, 256, size=self.observation_space.shape, dtype=np.uint8)
+
+    def reset(self):
+        return self._frame()
+
+    def step(self, action):
+        return self._frame(), 0.0, np.random.rand() < 0.2, {}
+
+    def render(self, mode='human'):
+        pass
+
+
+def test_acer_buffer_frame_stack():
+    """
+    test the ACER buffer rebuilds the stacked frames stored as single frames
+    """
+    n_env, n_steps = 3, 5
+    env = VecFrameStack(DummyVecEnv([PixelEnv for _ in range(n_env)]), 4)
+    buffer = Buffer(env, n_steps, size=4 * n_steps)
+    assert buffer.n_stack == 4
+
+    obs, dones = env.reset(), np.zeros((n_env,), dtype=np.bool_)
+    rollouts = []
+    for _ in range(4):
+        # collect the observations like the ACER runner
+        mb_obs, mb_dones = [np.copy(obs)], [dones]
+        for _ in range(n_steps):
+            obs, _, dones, _ = env.step(np.zeros((n_env,)))
+            mb_obs.append(np.copy(obs))
+            mb_dones.append(dones)
+        mb_obs = np.asarray(mb_obs).swapaxes(1, 0)
+        mb_masks = np.asarray(mb_dones).swapaxes(1, 0)
+        buffer.put(mb_obs, np.zeros((n_env, n_steps), dtype=np.int32), np.zeros((n_env, n_steps)),
+                   np.zeros((n_env, n_steps, 2)), mb_masks[:, 1:], mb_masks)
+        rollouts.append(mb_obs)
+
+    assert buffer.enc_obs.shape == (4, n_env, n_steps + 4, 3, 3, 2)
+    for idx, mb_obs in enumerate(rollouts):
+        assert np.array_equal(buffer.decode(buffer.enc_obs[idx], buffer.masks[idx]), mb_obs)
+
+    obs, actions, _, mus, _, masks = buffer.get()
+    assert obs.shape == (n_env, n_steps + 1, 3, 3, 8) and actions.shape == (n_env, n_steps)
+    assert mus.shape == (n_env, n_steps, 2) and masks.shape == (n_env, n_steps + 1)
+    for env_idx in range(n_env):
+        assert any(np.array_equal(obs[env_idx], mb_obs[env_idx]) for mb_obs in rollouts)
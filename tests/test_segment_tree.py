@@ -1,6 +1,6 @@
 import numpy as np
 
-from stable_baselines.common.segment_tree import SumSegmentTree, MinSegmentTree
+from stable_baselines.common.segment_tree import SegmentTree, SumSegmentTree, MinSegmentTree
 
 
 def test_tree_set():
@@ -110,9 +110,65 @@ def test_max_interval_tree():
     assert np.isclose(tree.min(3, 4), 3.0)
 
 
+def test_batch_set_and_prefixsum_idx():
+    """
+    test the batched operations of the Segment Tree data structure against the scalar ones
+    """
+    capacity = 64
+    values = np.random.random(capacity)
+    values[values < 0.3] = 0.0
+    idxes = np.random.permutation(capacity)
+
+    scalar_sum, batch_sum = SumSegmentTree(capacity), SumSegmentTree(capacity)
+    scalar_min, batch_min = MinSegmentTree(capacity), MinSegmentTree(capacity)
+    for idx in idxes:
+        scalar_sum[idx] = values[idx]
+        scalar_min[idx] = values[idx]
+    batch_sum[idxes] = values[idxes]
+    batch_min[idxes] = values[idxes]
+
+    assert np.allclose(batch_sum[np.arange(capacity)], values)
+    for start, end in [(0, None), (3, 17), (10, -1), (31, 32)]:
+        assert np.isclose(batch_sum.sum(start, end), scalar_sum.sum(start, end))
+        assert np.isclose(batch_min.min(start, end), scalar_min.min(start, end))
+
+    prefixsums = np.random.random(100) * batch_sum.sum()
+    expected = [scalar_sum.find_prefixsum_idx(prefixsum) for prefixsum in prefixsums]
+    assert np.all(batch_sum.find_prefixsum_idx(prefixsums) == expected)
+
+
+def test_batch_set_duplicates():
+    """
+    test that the batched set of the Segment Tree keeps the last value of duplicate indexes
+    """
+    tree = SumSegmentTree(4)
+
+    tree[np.array([1, 2, 1, 2, 1])] = np.array([1.0, 2.0, 3.0, 4.0, 5.0])
+
+    assert np.allclose(tree[np.arange(4)], [0.0, 5.0, 4.0, 0.0])
+    assert np.isclose(tree.sum(), 9.0)
+
+
+def test_tree_without_batch_operation():
+    """
+    test a Segment Tree subclass without a batch operation, as defined before the batched updates
+    """
+    tree = SegmentTree(4, operation=max, neutral_element=float('-inf'))
+
+    tree[np.array([0, 2, 3])] = np.array([1.0, 5.0, 2.0])
+    tree[1] = 4.0
+
+    assert np.isclose(tree.reduce(), 5.0)
+    assert np.isclose(tree.reduce(0, 2), 4.0)
+    assert np.isclose(tree.reduce(3, 4), 2.0)
+
+
 if __name__ == '__main__':
     test_tree_set()
     test_tree_set_overlap()
     test_prefixsum_idx()
     test_prefixsum_idx2()
     test_max_interval_tree()
+    test_batch_set_and_prefixsum_idx()
+    test_batch_set_duplicates()
+    test_tree_without_batch_operation()
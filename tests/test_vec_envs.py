@@ -1,10 +1,22 @@
+import time
+from functools import partial
+from multiprocessing import Process
+
 import pytest
 import gym
 import numpy as np
 
-from stable_baselines.common.vec_env import DummyVecEnv, SubprocVecEnv
+from stable_baselines.bench import Monitor, load_results
+from stable_baselines.common.vec_env import DummyVecEnv, SubprocVecEnv, AsyncSubprocVecEnv, ThreadVecEnv, \
+    VecFrameStack, VecMonitor, VecEnvCodec, RemoteVecEnv, EnvServer
+from stable_baselines.common.runners import EnvIdTrajectories, RolloutBuffer
+from stable_baselines.common.atari_wrappers import WarpFrame
+from stable_baselines.common.vec_env.vec_atari_preprocess import VecAtariPreprocess
+from stable_baselines.common.identity_env import BatchedIdentityEnv, BatchedIdentityEnvBox, \
+    BatchedIdentityEnvMultiDiscrete, BatchedIdentityEnvMultiBinary
 
 N_ENVS = 3
+VEC_ENV_CLASSES = [DummyVecEnv, SubprocVecEnv, partial(SubprocVecEnv, n_envs_per_worker=2), ThreadVecEnv]
 
 
 class CustomGymEnv(gym.Env):
@@ -48,7 +60,7 @@ class CustomGymEnv(gym.Env):
         return np.ones((dim_0, dim_1))
 
 
-@pytest.mark.parametrize("vec_env_class", [DummyVecEnv, SubprocVecEnv])
+@pytest.mark.parametrize("vec_env_class", VEC_ENV_CLASSES)
 def test_vecenv_custom_calls(vec_env_class):
     """Test access to methods/attributes of vectorized environments"""
     vec_env = vec_env_class([CustomGymEnv for _ in range(N_ENVS)])
@@ -88,3 +100,482 @@ def test_vecenv_custom_calls(vec_env_class):
     getattr_result = vec_env.get_attr('current_step')
     assert setattr_result == [None for _ in range(2)]
     assert getattr_result == [12] + [0 for _ in range(N_ENVS - 2)] + [12]
+
+
+class StepCountEnv(gym.Env):
+    def __init__(self, dict_obs=False):
+        """
+        Environment whose observations are the step count, for testing purposes
+
+        :param dict_obs: (bool) whether the observations are a dict of two Box spaces
+        """
+        self.dict_obs = dict_obs
+        box = gym.spaces.Box(low=0, high=255, shape=(4, 4), dtype=np.uint8)
+        if dict_obs:
+            self.observation_space = gym.spaces.Dict({'frame': box, 'step': gym.spaces.Discrete(10)})
+        else:
+            self.observation_space = box
+        self.action_space = gym.spaces.Discrete(2)
+        self.current_step = 0
+
+    def _obs(self):
+        frame = np.full((4, 4), self.current_step, dtype=np.uint8)
+        if self.dict_obs:
+            return {'frame': frame, 'step': self.current_step}
+        return frame
+
+    def reset(self):
+        self.current_step = 0
+        return self._obs()
+
+    def step(self, action):
+        self.current_step += 1 + action
+        return self._obs(), float(action), self.current_step >= 5, {'step': self.current_step}
+
+    def render(self, mode='human'):
+        pass
+
+
+@pytest.mark.parametrize("dict_obs", [False, True])
+@pytest.mark.parametrize("shared_memory", [False, True])
+@pytest.mark.parametrize("n_envs_per_worker", [1, 2])
+def test_subproc_step(dict_obs, shared_memory, n_envs_per_worker):
+    """Test the results of SubprocVecEnv are the ones of the environments"""
+    if dict_obs and not shared_memory:
+        pytest.skip("the observations of Dict spaces are only returned through shared memory")
+    env_fns = [lambda: StepCountEnv(dict_obs) for _ in range(N_ENVS)]
+    dummy_vec_env = DummyVecEnv(env_fns)
+    vec_env = SubprocVecEnv(env_fns, shared_memory=shared_memory, n_envs_per_worker=n_envs_per_worker)
+
+    def assert_equal_obs(obs, expected_obs):
+        if dict_obs:
+            assert obs.keys() == expected_obs.keys()
+            for key in obs.keys():
+                assert np.array_equal(obs[key], expected_obs[key])
+        else:
+            assert np.array_equal(obs, expected_obs)
+
+    assert_equal_obs(vec_env.reset(), dummy_vec_env.reset())
+    for step in range(8):
+        actions = np.array([(step + env_idx) % 2 for env_idx in range(N_ENVS)])
+        obs, rewards, dones, infos = vec_env.step(actions)
+        expected_obs, expected_rewards, expected_dones, expected_infos = dummy_vec_env.step(actions)
+        assert_equal_obs(obs, expected_obs)
+        assert np.array_equal(rewards, expected_rewards)
+        assert np.array_equal(dones, expected_dones)
+        assert list(infos) == list(expected_infos)
+    assert vec_env.get_attr('current_step') == dummy_vec_env.get_attr('current_step')
+    vec_env.close()
+
+
+@pytest.mark.parametrize("vec_env_class", [DummyVecEnv, partial(ThreadVecEnv, n_threads=2)])
+@pytest.mark.parametrize("copy", [True, False])
+def test_vec_env_copy(vec_env_class, copy):
+    """Test the results of the vectorized environments returning their buffers (copy=False)"""
+    env_fns = [StepCountEnv for _ in range(N_ENVS)]
+    expected_vec_env = DummyVecEnv(env_fns)
+    vec_env = vec_env_class(env_fns, copy=copy)
+    assert np.array_equal(vec_env.reset(), expected_vec_env.reset())
+    previous_results = None
+    for step in range(8):
+        actions = np.array([(step + env_idx) % 2 for env_idx in range(N_ENVS)])
+        results = vec_env.step(actions)
+        expected_results = expected_vec_env.step(actions)
+        for result, expected_result in zip(results, expected_results):
+            assert np.array_equal(result, expected_result)
+        if previous_results is not None:
+            # the buffers are returned and overwritten at each step
+            assert all((result is previous_result) != copy
+                       for result, previous_result in zip(results, previous_results))
+        previous_results = results
+    vec_env.close()
+
+
+class SlowStepCountEnv(StepCountEnv):
+    def __init__(self, step_time=0.):
+        """
+        StepCountEnv whose steps take some time, for testing purposes
+
+        :param step_time: (float) the duration of a step in seconds
+        """
+        super(SlowStepCountEnv, self).__init__()
+        self.step_time = step_time
+
+    def step(self, action):
+        time.sleep(self.step_time)
+        return super(SlowStepCountEnv, self).step(action)
+
+
+@pytest.mark.parametrize("shared_memory", [False, True])
+def test_async_subproc_step(shared_memory):
+    """Test AsyncSubprocVecEnv returns the results of the environments ready first, with their ids"""
+    step_times = [0.5, 0., 0., 0.]
+    vec_env = AsyncSubprocVecEnv([partial(SlowStepCountEnv, step_time) for step_time in step_times], n_ready=2,
+                                 shared_memory=shared_memory)
+    # the step counts and last actions of each environment
+    envs = [StepCountEnv() for _ in step_times]
+    last_actions = [None for _ in step_times]
+    obs = vec_env.reset()
+    for env in envs:
+        env.reset()
+    assert vec_env.num_envs == 2 and len(obs) == 2
+    returned_ids = set()
+    for step in range(10):
+        env_ids = vec_env.env_ids
+        returned_ids.update(env_ids)
+        for env_id, observation in zip(env_ids, obs):
+            assert np.array_equal(observation, envs[env_id]._obs())
+        actions = np.array([(step + env_id) % 2 for env_id in env_ids])
+        for env_id, action in zip(env_ids, actions):
+            _, _, done, _ = envs[env_id].step(action)
+            if done:
+                envs[env_id].reset()
+            last_actions[env_id] = action
+        obs, rewards, dones, infos = vec_env.step(actions)
+        for env_id, reward in zip(vec_env.env_ids, rewards):
+            assert reward == last_actions[env_id] or (reward == 0 and last_actions[env_id] is None)
+    # the slow environment does not slow down the others
+    assert 0 not in returned_ids or len(returned_ids) == len(step_times)
+    assert vec_env.get_attr('current_step') == [env.current_step for env in envs]
+    vec_env.close()
+
+
+def test_env_id_trajectories():
+    """Test the advantages of the trajectories gathered by environment id"""
+    trajectories = EnvIdTrajectories()
+    ones = np.ones(2)
+    trajectories.add_actions([0, 1], np.array([[0.], [10.]]), ones, ones, ones)
+    trajectories.add_results([1, 0], np.array([1., 2.]), np.array([True, False]))
+    trajectories.add_actions([1, 0], np.array([[11.], [1.]]), ones, ones, ones)
+    trajectories.add_results([0], np.array([3.]), np.array([False]))
+    assert trajectories.n_complete == 3
+    batch = trajectories.pop(3, {0: 5.}, gamma=0.5, lam=1.)
+    assert trajectories.n_complete == 0
+    assert np.array_equal(batch['obs'], [[0.], [1.], [10.]])
+    assert np.array_equal(batch['masks'], [False, False, False])
+    assert np.array_equal(batch['rewards'], [2., 3., 1.])
+    # env 0: discounted rewards bootstrapped with the last value, env 1: episode over
+    assert np.allclose(batch['returns'], [2. + 0.5 * (3. + 0.5 * 5.), 3. + 0.5 * 5., 1.])
+    trajectories.add_results([1], np.array([4.]), np.array([False]))
+    trajectories.add_actions([0], np.array([[2.]]), ones[:1], ones[:1], ones[:1])
+    batch = trajectories.pop(1, {1: 1.}, gamma=0.5, lam=1.)
+    assert np.array_equal(batch['masks'], [True])
+    assert np.allclose(batch['returns'], [4. + 0.5 * 1.])
+
+
+def test_rollout_buffer():
+    """Test the rollout buffer is written in place, and flattened by environment then by step without copy"""
+    n_envs, n_steps = 3, 4
+    buffer = RolloutBuffer(n_envs, n_steps, dtypes={'rewards': np.float32}, n_steps_by_field={'obs': n_steps + 1})
+    obs = np.zeros((n_envs, 2), dtype=np.uint8)
+    for step in range(n_steps + 1):
+        obs[:] = np.arange(n_envs)[:, None] * 10 + step
+        buffer.add(step, obs=obs)
+        if step < n_steps:
+            buffer.add(step, rewards=[step] * n_envs, dones=[False, True, False])
+    arrays = dict(buffer.arrays)
+    assert buffer.array('obs').shape == (n_envs, n_steps + 1, 2)
+    assert buffer.array('obs').dtype == np.uint8
+    assert buffer.array('rewards').dtype == np.float32
+    assert buffer.array('dones').dtype == np.bool
+    flat_obs = buffer.flat('obs')
+    assert np.shares_memory(flat_obs, buffer.array('obs'))
+    assert np.array_equal(flat_obs[:, 0], [env_idx * 10 + step for env_idx in range(n_envs)
+                                           for step in range(n_steps + 1)])
+    assert np.array_equal(buffer.flat('rewards'), np.tile(np.arange(n_steps), n_envs))
+    # the next rollout reuses the arrays
+    buffer.add(0, obs=obs, rewards=np.ones(n_envs), dones=np.ones(n_envs, dtype=np.bool))
+    assert all(buffer.arrays[name] is array for name, array in arrays.items())
+    assert np.all(buffer.array('dones')[:, 0])
+    assert buffer.array('advs').shape == (n_envs, n_steps)
+
+
+@pytest.mark.parametrize("batched_env_class", [partial(BatchedIdentityEnv, 4), BatchedIdentityEnvBox,
+                                               partial(BatchedIdentityEnvMultiDiscrete, 4),
+                                               partial(BatchedIdentityEnvMultiBinary, 4)])
+def test_batched_identity_env(batched_env_class):
+    """Test the batched identity environments reward their observations, and reset the episodes over"""
+    n_envs = 8
+    vec_env = batched_env_class(n_envs=n_envs, ep_length=3)
+    vec_env.seed(0)
+    obs = vec_env.reset()
+    assert obs.shape == (n_envs,) + vec_env.observation_space.shape
+    assert obs.dtype == vec_env.observation_space.dtype
+    assert all(vec_env.observation_space.contains(observation) for observation in obs)
+    for step in range(1, 7):
+        # the first half of the environments take the right actions
+        actions = np.copy(obs)
+        actions[n_envs // 2:] = obs[n_envs // 2:] + 0.5 if obs.dtype == np.float32 else (obs[n_envs // 2:] + 1) % 2
+        obs, rewards, dones, infos = vec_env.step(actions)
+        assert np.array_equal(rewards, [1] * (n_envs // 2) + [0] * (n_envs - n_envs // 2))
+        assert np.all(dones == (step % 3 == 0))
+        assert len(infos) == n_envs
+    assert np.all(vec_env.current_step == 0)
+
+
+@pytest.mark.parametrize("copy", [True, False])
+def test_vec_frame_stack(copy):
+    """Test VecFrameStack stacks the last frames, the oldest first, and zeroes the frames of the previous episodes"""
+    n_stack = 3
+    vec_env = VecFrameStack(DummyVecEnv([StepCountEnv for _ in range(N_ENVS)]), n_stack, copy=copy)
+    frames_env = DummyVecEnv([StepCountEnv for _ in range(N_ENVS)])
+    expected_obs = np.zeros((N_ENVS, 4, 4 * n_stack), dtype=np.uint8)
+    obs = vec_env.reset()
+    expected_obs[..., -4:] = frames_env.reset()
+    assert np.array_equal(obs, expected_obs)
+    for step in range(10):
+        actions = np.array([(step * env_idx) % 2 for env_idx in range(N_ENVS)])
+        obs, _, dones, _ = vec_env.step(actions)
+        frames, _, _, _ = frames_env.step(actions)
+        expected_obs = np.roll(expected_obs, shift=-4, axis=-1)
+        expected_obs[dones] = 0
+        expected_obs[..., -4:] = frames
+        assert np.array_equal(obs, expected_obs)
+
+
+def test_vec_monitor(tmp_path):
+    """Test VecMonitor returns and logs the episodes as Monitor does"""
+    vec_env = VecMonitor(DummyVecEnv([StepCountEnv for _ in range(N_ENVS)]), str(tmp_path), info_keywords=('step',))
+    monitor_env = DummyVecEnv([lambda: Monitor(StepCountEnv(), None, info_keywords=('step',))
+                               for _ in range(N_ENVS)])
+    vec_env.reset()
+    monitor_env.reset()
+    n_episodes = 0
+    for step in range(12):
+        actions = np.array([(step * env_idx) % 2 for env_idx in range(N_ENVS)])
+        _, _, dones, infos = vec_env.step(actions)
+        _, _, expected_dones, expected_infos = monitor_env.step(actions)
+        assert np.array_equal(dones, expected_dones)
+        for info, expected_info in zip(infos, expected_infos):
+            assert ('episode' in info) == ('episode' in expected_info)
+            if 'episode' in info:
+                n_episodes += 1
+                for key in ['r', 'l', 'step']:
+                    assert info['episode'][key] == expected_info['episode'][key]
+    vec_env.close()
+    assert n_episodes > N_ENVS
+    results = load_results(str(tmp_path))
+    assert len(results) == n_episodes
+    assert sorted(results['r']) == sorted(vec_env.get_episode_rewards())
+
+
+@pytest.mark.parametrize("wrapper_class", [partial(VecFrameStack, n_stack=2), VecMonitor])
+def test_wrapper_refuses_env_ids(wrapper_class):
+    """Test the wrappers keeping a state by position refuse the environments returning environment ids"""
+    vec_env = wrapper_class(AsyncSubprocVecEnv([StepCountEnv for _ in range(N_ENVS)], n_ready=2))
+    with pytest.raises(AssertionError):
+        vec_env.reset()
+    vec_env.close()
+
+
+class RawFramesEnv(gym.Env):
+    def __init__(self, n_frames=2):
+        """
+        Environment returning random RGB frames of Atari size, for testing purposes
+
+        :param n_frames: (int) the number of frames of an observation, stacked on the first axis (0 for one frame)
+        """
+        shape = (210, 160, 3) if n_frames == 0 else (n_frames, 210, 160, 3)
+        self.observation_space = gym.spaces.Box(low=0, high=255, shape=shape, dtype=np.uint8)
+        self.action_space = gym.spaces.Discrete(2)
+
+    def reset(self):
+        return self.observation_space.sample()
+
+    def step(self, action):
+        return self.observation_space.sample(), 0., False, {}
+
+    def render(self, mode='human'):
+        pass
+
+
+@pytest.mark.parametrize("n_frames", [0, 2])
+def test_vec_atari_preprocess(n_frames):
+    """Test VecAtariPreprocess preprocesses the frames as MaxAndSkipEnv and WarpFrame"""
+    raw_env = DummyVecEnv([partial(RawFramesEnv, n_frames) for _ in range(N_ENVS)])
+    vec_env = VecAtariPreprocess(raw_env)
+    assert vec_env.observation_space.shape == (84, 84, 1)
+    warp_frame = WarpFrame(RawFramesEnv(0))
+    raw_obs = raw_env.reset()
+    obs = vec_env._preprocess(raw_obs)
+    for env_idx in range(N_ENVS):
+        frame = raw_obs[env_idx].max(axis=0) if n_frames else raw_obs[env_idx]
+        assert np.array_equal(obs[env_idx], warp_frame.observation(frame))
+    assert vec_env.step(np.zeros(N_ENVS))[0].shape == (N_ENVS, 84, 84, 1)
+
+
+class FloatInfoEnv(gym.Env):
+    def __init__(self):
+        """
+        Environment returning float64 observations and numeric infos, for testing purposes
+        """
+        self.observation_space = gym.spaces.Box(low=-1, high=1, shape=(3,), dtype=np.float64)
+        self.action_space = gym.spaces.Discrete(2)
+        self.current_step = 0
+
+    def reset(self):
+        self.current_step = 0
+        return np.full(3, 0.1)
+
+    def step(self, action):
+        self.current_step += 1
+        info = {'step': self.current_step, 'value': 0.5 * action, 'flag': bool(action)}
+        if self.current_step == 2:
+            info['text'] = 'a'
+        return np.full(3, 0.1 * self.current_step), 1., self.current_step >= 3, info
+
+    def render(self, mode='human'):
+        pass
+
+
+@pytest.mark.parametrize("n_envs_per_worker", [1, 2])
+@pytest.mark.parametrize("compact_infos", [False, True])
+def test_subproc_codec(n_envs_per_worker, compact_infos):
+    """Test SubprocVecEnv decodes the observations and infos encoded by its processes"""
+    vec_env = SubprocVecEnv([FloatInfoEnv for _ in range(N_ENVS)], n_envs_per_worker=n_envs_per_worker,
+                            codec=VecEnvCodec(compact_infos=compact_infos))
+    expected_vec_env = DummyVecEnv([FloatInfoEnv for _ in range(N_ENVS)])
+    assert vec_env.observation_space.dtype == np.float32
+    assert np.allclose(vec_env.reset(), expected_vec_env.reset())
+    for step in range(5):
+        actions = np.array([(step + env_idx) % 2 for env_idx in range(N_ENVS)])
+        obs, rewards, dones, infos = vec_env.step(actions)
+        expected_obs, expected_rewards, expected_dones, expected_infos = expected_vec_env.step(actions)
+        assert obs.dtype == np.float32 and np.allclose(obs, expected_obs)
+        assert np.array_equal(rewards, expected_rewards) and np.array_equal(dones, expected_dones)
+        assert list(infos) == list(expected_infos)
+        assert all(type(info['flag']) is bool for info in infos)
+    vec_env.close()
+
+
+def test_subproc_codec_dict_obs():
+    """Test SubprocVecEnv refuses a codec for dict observations sent through the pipes"""
+    with pytest.raises(ValueError):
+        SubprocVecEnv([partial(StepCountEnv, dict_obs=True) for _ in range(2)], codec=VecEnvCodec())
+    vec_env = SubprocVecEnv([partial(StepCountEnv, dict_obs=True) for _ in range(2)], shared_memory=True,
+                            codec=VecEnvCodec())
+    assert np.array_equal(vec_env.reset()['step'], [0, 0])
+    vec_env.close()
+
+
+def test_codec_compress():
+    """Test the compression of the uint8 observations"""
+    codec = VecEnvCodec(compress_uint8=True)
+    obs = np.random.randint(0, 2, size=(2, 84, 84, 4)).astype(np.uint8)
+    data = codec.encode_obs(obs)
+    assert isinstance(data, bytes) and len(data) < obs.nbytes
+    out = np.zeros_like(obs)
+    assert codec.decode_obs(data, out) is out and np.array_equal(out, obs)
+
+
+def test_remote_vec_env():
+    """Test RemoteVecEnv returns the results of the environments of env servers on localhost"""
+    n_server_envs = [1, 2]
+    processes = []
+    addresses = []
+    for n_envs in n_server_envs:
+        server = EnvServer([StepCountEnv for _ in range(n_envs)], authkey=b'test')
+        processes.append(Process(target=server.serve, daemon=True))
+        processes[-1].start()
+        server.listener.close()
+        addresses.append(server.address)
+    vec_env = RemoteVecEnv(addresses, authkey=b'test', codec=VecEnvCodec())
+    expected_vec_env = DummyVecEnv([StepCountEnv for _ in range(sum(n_server_envs))])
+    assert vec_env.num_envs == 3
+    assert np.array_equal(vec_env.reset(), expected_vec_env.reset())
+    for step in range(6):
+        actions = np.array([(step + env_idx) % 2 for env_idx in range(3)])
+        results = vec_env.step(actions)
+        expected_results = expected_vec_env.step(actions)
+        for result, expected_result in zip(results[:3], expected_results[:3]):
+            assert np.array_equal(result, expected_result)
+        assert list(results[3]) == list(expected_results[3])
+    vec_env.set_attr('current_step', 1, indices=[0, 2])
+    assert vec_env.get_attr('current_step') == [1, expected_vec_env.get_attr('current_step')[1], 1]
+    assert vec_env.env_method('reset')[2].shape == (4, 4)
+    vec_env.close()
+    for process in processes:
+        process.join()
+
+
+def test_env_server_authkey():
+    """Test the env servers refuse to listen on a non-loopback host without an authkey"""
+    with pytest.raises(ValueError):
+        EnvServer([StepCountEnv], address=('0.0.0.0', 0))
+    server = EnvServer([StepCountEnv], address=('0.0.0.0', 0), authkey=b'test')
+    server.listener.close()
+    server = EnvServer([StepCountEnv], address=('127.0.0.1', 0))
+    server.listener.close()
+
+
+@pytest.mark.parametrize("shared_memory", [False, True])
+@pytest.mark.parametrize("n_repeat", [None, 3])
+def test_subproc_step_multi(shared_memory, n_repeat):
+    """Test the multi-step commands of SubprocVecEnv are the steps of the environments"""
+    vec_env = SubprocVecEnv([StepCountEnv for _ in range(N_ENVS)], shared_memory=shared_memory, n_envs_per_worker=2)
+    envs = [StepCountEnv() for _ in range(N_ENVS)]
+    obs = vec_env.reset()
+    for env in envs:
+        env.reset()
+    for step in range(4):
+        if n_repeat is None:
+            # sequences of different lengths
+            actions = [[(step + env_idx + k) % 2 for k in range(env_idx + 1)] for env_idx in range(N_ENVS)]
+        else:
+            actions = np.array([(step + env_idx) % 2 for env_idx in range(N_ENVS)])
+        obs, rewards, dones, _ = vec_env.step_multi(actions, n_repeat)
+        for env_idx, env in enumerate(envs):
+            action_sequence = actions[env_idx] if n_repeat is None else [actions[env_idx]] * n_repeat
+            expected_reward, expected_done = 0, False
+            for action in action_sequence:
+                _, reward, expected_done, _ = env.step(action)
+                expected_reward += reward
+                if expected_done:
+                    env.reset()
+                    break
+            assert np.array_equal(obs[env_idx], env._obs())
+            assert rewards[env_idx] == expected_reward and dones[env_idx] == expected_done
+    vec_env.close()
+
+
+@pytest.mark.parametrize("n_repeat", [None, 3])
+def test_async_subproc_step_multi(n_repeat):
+    """Test the multi-step commands of AsyncSubprocVecEnv are the steps of the returned environments"""
+    vec_env = AsyncSubprocVecEnv([StepCountEnv for _ in range(N_ENVS)], n_ready=N_ENVS // 2)
+    envs = [StepCountEnv() for _ in range(N_ENVS)]
+    vec_env.reset()
+    for env in envs:
+        env.reset()
+    for step in range(6):
+        env_ids = vec_env.env_ids
+        if n_repeat is None:
+            actions = [[(step + env_id + k) % 2 for k in range(env_id + 1)] for env_id in env_ids]
+        else:
+            actions = np.array([(step + env_id) % 2 for env_id in env_ids])
+        vec_env.step_multi_async(actions, n_repeat)
+        for env_id, env_actions in zip(env_ids, actions):
+            for action in (env_actions if n_repeat is None else [env_actions] * n_repeat):
+                _, _, done, _ = envs[env_id].step(action)
+                if done:
+                    envs[env_id].reset()
+                    break
+        obs, _, _, _ = vec_env.step_wait()
+        # an environment has a single command in flight: its observation is the one of its last command
+        for env_id, observation in zip(vec_env.env_ids, obs):
+            assert np.array_equal(observation, envs[env_id]._obs())
+    vec_env.close()
+
+
+@pytest.mark.parametrize("vec_env_class", [SubprocVecEnv, partial(AsyncSubprocVecEnv, n_ready=2)])
+def test_subproc_step_multi_no_step(vec_env_class):
+    """Test the multi-step commands refuse to take no step in an environment"""
+    vec_env = vec_env_class([StepCountEnv for _ in range(2)])
+    vec_env.reset()
+    with pytest.raises(AssertionError):
+        vec_env.step_multi_async([0, 1], n_repeat=0)
+    with pytest.raises(AssertionError):
+        vec_env.step_multi_async([[0], []])
+    # the processes are still running
+    obs, _, _, _ = vec_env.step_multi([[0], [1, 0]])
+    assert len(obs) == 2
+    vec_env.close()
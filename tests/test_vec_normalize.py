@@ -3,6 +3,7 @@ import subprocess
 import gym
 import numpy as np
 
+from stable_baselines.common.identity_env import BatchedIdentityEnvBox
 from stable_baselines.common.running_mean_std import RunningMeanStd
 from stable_baselines.common.vec_env.dummy_vec_env import DummyVecEnv
 from stable_baselines.common.vec_env.vec_normalize import VecNormalize
@@ -28,6 +29,95 @@ def test_runningmeanstd():
         assert np.allclose(moments_1, moments_2)
 
 
+def test_runningmeanstd_update_centered():
+    """Test the single pass update of RunningMeanStd"""
+    for shape in [(), (2,), (3, 2)]:
+        rms = RunningMeanStd(epsilon=0.0, shape=shape)
+        fast_rms = RunningMeanStd(epsilon=0.0, shape=shape)
+        for batch_size in [3, 4, 5]:
+            batch = 100 + np.random.randn(batch_size, *shape)
+            rms.update(batch)
+            fast_rms.update_centered(batch, np.empty(batch.shape))
+            assert np.allclose([rms.mean, rms.var], [fast_rms.mean, fast_rms.var])
+
+
+def test_vec_normalize_float32():
+    """Test VecNormalize normalizes in float32 into its own buffer with copy=False"""
+    env, expected_env = BatchedIdentityEnvBox(n_envs=4), BatchedIdentityEnvBox(n_envs=4)
+    env.seed(0)
+    expected_env.seed(0)
+    env, expected_env = VecNormalize(env, copy=False), VecNormalize(expected_env)
+    obs, expected_obs = env.reset(), expected_env.reset()
+    for _ in range(20):
+        assert obs.dtype == np.float32
+        assert np.allclose(obs, expected_obs, atol=1e-5)
+        actions = np.random.uniform(-1, 1, size=(4, 1))
+        next_obs, _, _, _ = env.step(actions)
+        expected_obs, _, _, _ = expected_env.step(actions)
+        assert next_obs is obs
+    env.training = expected_env.training = False
+    assert np.allclose(env.step(actions)[0], expected_env.step(actions)[0], atol=1e-5)
+
+
+class _SingleProcessComm(object):
+    """
+    The methods of a MPI communicator used by VecNormalize, for a single process
+    """
+
+    @staticmethod
+    def Get_size():  # pylint: disable=invalid-name
+        return 1
+
+    @staticmethod
+    def Get_rank():  # pylint: disable=invalid-name
+        return 0
+
+    @staticmethod
+    def Allgather(sendbuf, recvbuf):  # pylint: disable=invalid-name
+        recvbuf[0] = sendbuf
+
+    @staticmethod
+    def allgather(sendobj):
+        return [sendobj]
+
+
+def _helper_sync_vec_normalize(comm=None):
+    """
+    Run VecNormalize with a communicator, and check the moving averages are the ones of the data of all the workers
+
+    :param comm: (MPI Communicator) if None, MPI.COMM_WORLD
+    """
+    if comm is None:
+        from mpi4py import MPI
+        comm = MPI.COMM_WORLD
+    venv = BatchedIdentityEnvBox(n_envs=4)
+    venv.seed(comm.Get_rank())
+    env = VecNormalize(venv, comm=comm, sync_interval=3)
+    env.reset()
+    observations = [np.copy(env.get_original_obs())]
+    for _ in range(5):
+        env.step(np.zeros((4, 1)))
+        observations.append(np.copy(env.get_original_obs()))
+    # the data of the last steps is merged by the last synchronization
+    env.sync_running_average()
+    all_observations = np.concatenate(comm.allgather(np.concatenate(observations)))
+    assert np.allclose(env.obs_rms.mean, all_observations.mean(axis=0), atol=1e-4)
+    assert np.allclose(env.obs_rms.var, all_observations.var(axis=0), atol=1e-4)
+
+
+def test_vec_normalize_sync():
+    """Test the synchronization of the moving averages of VecNormalize"""
+    _helper_sync_vec_normalize(_SingleProcessComm())
+
+
+def test_mpi_vec_normalize_sync():
+    """Test the synchronization of the moving averages of VecNormalize between MPI workers"""
+    return_code = subprocess.call(['mpirun', '--allow-run-as-root', '-np', '2', 'python', '-c',
+                                   'from tests.test_vec_normalize import _helper_sync_vec_normalize; '
+                                   '_helper_sync_vec_normalize()'])
+    _assert_eq(return_code, 0)
+
+
 def test_vec_env():
     """Test VecNormalize Object"""
 
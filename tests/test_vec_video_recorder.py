@@ -0,0 +1,110 @@
+import json
+import os
+import time
+from multiprocessing import Event
+
+import gym
+import numpy as np
+import pytest
+
+from stable_baselines.common.vec_env import DummyVecEnv
+from stable_baselines.common.vec_env import vec_video_recorder
+from stable_baselines.common.vec_env.vec_video_recorder import VecVideoRecorder
+
+# blocks the creation of the stub encoders, inherited by the encoding process
+ENCODER_GATE = Event()
+
+
+class _StubImageEncoder(object):
+    def __init__(self, output_path, frame_shape, frames_per_sec, *_args):
+        """Write the first pixel of the encoded frames to the video file, as json"""
+        ENCODER_GATE.wait()
+        self.output_path = output_path
+        self.frames = []
+
+    def capture_frame(self, frame):
+        self.frames.append(int(frame[0, 0, 0]))
+
+    def close(self):
+        with open(self.output_path, 'w') as file_handler:
+            json.dump(self.frames, file_handler)
+
+
+class _FailingImageEncoder(object):
+    def __init__(self, *_args):
+        raise gym.error.DependencyNotInstalled("Found neither the ffmpeg nor avconv executables.")
+
+
+class _RenderEnv(gym.Env):
+    metadata = {'render.modes': ['rgb_array'], 'video.frames_per_second': 30}
+
+    def __init__(self):
+        self.observation_space = gym.spaces.Box(low=0, high=1, shape=(1,), dtype=np.float32)
+        self.action_space = gym.spaces.Discrete(2)
+        self.current_step = 0
+
+    def reset(self):
+        self.current_step = 0
+        return np.zeros(1, dtype=np.float32)
+
+    def step(self, action):
+        self.current_step += 1
+        return np.zeros(1, dtype=np.float32), 0., False, {}
+
+    def render(self, mode='rgb_array'):
+        return np.full((4, 6, 3), self.current_step, dtype=np.uint8)
+
+
+def _wait_for_file(path, timeout=10.):
+    start_time = time.time()
+    while not os.path.exists(path):
+        assert time.time() - start_time < timeout, "Error: {} not written".format(path)
+        time.sleep(0.01)
+
+
+def test_async_video_recorder(tmpdir, monkeypatch):
+    """Test the async encoding of consecutive videos, dropping the frames when the queue is full"""
+    monkeypatch.setattr(vec_video_recorder.video_recorder, 'ImageEncoder', _StubImageEncoder)
+    ENCODER_GATE.clear()
+    video_folder = str(tmpdir)
+    recorder = VecVideoRecorder(DummyVecEnv([_RenderEnv]), video_folder,
+                                record_video_trigger=lambda step: step % 10 == 0, video_length=3,
+                                name_prefix='test', async_encoding=True, queue_size=2)
+    recorder.reset()
+    for _ in range(3):
+        recorder.step([0])
+    # the encoder is blocked: the first 2 frames are queued, the others are dropped
+    first_video = os.path.join(video_folder, 'test-step-0-to-step-3')
+    with open(first_video + '.meta.json') as file_handler:
+        assert json.load(file_handler)['dropped_frames'] == 2
+    ENCODER_GATE.set()
+    _wait_for_file(first_video + '.mp4')
+    for _ in range(20):
+        recorder.step([0])
+    process = recorder.encoder.process
+    recorder.close()
+    assert recorder.encoder.process is None
+    assert not process.is_alive()
+
+    with open(first_video + '.mp4') as file_handler:
+        assert json.load(file_handler) == [0, 1]
+    for start_step in [10, 20]:
+        video = os.path.join(video_folder, 'test-step-{}-to-step-{}'.format(start_step, start_step + 3))
+        with open(video + '.mp4') as file_handler:
+            frames = json.load(file_handler)
+        with open(video + '.meta.json') as file_handler:
+            n_dropped_frames = json.load(file_handler)['dropped_frames']
+        assert len(frames) + n_dropped_frames == 4
+        assert set(frames) <= set(range(start_step, start_step + 4))
+
+
+def test_async_video_recorder_error(tmpdir, monkeypatch):
+    """Test the error of the encoding process is raised by the recorder, instead of dropping the frames"""
+    monkeypatch.setattr(vec_video_recorder.video_recorder, 'ImageEncoder', _FailingImageEncoder)
+    recorder = VecVideoRecorder(DummyVecEnv([_RenderEnv]), str(tmpdir), record_video_trigger=lambda step: False,
+                                video_length=100, async_encoding=True)
+    recorder.reset()
+    recorder.encoder.process.join(timeout=10.)
+    with pytest.raises(gym.error.DependencyNotInstalled):
+        recorder.step([0])
+    recorder.close()